@@ -64,6 +64,19 @@ c = get_config()
 # Command line argument passed to the engines.
 # c.LocalEngineSetLauncher.engine_args = ['--log-to-file','--log-level', '40']
 
+# The largest number of engines launched and not registered with the
+# controller yet, or 0 for no limit.
+# c.LocalEngineSetLauncher.concurrency = 0
+
+# The delay between two engine launches, in seconds.
+# c.LocalEngineSetLauncher.stagger = 0.0
+
+# Fork the engines from a template process which has already imported
+# IPython and the modules listed, so that they start faster.  The modules
+# must not import the Twisted reactor.
+# c.LocalEngineSetLauncher.prefork = False
+# c.LocalEngineSetLauncher.prefork_modules = []
+
 #-----------------------------------------------------------------------------
 # MPIExec launchers
 #-----------------------------------------------------------------------------
@@ -25,6 +25,35 @@ c = get_config()
 # be imported in the controller for pickling to work.
 # c.Global.import_statements = ['import math']
 
+# The task controller keeps the result of each task until it is cleared, or
+# until a client gets it with forget=True, as the load balanced map does.
+# task_max_results bounds the number of results kept in memory, evicting the
+# least recently used ones, and task_result_ttl drops the results which were
+# not used for that many seconds.  The evicted results are written to the
+# SQLite file task_result_file if it is given, and dropped otherwise.  0
+# means no limit.
+# c.Global.task_max_results = 0
+# c.Global.task_result_ttl = 0
+# c.Global.task_result_file = u''
+
+# A task running task_speculation_factor times longer than the median task is
+# run again on an idle engine, and the first result is kept.  Only set this
+# if all the tasks can safely run twice, as tasks without side effects can.
+# 0 turns this off.
+# c.Global.task_speculation_factor = 0
+
+# The controller sends up to engine_window commands to each engine without
+# waiting for the results of the previous ones, which hides the network
+# latency of many small commands.  The engine still runs them in order.  1
+# sends one command at a time.
+# c.Global.engine_window = 1
+
+# The number of execute results, and their approximate size in bytes, that
+# the controller keeps for each engine to answer get_result.  Older results
+# are fetched from the engine.
+# c.Global.engine_history_size = 1000
+# c.Global.engine_history_bytes = 10*1024*1024
+
 # Reuse the controller's FURL files. If False, FURL files are regenerated
 # each time the controller is run. If True, they will be reused, *but*, you
 # also must set the network ports by hand. If set, this will override the
@@ -20,6 +20,18 @@ c = get_config()
 # before it connects to the controller.
 # c.Global.exec_lines = ['import numpy']
 
+# Modules imported when the engine starts, which stay in the users namespace
+# after a reset.  A module is given as 'module' or 'module as name'.  Engines
+# forked by ipcluster with LocalEngineSetLauncher.prefork start faster if the
+# modules are in LocalEngineSetLauncher.prefork_modules as well.
+# c.Global.preload_modules = ['numpy as np', 'scipy']
+
+# Values of this many bytes or more pulled from the engine are written to
+# shared memory, and only a handle to them goes through the controller.  Only
+# set it when the controller and the clients run on the engine's host.  0
+# turns it off.
+# c.Global.share_threshold = 0
+
 # The engine will try to connect to the controller multiple times, to allow
 # the controller time to startup and write its FURL file. These parameters 
 # control the number of retries (connect_max_tries) and the initial delay
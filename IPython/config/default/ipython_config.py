@@ -59,6 +59,9 @@ c = get_config()
 
 # c.InteractiveShell.cache_size = 1000
 
+# Number of inputs kept in memory, older ones are moved to a temporary file
+# c.InteractiveShell.history_window = 1000
+
 # c.InteractiveShell.colors = 'LightBG'
 
 # c.InteractiveShell.color_info = True
@@ -90,6 +93,9 @@ c = get_config()
 
 # c.InteractiveShell.quiet = False
 
+# Print how long each step of the shell's initialization took
+# c.InteractiveShell.startup_timing = False
+
 # Readline 
 # c.InteractiveShell.readline_use = True
 
@@ -27,6 +27,7 @@ Authors
 from __future__ import print_function
 
 # Stdlib imports
+from ast import PyCF_ONLY_AST
 import codeop
 import hashlib
 import linecache
@@ -99,15 +100,46 @@ class CachingCompiler(object):
           purposes in tracebacks (typically it will be the IPython prompt
           number).
         """
+        name = self.cache(code, number)
+        return self._compiler(code, name, symbol)
+
+    def cache(self, code, number=0):
+        """Make the source code available to the inspect and traceback
+        machinery, and return the name to compile it with.
+
+        Parameters
+        ----------
+        code : str
+          Source code, one or more lines.
+
+        number : int, optional
+          As for :meth:`__call__`.
+        """
         name = code_name(code, number)
-        code_obj = self._compiler(code, name, symbol)
         entry = (len(code), time.time(),
                  [line+'\n' for line in code.splitlines()], name)
         # Cache the info both in the linecache (a global cache used internally
         # by most of Python's inspect/traceback machinery), and in our cache
         linecache.cache[name] = entry
         linecache._ipython_cache[name] = entry
-        return code_obj
+        return name
+
+    def ast_parse(self, source, filename='<unknown>', symbol='exec'):
+        """Parse source code to an AST node.
+
+        The __future__ statements compiled so far are taken into account.
+        """
+        return compile(source, filename, symbol,
+                       self.compiler_flags | PyCF_ONLY_AST, 1)
+
+    def compile_ast(self, node, filename, symbol):
+        """Compile an AST node, as returned by :meth:`ast_parse`.
+
+        The name of cached source (see :meth:`cache`) should be given as the
+        filename.  __future__ statements in the node affect the following
+        compilations, as they do for source code.
+        """
+        return self._compiler.compiler(node, filename, symbol)
 
     def check_cache(self, *args):
         """Call linecache.checkcache() safely protecting our cached values.
@@ -17,11 +17,14 @@ from __future__ import print_function
 
 # Stdlib imports
 import glob
+import imp
 import inspect
 import os
+import pkgutil
 import re
 import shlex
 import sys
+import threading
 
 # Third-party imports
 from time import time
@@ -38,12 +41,14 @@ from IPython.core.ipapi import get as get_ipython
 # Globals and constants
 #-----------------------------------------------------------------------------
 
-# Time in seconds after which the rootmodules will be stored permanently in the
-# ipython ip.db database (kept in the user's .ipython dir).
+# Time in seconds we wait for the initial scan of sys.path, which is stored in
+# the ipython ip.db database (kept in the user's .ipython dir).  If it takes
+# longer, it is finished in the background and partial results are returned.
 TIMEOUT_STORAGE = 2
 
-# Time in seconds after which we give up
-TIMEOUT_GIVEUP = 20
+# Time in seconds we wait for an existing index to be revalidated (which only
+# needs to stat the sys.path entries) before returning what we have.
+TIMEOUT_REFRESH = 0.5
 
 # Regular expression for the python import statement
 import_re = re.compile(r'.*(\.so|\.py[cod]?)$')
@@ -115,39 +120,135 @@ def module_list(path):
 
     return [basename(p).split('.')[0] for p in folder_list]
 
+def path_mtime(path):
+    """Return the modification time of a sys.path entry, or None if missing.
+    """
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class RootModuleScanner(threading.Thread):
+    """Thread that brings the index of root modules up to date.
+
+    The index maps every sys.path entry to a (mtime, modules) tuple.  Entries
+    whose mtime hasn't changed are kept as they are, the others are listed
+    again with :func:`module_list`.  If anything changed, the new index is
+    saved in `db` under the 'rootmodules' key.
+    """
+
+    def __init__(self, db, index, paths):
+        threading.Thread.__init__(self)
+        self.setDaemon(True)
+        self.db = db
+        self.paths = paths
+        # Only keep the entries still on the path, so the index stays bounded
+        self.index = dict((p, index[p]) for p in paths if p in index)
+        self.changed = len(self.index) != len(index)
+        self.announced = False
+        self.lock = threading.Lock()
+
+    def run(self):
+        for path in self.paths:
+            mtime = path_mtime(path)
+            entry = self.index.get(path)
+            if entry is not None and entry[0] == mtime:
+                continue
+            if mtime is None:
+                modules = []
+            else:
+                modules = module_list(path)
+            with self.lock:
+                self.index[path] = (mtime, modules)
+            self.changed = True
+        if self.changed:
+            with self.lock:
+                index = dict(self.index)
+            self.db['rootmodules'] = index
+
+    def modules(self):
+        """Return the list of the root modules indexed so far."""
+        modules = set(sys.builtin_module_names)
+        with self.lock:
+            for mtime, names in self.index.itervalues():
+                modules.update(names)
+        modules.discard('__init__')
+        return list(modules)
+
+
+# The scanner currently (or last) running, shared by all completion requests
+_root_scanner = None
+
 def get_root_modules():
     """
     Returns a list containing the names of all the modules available in the
     folders of the pythonpath.
+
+    The list is kept in an index validated by the mtime of every sys.path
+    entry, which is refreshed in a background thread, so only entries that
+    changed since the last call are listed again.
     """
+    global _root_scanner
     ip = get_ipython()
 
-    if 'rootmodules' in ip.db:
-        return ip.db['rootmodules']
-    
-    t = time()
-    store = False
-    modules = list(sys.builtin_module_names)
-    for path in sys.path:
-        modules += module_list(path)        
-        if time() - t >= TIMEOUT_STORAGE and not store:
-            store = True
-            print("\nCaching the list of root modules, please wait!")
-            print("(This will only be done once - type '%rehashx' to "
-                  "reset cache!)\n")
-            sys.stdout.flush()
-        if time() - t > TIMEOUT_GIVEUP:
-            print("This is taking too long, we give up.\n")
-            ip.db['rootmodules'] = []
-            return []
-    
-    modules = set(modules)
-    if '__init__' in modules:
-        modules.remove('__init__')
-    modules = list(modules)
-    if store:
-        ip.db['rootmodules'] = modules
-    return modules
+    index = ip.db.get('rootmodules')
+    if not isinstance(index, dict):
+        # Missing, or a flat list saved by an older IPython
+        index = {}
+
+    scanner = _root_scanner
+    if scanner is None or not scanner.isAlive():
+        scanner = _root_scanner = RootModuleScanner(ip.db, index,
+                                                    list(sys.path))
+        scanner.start()
+    scanner.join(TIMEOUT_REFRESH if index else TIMEOUT_STORAGE)
+    if scanner.isAlive() and not index and not scanner.announced:
+        scanner.announced = True
+        print("\nCaching the list of root modules in the background, "
+              "completions will be partial until it is done.\n")
+        sys.stdout.flush()
+    return scanner.modules()
+
+
+def find_package_path(fullname):
+    """Return the __path__ of package `fullname`, without importing it.
+
+    Returns None if `fullname` can't be found or isn't a package.
+    """
+    path = None
+    parts = fullname.split('.')
+    for i, part in enumerate(parts):
+        mod = sys.modules.get('.'.join(parts[:i+1]))
+        if mod is not None:
+            # Already imported, this also handles packages which extend
+            # their __path__ at runtime
+            path = getattr(mod, '__path__', None)
+            if path is None:
+                return None
+            continue
+        try:
+            f, pathname, desc = imp.find_module(part, path)
+        except ImportError:
+            return None
+        if f is not None:
+            f.close()
+        if desc[2] != imp.PKG_DIRECTORY:
+            return None
+        path = [pathname]
+    return path
+
+
+def submodule_list(fullname):
+    """Return the names of the submodules of package `fullname`.
+
+    The package itself is not imported, its directories are enumerated with
+    pkgutil instead.
+    """
+    path = find_package_path(fullname)
+    if not path:
+        return []
+    return [name for importer, name, ispkg in pkgutil.iter_modules(path)]
 
 
 def is_importable(module, attr, only_modules):
@@ -175,7 +276,7 @@ def try_import(mod, only_modules=False):
         
     completions.extend(getattr(m, '__all__', []))
     if m_is_init:
-        completions.extend(module_list(os.path.dirname(m.__file__)))
+        completions.extend(submodule_list(mod))
     completions = set(completions)
     if '__init__' in completions:
         completions.remove('__init__')
@@ -233,7 +334,7 @@ def module_completion(line):
         mod = words[1].split('.')
         if len(mod) < 2:
             return get_root_modules()
-        completion_list = try_import('.'.join(mod[:-1]), True)
+        completion_list = submodule_list('.'.join(mod[:-1]))
         return ['.'.join(mod[:-1] + [el]) for el in completion_list]
     
     # 'from xyz import abc<tab>'
@@ -250,11 +351,11 @@ def module_completion(line):
 def module_completer(self,event):
     """Give completions after user has typed 'import ...' or 'from ...'"""
 
-    # This works in all versions of python.  While 2.5 has
-    # pkgutil.walk_packages(), that particular routine is fairly dangerous,
-    # since it imports *EVERYTHING* on sys.path.  That is: a) very slow b) full
-    # of possibly problematic side effects.
-    # This search the folders in the sys.path for available modules.
+    # pkgutil.walk_packages() is fairly dangerous, since it imports
+    # *EVERYTHING* on sys.path.  That is: a) very slow b) full of possibly
+    # problematic side effects.  Instead, we search the folders in sys.path
+    # for available modules, and enumerate the submodules of packages with
+    # pkgutil.iter_modules() on their directories, which doesn't import them.
 
     return module_completion(event.line)
 
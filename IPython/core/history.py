@@ -20,7 +20,8 @@ import sys
 # Our own packages
 import IPython.utils.io
 
-from IPython.core.inputlist import InputList
+from IPython.core.inputlist import InputList, InputStore
+from IPython.utils.autoattr import auto_attr
 from IPython.utils.pickleshare import PickleShareDB
 from IPython.utils.io import ask_yes_no
 from IPython.utils.warn import warn
@@ -46,10 +47,8 @@ class HistoryManager(object):
     output_hist = None
     # String with path to the history file
     hist_file = None
-    # PickleShareDB instance holding the raw data for the shadow history
-    shadow_db = None
-    # ShadowHist instance with the actual shadow history
-    shadow_hist = None
+    # The shadow history objects, shadow_db and shadow_hist, are created on
+    # first use below.
     
     # Private interface
     # Variables used to store the three last inputs from the user.  On each new
@@ -63,12 +62,18 @@ class HistoryManager(object):
         # We need a pointer back to the shell for various tasks.
         self.shell = shell
         
+        # Only the last history_window inputs are kept in memory, older ones
+        # are moved to an on-disk store and read back from it on demand.
+        self.input_store = InputStore()
         # List of input with multi-line handling.
-        self.input_hist = InputList()
+        self.input_hist = InputList(window=shell.history_window,
+                                    store=self.input_store, name='input')
         # This one will hold the 'raw' input history, without any
         # pre-processing.  This will allow users to retrieve the input just as
         # it was exactly typed in by the user, with %hist -r.
-        self.input_hist_raw = InputList()
+        self.input_hist_raw = InputList(window=shell.history_window,
+                                        store=self.input_store,
+                                        name='input_raw')
 
         # list of visited directories
         try:
@@ -86,9 +91,6 @@ class HistoryManager(object):
             histfname = 'history'
         self.hist_file = os.path.join(shell.ipython_dir, histfname)
 
-        # Objects related to shadow history management
-        self._init_shadow_hist()
-    
         self._i00, self._i, self._ii, self._iii = '','','',''
 
         # Object is fully initialized, we can now call methods on it.
@@ -104,21 +106,27 @@ class HistoryManager(object):
         shell.output_hist = self.output_hist
         shell.dir_hist = self.dir_hist
         shell.histfile = self.hist_file
-        shell.shadowhist = self.shadow_hist
-        shell.db = self.shadow_db
+        # shell.db and shell.shadowhist are looked up lazily by the shell.
+
+    @auto_attr
+    def shadow_db(self):
+        """PickleShareDB instance holding the raw data for the shadow history.
 
-    def _init_shadow_hist(self):
+        It is only opened when first needed, as it touches the filesystem."""
         try:
-            self.shadow_db = PickleShareDB(os.path.join(
-                                           self.shell.ipython_dir, 'db'))
+            return PickleShareDB(os.path.join(self.shell.ipython_dir, 'db'))
         except UnicodeDecodeError:
             print("Your ipython_dir can't be decoded to unicode!")
             print("Please set HOME environment variable to something that")
             print(r"only has ASCII characters, e.g. c:\home")
-            print("Now it is", self.ipython_dir)
+            print("Now it is", self.shell.ipython_dir)
             sys.exit()
-        self.shadow_hist = ShadowHist(self.shadow_db, self.shell)
-        
+
+    @auto_attr
+    def shadow_hist(self):
+        """ShadowHist instance with the actual shadow history."""
+        return ShadowHist(self.shadow_db, self.shell)
+
     def save_hist(self):
         """Save input history to a file (via readline library)."""
 
@@ -203,7 +211,10 @@ class HistoryManager(object):
             source_raw = source
         self.input_hist.append(source)
         self.input_hist_raw.append(source_raw)
-        self.shadow_hist.add(source)
+        # Blank inputs (such as the zero entry stored at startup) aren't worth
+        # keeping, and skipping them avoids opening the shadow db needlessly.
+        if source.strip():
+            self.shadow_hist.add(source)
 
         # update the auto _i variables
         self._iii = self._ii
@@ -212,17 +223,25 @@ class HistoryManager(object):
         self._i00 = source_raw
 
         # hackish access to user namespace to create _i1,_i2... dynamically
-        new_i = '_i%s' % self.shell.execution_count
+        count = self.shell.execution_count
+        new_i = '_i%s' % count
         to_main = {'_i': self._i,
                    '_ii': self._ii,
                    '_iii': self._iii,
                    new_i : self._i00 }
         self.shell.user_ns.update(to_main)
+        # Like the history lists, only keep a window of _i<n> variables, the
+        # older inputs are still available as In[n].
+        window = self.input_hist_raw.window
+        if window:
+            self.shell.user_ns.pop('_i%s' % (count - window), None)
 
     def sync_inputs(self):
         """Ensure raw and translated histories have same length."""
         if len(self.input_hist) != len (self.input_hist_raw):
-            self.input_hist_raw = InputList(self.input_hist)
+            self.input_hist_raw = InputList(self.input_hist,
+                                            self.input_hist.window,
+                                            self.input_store, 'input_raw')
 
     def reset(self):
         """Clear all histories managed by this object."""
@@ -1,3 +1,111 @@
+"""Storage for the input history of the shell.
+
+InputList instances can keep only a recent window of entries in memory, and
+spill older ones to an :class:`InputStore` on disk, from which they are read
+back on demand.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010 The IPython Development Team.
+#
+#  Distributed under the terms of the BSD License.
+#
+#  The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import atexit
+import cPickle as pickle
+import os
+import sys
+import tempfile
+
+try:
+    import sqlite3
+except ImportError:
+    # Some python builds lack sqlite, input lists are then never spilled
+    sqlite3 = None
+
+#-----------------------------------------------------------------------------
+# Classes and functions
+#-----------------------------------------------------------------------------
+
+class InputStore(object):
+    """An sqlite backed store of input history entries.
+
+    Entries are stored under a name (one per InputList) and their index.  The
+    database file is only created when the first entry is stored, in a
+    temporary file (removed at exit) unless `filename` is given.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename
+        self.db = None
+        self._is_temp = False
+
+    def _connect(self):
+        if self.db is None:
+            if self.filename is None:
+                fd, self.filename = tempfile.mkstemp(prefix='ipython_hist_',
+                                                     suffix='.sqlite')
+                os.close(fd)
+                self._is_temp = True
+                atexit.register(self.close)
+            self.db = sqlite3.connect(self.filename, check_same_thread=False)
+            # This is scratch storage for the session, we don't need to pay
+            # for durability.
+            self.db.execute('PRAGMA synchronous=OFF')
+            self.db.execute('CREATE TABLE IF NOT EXISTS inputs '
+                            '(name TEXT, idx INTEGER, value BLOB, '
+                            'PRIMARY KEY (name, idx))')
+        return self.db
+
+    def put(self, name, idx, value):
+        """Store `value` as entry `idx` of `name`."""
+        db = self._connect()
+        data = sqlite3.Binary(pickle.dumps(value, 2))
+        db.execute('INSERT OR REPLACE INTO inputs VALUES (?, ?, ?)',
+                   (name, idx, data))
+        db.commit()
+
+    def get_range(self, name, start, stop):
+        """Return the list of entries of `name` in range(start, stop)."""
+        if self.db is None or start >= stop:
+            return []
+        cur = self.db.execute('SELECT value FROM inputs WHERE name=? AND '
+                              'idx>=? AND idx<? ORDER BY idx',
+                              (name, start, stop))
+        return [pickle.loads(str(row[0])) for row in cur]
+
+    def get(self, name, idx):
+        """Return entry `idx` of `name`."""
+        values = self.get_range(name, idx, idx+1)
+        if not values:
+            raise IndexError('no stored input %s[%d]' % (name, idx))
+        return values[0]
+
+    def clear(self, name):
+        """Remove all entries stored under `name`."""
+        if self.db is not None:
+            self.db.execute('DELETE FROM inputs WHERE name=?', (name,))
+            self.db.commit()
+
+    def close(self):
+        """Close the database, removing it if it was a temporary file."""
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if self._is_temp:
+            self._is_temp = False
+            try:
+                os.unlink(self.filename)
+            except OSError:
+                pass
+            self.filename = None
+
+
 class InputList(list):
     """Class to store user input.
 
@@ -8,7 +116,119 @@ class InputList(list):
 
     or
 
-    exec In[5:9] + In[14] + In[21:25]"""
+    exec In[5:9] + In[14] + In[21:25]
+
+    If `window` is non-zero and a `store` is given, only the last `window`
+    entries are kept in memory: older ones are moved to the store, and read
+    back from it when indexed, sliced or iterated over.  Entries are only
+    appended to the list, or all cleared at once with ``l[:] = []``.  Note
+    that code which accesses the underlying list directly from C (such as
+    ``''.join(l)``) only sees the in-memory window.
+    """
+
+    # Number of entries moved to the store, they are at the front of the list
+    offset = 0
+
+    def __init__(self, seq=(), window=0, store=None, name='input'):
+        list.__init__(self)
+        if sqlite3 is None:
+            store = None
+        self.window = window if store is not None else 0
+        self.store = store
+        self.name = name
+        if store is not None:
+            store.clear(name)
+        self.extend(seq)
+
+    def _spill(self):
+        while self.window and list.__len__(self) > self.window:
+            self.store.put(self.name, self.offset, list.__getitem__(self, 0))
+            list.__delitem__(self, 0)
+            self.offset += 1
+
+    def _index(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError('list index out of range')
+        return i
+
+    def append(self, item):
+        list.append(self, item)
+        self._spill()
+
+    def extend(self, seq):
+        for item in seq:
+            self.append(item)
+
+    def __len__(self):
+        return self.offset + list.__len__(self)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[k] for k in xrange(*i.indices(len(self)))]
+        i = self._index(i)
+        if i < self.offset:
+            return self.store.get(self.name, i)
+        return list.__getitem__(self, i - self.offset)
+
+    def __setitem__(self, i, item):
+        if isinstance(i, slice):
+            items = list(self)
+            items[i] = item
+            self[:] = items
+            return
+        i = self._index(i)
+        if i < self.offset:
+            self.store.put(self.name, i, item)
+        else:
+            list.__setitem__(self, i - self.offset, item)
+
+    def _items(self, i, j):
+        """Return a list of the entries in range(i, j), a valid range."""
+        items = self.store.get_range(self.name, i, min(j, self.offset)) \
+                if i < self.offset else []
+        return items + list.__getslice__(self, max(i - self.offset, 0),
+                                         max(j - self.offset, 0))
+
+    def __getslice__(self, i, j):
+        n = len(self)
+        i, j = max(0, min(i, n)), max(0, min(j, n))
+        return ''.join(self._items(i, j))
+
+    def __setslice__(self, i, j, seq):
+        items = self._items(0, len(self))
+        items[i:j] = seq
+        list.__setslice__(self, 0, sys.maxint, [])
+        self.offset = 0
+        if self.store is not None:
+            self.store.clear(self.name)
+        self.extend(items)
+
+    def __delslice__(self, i, j):
+        self.__setslice__(i, j, [])
+
+    def __iter__(self):
+        # Spilled entries are read back in chunks, rather than all at once
+        chunk = max(self.window, 1)
+        for start in xrange(0, self.offset, chunk):
+            for item in self.store.get_range(self.name, start,
+                                             min(start+chunk, self.offset)):
+                yield item
+        for item in list.__iter__(self):
+            yield item
+
+    def __reversed__(self):
+        for item in list.__reversed__(self):
+            yield item
+        for i in xrange(self.offset-1, -1, -1):
+            yield self.store.get(self.name, i)
+
+    def __contains__(self, item):
+        for x in self:
+            if x == item:
+                return True
+        return False
 
-    def __getslice__(self,i,j):
-        return ''.join(list.__getslice__(self,i,j))
+    def __repr__(self):
+        return repr(list(self))
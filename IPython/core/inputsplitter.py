@@ -247,6 +247,115 @@ def split_blocks(python):
     return cmds
 
 
+# Regexps for the incremental scanner: the tokens it cares about outside of
+# strings, and the end of the strings for each kind of quote.
+_scan_re = re.compile(r'(?P<quote>\'\'\'|"""|\'|")|(?P<comment>\#)|'
+                      r'(?P<open>[(\[{])|(?P<close>[)\]}])')
+_string_end_re = {"'": re.compile(r"(?:[^\\']|\\.)*'"),
+                  '"': re.compile(r'(?:[^\\"]|\\.)*"'),
+                  "'''": re.compile(r"(?:[^\\]|\\.)*?'''"),
+                  '"""': re.compile(r'(?:[^\\]|\\.)*?"""')}
+# Strings with single quotes run on to the next line after a backslash
+_string_continued_re = re.compile(r'(?:[^\\]|\\.)*\\$')
+
+
+class InputScanner(object):
+    """Track the open brackets and strings of Python input, line by line.
+
+    This lets :class:`InputSplitter` know that input can't be complete yet,
+    without compiling it all again on each new line.  Only the state at the
+    end of the input is kept, so that scanning a new line doesn't depend on
+    the amount of input scanned before it.
+    """
+    # Depth of bracket nesting
+    brackets = 0
+    # The quote of the string the input ends in, if any
+    string = None
+    # Whether the last non-blank line ends with a backslash
+    continued = False
+    # Whether the last line with code opens an indented block (it ends with a
+    # colon or it is a decorator), so that a body must follow
+    opens_block = False
+    # The indentation of the compound statement headers (if, try, def,
+    # decorators...) whose blocks are still open, innermost last
+    headers = None
+    # The indentation of the first line of the current logical line
+    _line_indent = 0
+
+    def __init__(self):
+        self.headers = []
+
+    def reset(self):
+        self.brackets = 0
+        self.string = None
+        self.continued = False
+        self.opens_block = False
+        self.headers = []
+        self._line_indent = 0
+
+    @property
+    def open(self):
+        """Is the input in the middle of a bracket, string or continuation?"""
+        return self.brackets > 0 or self.string is not None or self.continued
+
+    def feed(self, lines):
+        """Scan one or more lines of input."""
+        for line in lines.splitlines():
+            self._feed_line(line)
+
+    def _feed_line(self, line):
+        string = self.string
+        if not line or line.isspace():
+            # Blank lines don't change anything, except to end a string with
+            # single quotes which would be left unterminated.
+            if string is not None and len(string) == 1:
+                self.string = None
+            return
+        if string is None and self.brackets <= 0 and not self.continued:
+            self._line_indent = num_ini_spaces(line)
+        # Like Python, but more loosely, we take a backslash at the end of
+        # any line (even with trailing whitespace) to continue it.
+        self.continued = line.rstrip().endswith('\\')
+        pos = 0
+        code_end = len(line)
+        while True:
+            if string is not None:
+                m = _string_end_re[string].match(line, pos)
+                if m is None:
+                    if len(string) == 1 and \
+                       not _string_continued_re.match(line, pos):
+                        # Unterminated string, a syntax error
+                        string = None
+                    break
+                pos = m.end()
+                string = None
+            m = _scan_re.search(line, pos)
+            if m is None:
+                break
+            pos = m.end()
+            kind = m.lastgroup
+            if kind == 'quote':
+                string = m.group()
+            elif kind == 'comment':
+                code_end = m.start()
+                break
+            elif kind == 'open':
+                self.brackets += 1
+            else:
+                self.brackets -= 1
+        self.string = string
+        if string is None and self.brackets <= 0 and not self.continued:
+            code = line[:code_end].strip()
+            if code:
+                # A statement closes the blocks it is not indented into
+                headers = self.headers
+                while headers and headers[-1] >= self._line_indent:
+                    headers.pop()
+                self.opens_block = code.endswith(':') or code.startswith('@')
+                if self.opens_block:
+                    headers.append(self._line_indent)
+
+
 class InputSplitter(object):
     """An object that can split Python source input in executable blocks.
 
@@ -285,10 +394,6 @@ class InputSplitter(object):
     # Reading this attribute is the normal way of querying the currently pushed
     # source code, that has been properly encoded.
     source = ''
-    # Code object corresponding to the current source.  It is automatically
-    # synced to the source, so it can be queried at any time to obtain the code
-    # object; it will be None if the source doesn't compile to valid Python.
-    code = None
     # Input mode
     input_mode = 'line'
     
@@ -298,6 +403,15 @@ class InputSplitter(object):
     _buffer = None
     # Command compiler
     _compile = None
+    # Code object for the current source, and whether it must be compiled
+    # before being returned by the code property
+    _code = None
+    _code_stale = False
+    # Incremental scanner of the input
+    _scanner = None
+    # Whether the input has been found to be invalid.  Further input can't
+    # make it valid again.
+    _syntax_error = False
     # Mark when input has changed indentation all the way back to flush-left
     _full_dedent = False
     # Boolean indicating whether the current block is complete
@@ -326,6 +440,7 @@ class InputSplitter(object):
         """
         self._buffer = []
         self._compile = codeop.CommandCompiler()
+        self._scanner = InputScanner()
         self.encoding = get_input_encoding()
         self.input_mode = InputSplitter.input_mode if input_mode is None \
                           else input_mode
@@ -335,9 +450,28 @@ class InputSplitter(object):
         self.indent_spaces = 0
         self._buffer[:] = []
         self.source = ''
-        self.code = None
+        self._code, self._code_stale = None, False
         self._is_complete = False
         self._full_dedent = False
+        self._syntax_error = False
+        self._scanner.reset()
+
+    @property
+    def code(self):
+        """Code object corresponding to the current source.
+
+        It is automatically synced to the source, so it can be queried at any
+        time to obtain the code object; it will be None if the source doesn't
+        compile to valid Python.
+        """
+        if self._code_stale:
+            self._code_stale = False
+            try:
+                self._code = self._compile(self.source)
+            except (SyntaxError, OverflowError, ValueError, TypeError,
+                    MemoryError):
+                pass
+        return self._code
 
     def source_reset(self):
         """Return the input source and perform a full reset.
@@ -367,37 +501,67 @@ class InputSplitter(object):
         plus prior inputs) forms a complete Python execution block.  Note that
         this value is also stored as a private attribute (_is_complete), so it
         can be queried at any time.
+
+        The whole input is only compiled when it may have become complete.
+        It isn't while brackets, strings or continued lines that were opened
+        on previous lines are still open, which keeps pushing long literals
+        line by line linear in their size.  Indented lines outside of any
+        compound statement are complete unless they open a block, and their
+        code is only compiled if it is asked for.
         """
         if self.input_mode == 'cell':
             self.reset()
         
         self._store(lines)
-        source = self.source
+        scanner = self._scanner
+        # Continued lines are not compiled, so the input must be checked
+        # after them even if it still looks open.
+        was_open = scanner.open and not scanner.continued
+        scanner.feed(lines)
 
         # Before calling _compile(), reset the code object to None so that if an
         # exception is raised in compilation, we don't mislead by having
         # inconsistent code/source attributes.
-        self.code, self._is_complete = None, None
+        self._code, self._code_stale, self._is_complete = None, False, None
 
         # Honor termination lines properly
-        if source.rstrip().endswith('\\'):
+        if scanner.continued:
             return False
 
         self._update_indent(lines)
+        if self._syntax_error:
+            self._is_complete = True
+            return True
+        if was_open and scanner.open:
+            # The input was already checked up to the line which opened the
+            # bracket or string, only its end can make it complete.
+            self._is_complete = False
+            return False
+        last_line = self._last_line()
+        if self.indent_spaces > 0 and not scanner.open and \
+               not scanner.headers and last_line and not last_line.isspace():
+            # Indented lines outside of any compound statement, such as the
+            # end of a bracket, are compiled on demand.  The body of a
+            # compound statement is compiled, as it may need more clauses.
+            self._code_stale = True
+            self._is_complete = not scanner.opens_block
+            return self._is_complete
+
         try:
-            self.code = self._compile(source)
+            self._code = self._compile(self.source)
         # Invalid syntax can produce any of a number of different errors from
         # inside the compiler, so we have to catch them all.  Syntax errors
-        # immediately produce a 'ready' block, so the invalid Python can be
-        # sent to the kernel for evaluation with possible ipython
-        # special-syntax conversion.
+        # produce a 'ready' block as soon as they are found, so the invalid
+        # Python can be sent to the kernel for evaluation with possible
+        # ipython special-syntax conversion.  Errors inside a bracket or
+        # string opened on a previous line are only found when it closes.
         except (SyntaxError, OverflowError, ValueError, TypeError,
                 MemoryError):
-            self._is_complete = True
+            self._is_complete = self._syntax_error = True
         else:
             # Compilation didn't produce any exceptions (though it may not have
             # given a complete code object)
-            self._is_complete = self.code is not None
+            self._is_complete = self._code is not None
 
         return self._is_complete
 
@@ -456,7 +620,7 @@ class InputSplitter(object):
 
         # When input is complete, then termination is marked by an extra blank
         # line at the end.
-        last_line = self.source.splitlines()[-1]
+        last_line = self._last_line()
         return bool(last_line and not last_line.isspace())
         
     def split_blocks(self, lines):
@@ -586,6 +750,12 @@ class InputSplitter(object):
             
         return indent_spaces, full_dedent
     
+    def _last_line(self):
+        """Return the last line of input, without its newline."""
+        if not self._buffer:
+            return ''
+        return self._buffer[-1].splitlines()[-1]
+
     def _update_indent(self, lines):
         for line in remove_comments(lines).splitlines():
             if line and not line.isspace():
@@ -600,14 +770,11 @@ class InputSplitter(object):
         if buffer is None:
             buffer = self._buffer
             
-        if lines.endswith('\n'):
-            buffer.append(lines)
-        else:
-            buffer.append(lines+'\n')
-        setattr(self, store, self._set_source(buffer))
-
-    def _set_source(self, buffer):
-        return ''.join(buffer).encode(self.encoding)
+        if not lines.endswith('\n'):
+            lines += '\n'
+        buffer.append(lines)
+        # Only encode the new lines, the rest is unchanged
+        setattr(self, store, getattr(self, store) + lines.encode(self.encoding))
 
 
 #-----------------------------------------------------------------------------
@@ -934,6 +1101,11 @@ class IPythonInputSplitter(InputSplitter):
     # List with lines of raw input accumulated so far.
     _buffer_raw = None
 
+    # The static transformations of IPython syntax, applied line by line
+    _transforms = [transform_escaped, transform_assign_system,
+                   transform_assign_magic, transform_ipy_prompt,
+                   transform_classic_prompt]
+
     def __init__(self, input_mode=None):
         InputSplitter.__init__(self, input_mode)
         self._buffer_raw = []
@@ -963,10 +1135,7 @@ class IPythonInputSplitter(InputSplitter):
             lines = lines.decode(self.encoding)
 
         lines_list = lines.splitlines()
-
-        transforms = [transform_escaped, transform_assign_system,
-                      transform_assign_magic, transform_ipy_prompt,
-                      transform_classic_prompt]
+        transforms = self._transforms
 
         # Transform logic
         #
@@ -1012,3 +1181,36 @@ class IPythonInputSplitter(InputSplitter):
             if changed_input_mode:
                 self.input_mode = saved_input_mode
         return out
+
+    def transform_cell(self, cell):
+        """Transform a whole cell of IPython input to Python source.
+
+        This is like pushing the cell in 'cell' mode and taking the source,
+        but without checking at each line whether the input is complete,
+        which would cost a compilation of all the input pushed so far.  The
+        transformations are applied to the lines which don't continue a
+        bracket, string or backslash-continued line, except comments, which
+        could otherwise be taken for help requests.  The state of the splitter
+        isn't changed.
+
+        Parameters
+        ----------
+        cell : str
+          One or more lines of IPython input.
+
+        Returns
+        -------
+        The Python source, encoded like :attr:`source`.
+        """
+        if type(cell)==str:
+            cell = cell.decode(self.encoding)
+        scanner = InputScanner()
+        transforms = self._transforms
+        out = []
+        for line in cell.splitlines():
+            if not (scanner.open or line.lstrip().startswith('#')):
+                for f in transforms:
+                    line = f(line)
+            scanner.feed(line)
+            out.append(line)
+        return (u'\n'.join(out) + u'\n').encode(self.encoding)
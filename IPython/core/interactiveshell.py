@@ -20,6 +20,7 @@ from __future__ import absolute_import
 import __builtin__
 import __future__
 import abc
+import ast
 import atexit
 import codeop
 import os
@@ -56,6 +57,7 @@ from IPython.external.Itpl import ItplNS
 from IPython.utils import PyColorize
 from IPython.utils import io
 from IPython.utils import pickleshare
+from IPython.utils.autoattr import auto_attr
 from IPython.utils.doctestreload import doctest_reload
 from IPython.utils.io import ask_yes_no, rprint
 from IPython.utils.ipstruct import Struct
@@ -64,6 +66,7 @@ from IPython.utils.process import system, getoutput
 from IPython.utils.strdispatch import StrDispatch
 from IPython.utils.syspathcontext import prepended_to_syspath
 from IPython.utils.text import num_ini_spaces, format_screen, LSString, SList
+from IPython.utils.timing import StartupTimer
 from IPython.utils.traitlets import (Int, Str, CBool, CaselessStrEnum, Enum,
                                      List, Unicode, Instance, Type)
 from IPython.utils.warn import warn, error, fatal
@@ -139,12 +142,19 @@ class InteractiveShell(Configurable, Magic):
     """An enhanced, interactive shell for Python."""
 
     _instance = None
+    # Transformers applied to the AST of each cell before it is compiled:
+    # objects with a visit(node) method returning the new node, like
+    # ast.NodeTransformer instances.
+    ast_transformers = List([])
     autocall = Enum((0,1,2), default_value=1, config=True)
     # TODO: remove all autoindent logic and put into frontends.
     # We can't do this yet because even runlines uses the autoindent.
     autoindent = CBool(True, config=True)
     automagic = CBool(True, config=True)
     cache_size = Int(1000, config=True)
+    # Number of inputs kept in memory in the input history, older ones are
+    # moved to a temporary file on disk.  0 keeps everything in memory.
+    history_window = Int(1000, config=True)
     color_info = CBool(True, config=True)
     colors = CaselessStrEnum(('NoColor','LightBG','Linux'), 
                              default_value=get_default_colors(), config=True)
@@ -175,6 +185,8 @@ class InteractiveShell(Configurable, Magic):
     prompt_out = Str('Out[\\#]: ', config=True)
     prompts_pad_left = CBool(True, config=True)
     quiet = CBool(False, config=True)
+    # Report the time taken by each init_* step and by the imports they do
+    startup_timing = CBool(False, config=True)
 
     # The readline stuff will eventually be moved to the terminal subclass
     # but for now, we can't do that as readline is welded in everywhere.
@@ -219,6 +231,9 @@ class InteractiveShell(Configurable, Magic):
     payload_manager = Instance('IPython.core.payload.PayloadManager')
     history_manager = Instance('IPython.core.history.HistoryManager')
 
+    # StartupTimer instance, only set while startup_timing is active
+    startup_timer = None
+
     # Private interface
     _post_execute = set()
 
@@ -230,6 +245,9 @@ class InteractiveShell(Configurable, Magic):
         # from the values on config.
         super(InteractiveShell, self).__init__(config=config)
 
+        if self.startup_timing:
+            self.start_startup_timing()
+
         # These are relatively independent and stateless
         self.init_ipython_dir(ipython_dir)
         self.init_instance_attrs()
@@ -268,7 +286,7 @@ class InteractiveShell(Configurable, Magic):
         self.init_logstart()
 
         # The following was in post_config_initialization
-        self.init_inspector()
+        # The object inspector is created on first use, see inspector below.
         # init_readline() must come before init_io(), because init_io uses
         # readline related things.
         self.init_readline()
@@ -293,6 +311,9 @@ class InteractiveShell(Configurable, Magic):
         self.hooks.late_startup_hook()
         atexit.register(self.atexit_operations)
 
+        if self.startup_timer is not None:
+            self.stop_startup_timing()
+
     @classmethod
     def instance(cls, *args, **kwargs):
         """Returns a global InteractiveShell instance."""
@@ -345,6 +366,35 @@ class InteractiveShell(Configurable, Magic):
         else:
             self.autoindent = value
 
+    #-------------------------------------------------------------------------
+    # Startup timing
+    #-------------------------------------------------------------------------
+
+    def start_startup_timing(self):
+        """Start timing the init_* methods and the imports they trigger.
+
+        Every init_* method is shadowed by a timed wrapper in the instance
+        dict, so that overrides in subclasses are timed as well.
+        """
+        timer = self.startup_timer = StartupTimer()
+        for name in dir(self):
+            if name.startswith('init_'):
+                meth = getattr(self, name)
+                if callable(meth):
+                    setattr(self, name, timer.wrap(name, meth))
+        timer.start_imports()
+
+    def stop_startup_timing(self):
+        """Stop timing the startup and print the report."""
+        timer = self.startup_timer
+        timer.stop_imports()
+        for name in self.__dict__.keys():
+            if name.startswith('init_'):
+                delattr(self, name)
+        self.startup_timer = None
+        # Use the real stderr, which kernels don't redirect to their clients
+        io.raw_print_err(timer.report())
+
     #-------------------------------------------------------------------------
     # init_* methods called by __init__
     #-------------------------------------------------------------------------
@@ -454,6 +504,17 @@ class InteractiveShell(Configurable, Magic):
                                             'NoColor',
                                             self.object_info_string_level)
 
+    @auto_attr
+    def inspector(self):
+        # The inspector isn't needed until the user asks for object info, so
+        # it is created on first access rather than at startup, with the
+        # color scheme %colors would have given it.
+        self.init_inspector()
+        inspector = self.__dict__['inspector']
+        if self.color_info:
+            inspector.set_active_scheme(self.colors)
+        return inspector
+
     def init_io(self):
         # This will just use sys.stdout and sys.stderr. If you want to
         # override sys.stdout and sys.stderr themselves, you need to do that
@@ -1227,6 +1288,16 @@ class InteractiveShell(Configurable, Magic):
     def init_history(self):
         self.history_manager = HistoryManager(shell=self)
 
+    # For backwards compatibility, the shadow history and its database are
+    # reachable from the shell.  They are opened on first use.
+    @auto_attr
+    def db(self):
+        return self.history_manager.shadow_db
+
+    @auto_attr
+    def shadowhist(self):
+        return self.history_manager.shadow_hist
+
     def save_hist(self):
         """Save input history to a file (via readline library)."""
         self.history_manager.save_hist()
@@ -1593,23 +1664,15 @@ class InteractiveShell(Configurable, Magic):
         This creates completion machinery that can be used by client code,
         either interactively in-process (typically triggered by the readline
         library), programatically (such as in test suites) or out-of-prcess
-        (typically over the network by remote frontends).
+        (typically over the network by remote frontends).  The completer
+        object itself is only built on first use, see :attr:`Completer`.
         """
-        from IPython.core.completer import IPCompleter
         from IPython.core.completerlib import (module_completer,
                                                magic_run_completer, cd_completer)
         
-        self.Completer = IPCompleter(self,
-                                     self.user_ns,
-                                     self.user_global_ns,
-                                     self.readline_omit__names,
-                                     self.alias_manager.alias_table,
-                                     self.has_readline)
-        
         # Add custom completers to the basic ones built into IPCompleter
         sdisp = self.strdispatchers.get('complete_command', StrDispatch())
         self.strdispatchers['complete_command'] = sdisp
-        self.Completer.custom_completers = sdisp
 
         self.set_hook('complete_command', module_completer, str_key = 'import')
         self.set_hook('complete_command', module_completer, str_key = 'from')
@@ -1622,6 +1685,21 @@ class InteractiveShell(Configurable, Magic):
         if self.has_readline:
             self.set_readline_completer()
 
+    @auto_attr
+    def Completer(self):
+        # Frontends which never complete (or only do so over the network)
+        # don't need to pay for this at startup.
+        from IPython.core.completer import IPCompleter
+
+        completer = IPCompleter(self,
+                                self.user_ns,
+                                self.user_global_ns,
+                                self.readline_omit__names,
+                                self.alias_manager.alias_table,
+                                self.has_readline)
+        completer.custom_completers = self.strdispatchers['complete_command']
+        return completer
+
     def complete(self, text, line=None, cursor_pos=None):
         """Return the completed text and a list of completions.
 
@@ -1678,7 +1756,9 @@ class InteractiveShell(Configurable, Magic):
 
     def set_readline_completer(self):
         """Reset readline's completer to be our own."""
-        self.readline.set_completer(self.Completer.rlcomplete)
+        # Don't build the completer until readline asks for a completion
+        self.readline.set_completer(
+            lambda text, state: self.Completer.rlcomplete(text, state))
 
     def set_completer_frame(self, frame=None):
         """Set the frame of the completer."""
@@ -2058,18 +2138,16 @@ class InteractiveShell(Configurable, Magic):
     def run_cell(self, cell):
         """Run the contents of an entire multiline 'cell' of code.
 
-        The cell is split into separate blocks which can be executed
-        individually.  Then, based on how many blocks there are, they are
-        executed as follows:
-
-        - A single block: 'single' mode.
+        The IPython syntax of the cell is transformed to Python, and then:
 
-        If there's more than one block, it depends:
+        - A single line is run in 'single' mode, after the dynamic
+          transformations (automagic, autocall, aliases) are applied to it.
 
-        - if the last one is no more than two lines long, run all but the last
-        in 'exec' mode and the very last one in 'single' mode.  This makes it
-        easy to type simple expressions at the end to see computed values.  -
-        otherwise (last one is also multiline), run all in 'exec' mode
+        - Otherwise the cell is parsed once to an abstract syntax tree, which
+          goes through the :attr:`ast_transformers`, and its statements are
+          run as described in :meth:`run_ast_nodes`: if the last one is an
+          expression, it is run in 'single' mode and all the others in
+          'exec' mode, otherwise all of them are run in 'exec' mode.
 
         When code is executed in 'single' mode, :func:`sys.displayhook` fires,
         results are displayed and output prompts are computed.  In 'exec' mode,
@@ -2081,18 +2159,14 @@ class InteractiveShell(Configurable, Magic):
         cell : str
           A single or multiline string.
         """
-        
-        # We need to break up the input into executable blocks that can be run
-        # in 'single' mode, to provide comfortable user behavior.
-        blocks = self.input_splitter.split_blocks(cell)
-        
-        if not blocks:
+        if not cell or cell.isspace():
             return
 
-        # Store the 'ipython' version of the cell as well, since that's what
-        # needs to go into the translated history and get executed (the
-        # original cell may contain non-python syntax).
-        ipy_cell = ''.join(blocks)
+        # Apply the static transformations of the IPython syntax.  Store the
+        # 'ipython' version of the cell as well, since that's what needs to
+        # go into the translated history and get executed (the original cell
+        # may contain non-python syntax).
+        ipy_cell = self.input_splitter.transform_cell(cell)
 
         # Store raw and processed history
         self.history_manager.store_inputs(ipy_cell, cell)
@@ -2114,42 +2188,104 @@ class InteractiveShell(Configurable, Magic):
         # All user code execution must happen with our context managers active
         with nested(self.builtin_trap, self.display_trap):
 
-            # Single-block input should behave like an interactive prompt
-            if len(blocks) == 1:
+            # Single-line input should behave like an interactive prompt
+            if len(ipy_cell.splitlines()) <= 1:
                 # since we return here, we need to update the execution count
-                out = self.run_one_block(blocks[0])
+                out = self.run_single_line(ipy_cell)
                 self.execution_count += 1
                 return out
 
-            # In multi-block input, if the last block is a simple (one-two
-            # lines) expression, run it in single mode so it produces output.
-            # Otherwise just feed the whole thing to run_code.  This seems like
-            # a reasonable usability design.
-            last = blocks[-1]
-            last_nlines = len(last.splitlines())
-
-            # Note: below, whenever we call run_code, we must sync history
-            # ourselves, because run_code is NOT meant to manage history at all.
-            if last_nlines < 2:
-                # Here we consider the cell split between 'body' and 'last',
-                # store all history and execute 'body', and if successful, then
-                # proceed to execute 'last'.
-
-                # Get the main body to run as a cell
-                ipy_body = ''.join(blocks[:-1])
-                retcode = self.run_source(ipy_body, symbol='exec',
-                                          post_execute=False)
-                if retcode==0:
-                    # And the last expression via runlines so it produces output
-                    self.run_one_block(last)
+            # We need to ensure that the source is unicode from here on.
+            if type(ipy_cell)==str:
+                ipy_cell = ipy_cell.decode(self.stdin_encoding)
+            cell_name = self.compile.cache(ipy_cell, self.execution_count)
+            try:
+                code_ast = self.compile.ast_parse(ipy_cell, cell_name)
+            except (OverflowError, SyntaxError, ValueError, TypeError,
+                    MemoryError):
+                self.showsyntaxerror()
             else:
-                # Run the whole cell as one entity, storing both raw and
-                # processed input in history
-                self.run_source(ipy_cell, symbol='exec')
+                code_ast = self.transform_ast(code_ast)
+                self.run_ast_nodes(code_ast.body, cell_name)
 
         # Each cell is a *single* input, regardless of how many lines it has
         self.execution_count += 1
 
+    def transform_ast(self, node):
+        """Apply the :attr:`ast_transformers` to an AST node.
+
+        A transformer which raises an exception is reported and removed, and
+        the node is then used as it was before that transformer.
+        """
+        for transformer in list(self.ast_transformers):
+            try:
+                node = transformer.visit(node)
+            except Exception:
+                warn('AST transformer %r threw an error. It will be '
+                     'unregistered.' % transformer)
+                self.ast_transformers.remove(transformer)
+        return ast.fix_missing_locations(node)
+
+    def run_ast_nodes(self, nodelist, cell_name, interactivity='last_expr'):
+        """Run a sequence of AST nodes.
+
+        The nodes to run in 'exec' mode are compiled together, and those to
+        run in 'single' mode (so that their values are displayed) each on
+        their own.  Execution stops at the first error.
+
+        Parameters
+        ----------
+        nodelist : list
+          A sequence of AST nodes to run.
+        cell_name : str
+          The name under which the source of the nodes was cached (see
+          :meth:`CachingCompiler.cache`), used as their filename.
+        interactivity : str
+          'all', 'last', 'last_expr' or 'none', specifying which nodes are run
+          in 'single' mode.  'last_expr' runs the last node in 'single' mode
+          only if it is an expression.
+
+        Returns
+        -------
+        0 if all the nodes ran successfully, 1 otherwise.
+        """
+        if not nodelist:
+            return 0
+
+        if interactivity == 'last_expr':
+            if isinstance(nodelist[-1], ast.Expr):
+                interactivity = 'last'
+            else:
+                interactivity = 'none'
+
+        if interactivity == 'none':
+            to_run_exec, to_run_interactive = nodelist, []
+        elif interactivity == 'last':
+            to_run_exec, to_run_interactive = nodelist[:-1], nodelist[-1:]
+        elif interactivity == 'all':
+            to_run_exec, to_run_interactive = [], nodelist
+        else:
+            raise ValueError('Interactivity was %r' % interactivity)
+
+        # Only the last code object run triggers the post-execution functions
+        compile_ast = self.compile.compile_ast
+        to_run = []
+        if to_run_exec:
+            to_run.append((ast.Module(to_run_exec), 'exec'))
+        for node in to_run_interactive:
+            to_run.append((ast.Interactive([node]), 'single'))
+        for i, (mod, symbol) in enumerate(to_run):
+            try:
+                code = compile_ast(mod, cell_name, symbol)
+            except (OverflowError, SyntaxError, ValueError, TypeError,
+                    MemoryError):
+                self.showsyntaxerror()
+                return 1
+            self.code_to_run = code
+            if self.run_code(code, post_execute=(i == len(to_run)-1)):
+                return 1
+        return 0
+
     def run_one_block(self, block):
         """Run a single interactive block.
 
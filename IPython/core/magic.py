@@ -25,7 +25,9 @@ import shutil
 import re
 import time
 import textwrap
+import threading
 import types
+import Queue
 from cStringIO import StringIO
 from getopt import getopt,GetoptError
 from pprint import pformat
@@ -87,6 +89,78 @@ def compress_dhist(dh):
     return newhead + tail        
 
 
+def _list_executables(pdir, isexec):
+    """Return the names of the entries of `pdir` for which `isexec` is true.
+
+    `isexec` is called with the full path of each entry, so no chdir into
+    `pdir` is needed."""
+    try:
+        names = os.listdir(pdir)
+    except OSError:
+        return []
+    return [ff for ff in names if isexec(os.path.join(pdir, ff))]
+
+
+def scan_executables(dirs, isexec, cache=None, nthreads=8):
+    """Find the executables in a list of directories, reusing a cache.
+
+    The directories are examined concurrently by up to `nthreads` threads,
+    so that slow (e.g. network-mounted) entries don't serialize the scan.
+
+    Parameters
+    ----------
+    dirs : list of str
+      Directories to scan.
+
+    isexec : callable
+      Called with the full path of each entry, returns True if it should be
+      considered an executable.
+
+    cache : dict, optional
+      Result of a previous call.  Directories whose mtime hasn't changed
+      since then are not listed again.
+
+    nthreads : int, optional
+      Maximum number of scanning threads.
+
+    Returns
+    -------
+    A dict mapping every existing directory in `dirs` to an (mtime, names)
+    tuple, suitable for being passed back as `cache` later.
+    """
+    if cache is None:
+        cache = {}
+    todo = Queue.Queue()
+    for pdir in dirs:
+        todo.put(pdir)
+    scanned = {}
+
+    def worker():
+        while True:
+            try:
+                pdir = todo.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                mtime = os.stat(pdir).st_mtime
+            except OSError:
+                continue
+            cached = cache.get(pdir)
+            if cached is not None and cached[0] == mtime:
+                scanned[pdir] = cached
+            else:
+                scanned[pdir] = (mtime, _list_executables(pdir, isexec))
+
+    threads = [threading.Thread(target=worker)
+               for i in range(min(nthreads, len(dirs)))]
+    for t in threads:
+        t.setDaemon(True)
+        t.start()
+    for t in threads:
+        t.join()
+    return scanned
+
+
 #***************************************************************************
 # Main class implementing Magic functionality
 
@@ -2415,7 +2489,10 @@ Defaulting color scheme to 'NoColor'"""
         except:
             color_switch_err('exception')
 
-        # Set info (for 'object?') colors
+        # Set info (for 'object?') colors.  If the inspector hasn't been
+        # created yet, it will pick up the shell's colors when it is.
+        if 'inspector' not in shell.__dict__:
+            return
         if shell.color_info:
             try:
                 shell.inspector.set_active_scheme(new_scheme)
@@ -2531,24 +2608,35 @@ Defaulting color scheme to 'NoColor'"""
 
         This version explicitly checks that every entry in $PATH is a file
         with execute access (os.X_OK), so it is much slower than %rehash.
+        The directories are scanned concurrently, and their contents are
+        cached (keyed by directory mtime) in the IPython database, so that
+        subsequent calls only rescan the directories that changed.  Aliases
+        are only redefined for the commands that are new or different.
 
         Under Windows, it checks executability as a match agains a
         '|'-separated string of extensions, stored in the IPython config
         variable win_exec_ext.  This defaults to 'exe|com|bat'.
-        
-        This function also resets the root module cache of module completer,
-        used on slow filesystems.
+
+        Options:
+
+          -f: force a full rescan, ignoring the directory cache.  This also
+          resets the root module cache of the module completer, used on slow
+          filesystems.
         """
         from IPython.core.alias import InvalidAliasError
 
-        # for the benefit of module completer in ipy_completers.py
-        del self.db['rootmodules']
-        
+        opts, args = self.parse_options(parameter_s, 'f')
+        db = self.db
+        if 'f' in opts:
+            # The module completer of completerlib rescans sys.path too
+            del db['rootmodules']
+            cache = {}
+        else:
+            cache = db.get('rehashx_cache', {})
+
         path = [os.path.abspath(os.path.expanduser(p)) for p in 
             os.environ.get('PATH','').split(os.pathsep)]
-        path = filter(os.path.isdir,path)
 
-        syscmdlist = []
         # Now define isexec in a cross platform manner.
         if os.name == 'posix':
             isexec = lambda fname:os.path.isfile(fname) and \
@@ -2562,47 +2650,43 @@ Defaulting color scheme to 'NoColor'"""
                 winext += '|py'
             execre = re.compile(r'(.*)\.(%s)$' % winext,re.IGNORECASE)
             isexec = lambda fname:os.path.isfile(fname) and execre.match(fname)
-        savedir = os.getcwd()
 
-        # Now walk the paths looking for executables to alias.
-        try:
-            # write the whole loop for posix/Windows so we don't have an if in
-            # the innermost part
-            if os.name == 'posix':
-                for pdir in path:
-                    os.chdir(pdir)
-                    for ff in os.listdir(pdir):
-                        if isexec(ff):
-                            try:
-                                # Removes dots from the name since ipython
-                                # will assume names with dots to be python.
-                                self.shell.alias_manager.define_alias(
-                                    ff.replace('.',''), ff)
-                            except InvalidAliasError:
-                                pass
-                            else:
-                                syscmdlist.append(ff)
-            else:
-                no_alias = self.shell.alias_manager.no_alias
-                for pdir in path:
-                    os.chdir(pdir)
-                    for ff in os.listdir(pdir):
-                        base, ext = os.path.splitext(ff)
-                        if isexec(ff) and base.lower() not in no_alias:
-                            if ext.lower() == '.exe':
-                                ff = base
-                                try:
-                                    # Removes dots from the name since ipython
-                                    # will assume names with dots to be python.
-                                    self.shell.alias_manager.define_alias(
-                                        base.lower().replace('.',''), ff)
-                                except InvalidAliasError:
-                                    pass
-                                syscmdlist.append(ff)
-            db = self.db
-            db['syscmdlist'] = syscmdlist
-        finally:
-            os.chdir(savedir)
+        scanned = scan_executables(path, isexec, cache)
+
+        # Only (re)define the aliases that aren't already in place, so that
+        # repeated calls don't pay for validating thousands of aliases again.
+        alias_manager = self.shell.alias_manager
+        alias_table = alias_manager.alias_table
+        def define(name, cmd):
+            if name in alias_table and alias_table[name][1] == cmd:
+                return True
+            try:
+                alias_manager.define_alias(name, cmd)
+            except InvalidAliasError:
+                return False
+            return True
+
+        syscmdlist = []
+        # Walk the paths in order looking for executables to alias.
+        if os.name == 'posix':
+            for pdir in path:
+                for ff in scanned.get(pdir, (None, []))[1]:
+                    # Removes dots from the name since ipython
+                    # will assume names with dots to be python.
+                    if define(ff.replace('.',''), ff):
+                        syscmdlist.append(ff)
+        else:
+            no_alias = alias_manager.no_alias
+            for pdir in path:
+                for ff in scanned.get(pdir, (None, []))[1]:
+                    base, ext = os.path.splitext(ff)
+                    if base.lower() not in no_alias and ext.lower() == '.exe':
+                        # Removes dots from the name since ipython
+                        # will assume names with dots to be python.
+                        define(base.lower().replace('.',''), base)
+                        syscmdlist.append(base)
+        db['rehashx_cache'] = scanned
+        db['syscmdlist'] = syscmdlist
         
     def magic_pwd(self, parameter_s = ''):
         """Return the current working directory path."""
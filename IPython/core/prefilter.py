@@ -27,6 +27,7 @@ Authors:
 
 import __builtin__
 import codeop
+import keyword
 import re
 
 from IPython.core.alias import AliasManager
@@ -80,6 +81,17 @@ re_exclude_auto = re.compile(r'^[,&^\|\*/\+-]'
 # nasty enough that I shouldn't change it until I can test it _well_.
 #self.re_fun_name = re.compile (r'[a-zA-Z_]([a-zA-Z0-9_.\[\]]*) ?$')
 
+# RegExps for the escapes and prompts that the default transformers and
+# checkers look for at the start of a line, and for assignments from system
+# commands or magics.  Lines which have none of these, and don't end with the
+# help or emacs markers, only need their initial identifier checked.
+re_special_start = re.compile(r'[,;/?]|\s*([!%]|>>>|\.\.\.|In \[)')
+re_assign_escape = re.compile(r'=\s*[!%]')
+
+# RegExp splitting a line like LineInfo does when the initial identifier is
+# followed by whitespace: returns the identifier and the next non-blank char.
+re_plain_split = re.compile(r'\s*([\w.]+)(?:\s+|\Z)(\S?)')
+
 
 # Handler Check Utilities
 def is_shadowed(identifier, ip):
@@ -128,19 +140,44 @@ class LineInfo(object):
     
     the_rest
       Everything else on the line.
+
+    The line is only split into these parts when one of them is first
+    accessed, so that lines which go straight to the normal handler don't pay
+    for it.  They always describe the line given to the constructor, even if
+    a handler rewrites `line` in the meantime.
     """
     def __init__(self, line, continue_prompt):
         self.line            = line
         self.continue_prompt = continue_prompt
-        self.pre, self.ifun, self.the_rest = split_user_input(line)
+        self._split_line = line
+        self._oinfo = None
 
-        self.pre_char       = self.pre.strip()
-        if self.pre_char:
-            self.pre_whitespace = '' # No whitespace allowd before esc chars
-        else: 
-            self.pre_whitespace = self.pre
+    @auto_attr
+    def _split(self):
+        return split_user_input(self._split_line)
 
-        self._oinfo = None
+    @auto_attr
+    def pre(self):
+        return self._split[0]
+
+    @auto_attr
+    def ifun(self):
+        return self._split[1]
+
+    @auto_attr
+    def the_rest(self):
+        return self._split[2]
+
+    @auto_attr
+    def pre_char(self):
+        return self.pre.strip()
+
+    @auto_attr
+    def pre_whitespace(self):
+        if self.pre_char:
+            return '' # No whitespace allowd before esc chars
+        else:
+            return self.pre
 
     def ofind(self, ip):
         """Do a full, attribute-walking lookup of the ifun in the various
@@ -207,6 +244,10 @@ class PrefilterManager(Configurable):
     Users or developers can change the priority or enabled attribute of
     transformers or checkers, but they must call the :meth:`sort_checkers`
     or :meth:`sort_transformers` method after changing the priority.
+
+    As long as only the default transformers and checkers are in use, plain
+    Python lines (see :meth:`is_plain_line`) skip them and go directly to the
+    normal handler, since none of them would act on such lines anyway.
     """
 
     multi_line_specials = CBool(True, config=True)
@@ -215,6 +256,8 @@ class PrefilterManager(Configurable):
     def __init__(self, shell=None, config=None):
         super(PrefilterManager, self).__init__(shell=shell, config=config)
         self.shell = shell
+        # Whether the plain line fast path can be used, None when unknown
+        self._plain_path = None
         self.init_transformers()
         self.init_handlers()
         self.init_checkers()
@@ -238,6 +281,7 @@ class PrefilterManager(Configurable):
         The :meth:`register_transformer` method calls this automatically.
         """
         self._transformers.sort(key=lambda x: x.priority)
+        self._plain_path = None
 
     @property
     def transformers(self):
@@ -248,12 +292,16 @@ class PrefilterManager(Configurable):
         """Register a transformer instance."""
         if transformer not in self._transformers:
             self._transformers.append(transformer)
+            transformer.on_trait_change(self._reset_plain_path, 'enabled')
             self.sort_transformers()
 
     def unregister_transformer(self, transformer):
         """Unregister a transformer instance."""
         if transformer in self._transformers:
             self._transformers.remove(transformer)
+            transformer.on_trait_change(self._reset_plain_path, 'enabled',
+                                        remove=True)
+            self._plain_path = None
 
     #-------------------------------------------------------------------------
     # API for managing checkers
@@ -274,6 +322,7 @@ class PrefilterManager(Configurable):
         The :meth:`register_checker` method calls this automatically.
         """
         self._checkers.sort(key=lambda x: x.priority)
+        self._plain_path = None
 
     @property
     def checkers(self):
@@ -284,12 +333,16 @@ class PrefilterManager(Configurable):
         """Register a checker instance."""
         if checker not in self._checkers:
             self._checkers.append(checker)
+            checker.on_trait_change(self._reset_plain_path, 'enabled')
             self.sort_checkers()
 
     def unregister_checker(self, checker):
         """Unregister a checker instance."""
         if checker in self._checkers:
             self._checkers.remove(checker)
+            checker.on_trait_change(self._reset_plain_path, 'enabled',
+                                    remove=True)
+            self._plain_path = None
 
     #-------------------------------------------------------------------------
     # API for managing checkers
@@ -334,6 +387,77 @@ class PrefilterManager(Configurable):
         """Get a handler by its escape string."""
         return self._esc_handlers.get(esc_str)
 
+    #-------------------------------------------------------------------------
+    # Fast path for plain Python lines
+    #-------------------------------------------------------------------------
+
+    def _reset_plain_path(self):
+        self._plain_path = None
+
+    def _check_plain_path(self):
+        """Can plain lines skip the transformers and checkers?
+
+        This is only the case with the default transformers, in any order and
+        enabled or not, and the default checkers, in their default order and
+        all enabled (except for the emacs one, which may be either).
+        """
+        for transformer in self._transformers:
+            if type(transformer) not in _default_transformers:
+                return False
+        if [type(c) for c in self._checkers] != _default_checkers:
+            return False
+        for checker in self._checkers:
+            if not checker.enabled and type(checker) is not EmacsChecker:
+                return False
+        return True
+
+    def is_plain_line(self, line, continue_prompt=False):
+        """Is this line certain to go untouched to the normal handler?
+
+        This is a quick, conservative version of the work done by the default
+        transformers and checkers: it may answer False for lines which would
+        turn out to be plain python, but never True for a line which any of
+        them would act on.  It doesn't call getattr on user objects.
+        """
+        if line.isspace() or re_special_start.match(line) \
+               or line.endswith(ESC_HELP) or line.endswith('# PYTHON-MODE') \
+               or re_assign_escape.search(line):
+            return False
+        if continue_prompt and not self.multi_line_specials:
+            return True
+
+        shell = self.shell
+        match = re_plain_split.match(line)
+        if match:
+            ifun, next_char = match.groups()
+        else:
+            # LineInfo then splits on whitespace
+            ifun, next_char = line.split(None, 1)[0], ''
+            try:
+                ifun.encode('ascii')
+            except UnicodeError:
+                return False
+
+        if isinstance(shell.user_ns.get(ifun), IPyAutocall):
+            return False
+        # Assignments are left alone before magics and aliases are looked up
+        if next_char and next_char in '=,':
+            return True
+        if shell.automagic and hasattr(shell, 'magic_' + ifun):
+            return False
+        if ifun in shell.alias_manager:
+            return False
+        # Anything but a dotted name followed by whitespace is never autocalled
+        if not match:
+            return True
+        if next_char and next_char in '!=()<>,+*/%^&|':
+            return True
+        if not shell.autocall:
+            return True
+        # Statements can't be autocalled, unless the keyword is also a
+        # builtin (print)
+        return keyword.iskeyword(ifun) and ifun not in __builtin__.__dict__
+
     #-------------------------------------------------------------------------
     # Main prefiltering API
     #-------------------------------------------------------------------------
@@ -388,6 +512,12 @@ class PrefilterManager(Configurable):
                 self.shell.buffer[:] = []
             return ''
 
+        if self._plain_path is None:
+            self._plain_path = self._check_plain_path()
+        if self._plain_path and self.is_plain_line(line, continue_prompt):
+            return self.get_handler_by_name('normal').handle(
+                LineInfo(line, continue_prompt))
+
         # At this point, we invoke our transformers.
         if not continue_prompt or (continue_prompt and self.multi_line_specials):
             line = self.transform_line(line, continue_prompt)
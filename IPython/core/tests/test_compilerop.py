@@ -60,3 +60,26 @@ def test_compiler_check_cache():
             break
     else:
         raise AssertionError('Entry for input-99 missing from linecache')
+
+
+def test_compile_ast():
+    cp = compilerop.CachingCompiler()
+    source = 'x = 1\ny = x + 1\n'
+    name = cp.cache(source, 42)
+    nt.assert_true(name.startswith('<ipython-input-42'))
+    nt.assert_equal(linecache.getline(name, 2), 'y = x + 1\n')
+    tree = cp.ast_parse(source, name)
+    nt.assert_equal(len(tree.body), 2)
+    ns = {}
+    exec cp.compile_ast(tree, name, 'exec') in ns
+    nt.assert_equal(ns['y'], 2)
+
+
+def test_ast_future_flags():
+    """__future__ statements in compiled nodes affect later compilations."""
+    cp = compilerop.CachingCompiler()
+    cp.compile_ast(cp.ast_parse('from __future__ import division'),
+                   '<test>', 'exec')
+    ns = {}
+    exec cp.compile_ast(cp.ast_parse('x = 1/2'), '<test>', 'exec') in ns
+    nt.assert_equal(ns['x'], 0.5)
@@ -0,0 +1,94 @@
+"""Tests for the completerlib module.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010 The IPython Development Team.
+#
+#  Distributed under the terms of the BSD License.
+#
+#  The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+from __future__ import print_function
+
+# Stdlib imports
+import os
+import shutil
+import sys
+import tempfile
+
+# Third-party imports
+import nose.tools as nt
+
+# Our own imports
+from IPython.core import completerlib
+
+#-----------------------------------------------------------------------------
+# Test functions
+#-----------------------------------------------------------------------------
+
+def test_root_module_scanner():
+    tdir = tempfile.mkdtemp()
+    try:
+        open(os.path.join(tdir, 'amod.py'), 'w').close()
+        db = {}
+        missing = tdir + '-nonexistent'
+        scanner = completerlib.RootModuleScanner(db, {}, [tdir, missing])
+        scanner.run()
+        nt.assert_true('amod' in scanner.modules())
+        nt.assert_equals(db['rootmodules'][tdir][1], ['amod'])
+        nt.assert_equals(db['rootmodules'][missing], (None, []))
+
+        # An unchanged directory is not listed again
+        index = {tdir: (db['rootmodules'][tdir][0], ['cached'])}
+        db = {}
+        scanner = completerlib.RootModuleScanner(db, index, [tdir])
+        scanner.run()
+        nt.assert_true('cached' in scanner.modules())
+        nt.assert_false('amod' in scanner.modules())
+        nt.assert_equals(db, {})
+
+        # A stale one is, and the result saved
+        index = {tdir: (-1, ['cached'])}
+        scanner = completerlib.RootModuleScanner(db, index, [tdir])
+        scanner.run()
+        nt.assert_equals(db['rootmodules'][tdir][1], ['amod'])
+    finally:
+        shutil.rmtree(tdir)
+
+
+def test_submodule_list():
+    subs = completerlib.submodule_list('IPython.core')
+    nt.assert_true('completerlib' in subs)
+    nt.assert_true('tests' in subs)
+    nt.assert_equals(completerlib.submodule_list('IPython.core.completerlib'),
+                     [])
+    nt.assert_equals(completerlib.submodule_list('nonexistent_pkg_xyz'), [])
+
+
+def test_submodule_list_no_import():
+    tdir = tempfile.mkdtemp()
+    try:
+        pkg = os.path.join(tdir, 'ipy_test_pkg_xyz')
+        os.mkdir(pkg)
+        with open(os.path.join(pkg, '__init__.py'), 'w') as f:
+            f.write('raise RuntimeError("imported")\n')
+        open(os.path.join(pkg, 'sub.py'), 'w').close()
+        sys.path.insert(0, tdir)
+        try:
+            subs = completerlib.submodule_list('ipy_test_pkg_xyz')
+        finally:
+            sys.path.remove(tdir)
+        nt.assert_equals(subs, ['sub'])
+        nt.assert_false('ipy_test_pkg_xyz' in sys.modules)
+    finally:
+        shutil.rmtree(tdir)
+
+
+def test_module_completion():
+    comps = completerlib.module_completion('import IPython.core.compl')
+    nt.assert_true('IPython.core.completerlib' in comps)
+    nt.assert_equals(completerlib.module_completion('from os import'),
+                     ['import '])
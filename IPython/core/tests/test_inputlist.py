@@ -0,0 +1,80 @@
+"""Tests for the inputlist module.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010 The IPython Development Team.
+#
+#  Distributed under the terms of the BSD License.
+#
+#  The full license is in the file COPYING.txt, distributed with this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Stdlib imports
+import os
+
+# Third-party imports
+import nose.tools as nt
+
+# Our own imports
+from IPython.core.inputlist import InputList, InputStore
+
+#-----------------------------------------------------------------------------
+# Test functions
+#-----------------------------------------------------------------------------
+
+def test_unbounded():
+    l = InputList()
+    for i in range(5):
+        l.append('%d\n' % i)
+    nt.assert_equal(len(l), 5)
+    nt.assert_equal(l[1:3], '1\n2\n')
+    nt.assert_equal(l[-1], '4\n')
+    nt.assert_equal(l.offset, 0)
+
+
+def test_spill():
+    store = InputStore()
+    l = InputList(window=3, store=store)
+    items = ['%d\n' % i for i in range(10)]
+    for item in items:
+        l.append(item)
+    # Only the window is held in memory
+    nt.assert_equal(list.__len__(l), 3)
+    nt.assert_equal(l.offset, 7)
+    nt.assert_equal(len(l), 10)
+    nt.assert_equal(l[2], '2\n')
+    nt.assert_equal(l[-1], '9\n')
+    nt.assert_equal(l[-10], '0\n')
+    nt.assert_raises(IndexError, l.__getitem__, 10)
+    nt.assert_equal(l[5:9], ''.join(items[5:9]))
+    nt.assert_equal(l[:], ''.join(items))
+    nt.assert_equal(l[::3], items[::3])
+    nt.assert_equal(list(l), items)
+    nt.assert_equal(list(reversed(l)), items[::-1])
+    nt.assert_true('1\n' in l)
+    l[1] = 'x\n'
+    nt.assert_equal(l[1], 'x\n')
+    # Clearing also clears the store
+    l[:] = []
+    nt.assert_equal(len(l), 0)
+    nt.assert_equal(store.get_range('input', 0, 10), [])
+    filename = store.filename
+    store.close()
+    nt.assert_false(os.path.exists(filename))
+
+
+def test_store_names():
+    store = InputStore()
+    l1 = InputList(window=1, store=store, name='a')
+    l2 = InputList(window=1, store=store, name='b')
+    for i in range(3):
+        l1.append('a%d' % i)
+        l2.append(u'b%d' % i)
+    nt.assert_equal(list(l1), ['a0', 'a1', 'a2'])
+    # Types of stored entries are preserved
+    nt.assert_equal(list(l2), [u'b0', u'b1', u'b2'])
+    nt.assert_true(isinstance(l2[0], unicode))
+    store.close()
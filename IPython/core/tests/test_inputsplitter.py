@@ -106,6 +106,49 @@ def test_remove_comments():
         nt.assert_equal(isp.remove_comments(inp), out)
 
 
+def test_input_scanner():
+    sc = isp.InputScanner()
+    sc.feed('x = [1, (2,')
+    nt.assert_equal(sc.brackets, 2)
+    sc.feed("  3)] # ] a comment (")
+    nt.assert_equal(sc.brackets, 0)
+    nt.assert_false(sc.open)
+    # Brackets and comment signs in strings are ignored
+    sc.feed("s = '(#' + \"'\\\"[\"")
+    nt.assert_false(sc.open)
+    sc.feed('d = """a docstring (')
+    nt.assert_equal(sc.string, '"""')
+    sc.feed(r"""with 'quotes' and \""" inside""")
+    nt.assert_true(sc.open)
+    sc.feed('"""')
+    nt.assert_false(sc.open)
+    # Strings with single quotes only continue after a backslash
+    sc.feed("s = 'a \\")
+    nt.assert_true(sc.open)
+    sc.feed("b'")
+    nt.assert_false(sc.open)
+    sc.feed("s = 'unterminated")
+    nt.assert_false(sc.open)
+    sc.feed('import os, \\')
+    nt.assert_true(sc.continued)
+    sc.feed('sys')
+    nt.assert_false(sc.open)
+    sc.feed('if x:  # comment')
+    nt.assert_true(sc.opens_block)
+    sc.feed('@decorator')
+    nt.assert_true(sc.opens_block)
+    sc.feed('    pass')
+    nt.assert_false(sc.opens_block)
+    nt.assert_equal(sc.headers, [0])
+    sc.feed('try:')
+    sc.feed('    if y:')
+    nt.assert_equal(sc.headers, [0, 4])
+    sc.feed('finally:')
+    nt.assert_equal(sc.headers, [0])
+    sc.feed('x = 1')
+    nt.assert_equal(sc.headers, [])
+
+
 def test_get_input_encoding():
     encoding = isp.get_input_encoding()
     nt.assert_true(isinstance(encoding, basestring))
@@ -262,11 +305,51 @@ class InputSplitterTestCase(unittest.TestCase):
         isp.push("sys")
         self.assertFalse(isp.push_accepts_more())
 
+    def test_compile_on_demand(self):
+        isp = self.isp
+        if isp.input_mode == 'cell': return
+
+        compiled = []
+        command_compiler = isp._compile
+        def compile(source):
+            compiled.append(source)
+            return command_compiler(source)
+        isp._compile = compile
+        # Lines inside brackets are not compiled
+        isp.push('x = [1,')
+        for i in range(10):
+            self.assertFalse(isp.push('  %d,' % i))
+        self.assertTrue(isp.push(']'))
+        self.assertEqual(len(compiled), 2)
+        isp.reset()
+        compiled[:] = []
+        # Indented lines outside of compound statements are compiled when
+        # the code is asked for
+        isp.push('d = {1:')
+        self.assertTrue(isp.push('  2}'))
+        self.assertEqual(len(compiled), 1)
+        self.assertTrue(isp.code is not None)
+        self.assertEqual(len(compiled), 2)
+
+    def test_compound_bodies(self):
+        isp = self.isp
+        # The body of a compound statement is compiled, as the statement may
+        # need more clauses
+        self.assertFalse(isp.push('try:\n    x = 1'))
+        if isp.input_mode == 'cell': return
+        self.assertFalse(isp.push('    y = 2'))
+        isp.reset()
+        self.assertFalse(isp.push('def f(x):'))
+        for i in range(3):
+            self.assertTrue(isp.push('    x += %d' % i))
+        isp.push('')
+        self.assertFalse(isp.push_accepts_more())
+
     def test_syntax_error(self):
         isp = self.isp
-        # Syntax errors immediately produce a 'ready' block, so the invalid
-        # Python can be sent to the kernel for evaluation with possible ipython
-        # special-syntax conversion.
+        # Syntax errors produce a 'ready' block as soon as they are found, so
+        # the invalid Python can be sent to the kernel for evaluation with
+        # possible ipython special-syntax conversion.
         isp.push('run foo')
         self.assertFalse(isp.push_accepts_more())
 
@@ -639,7 +722,22 @@ class BlockIPythonInputTestCase(IPythonInputTestCase):
                 # Match ignoring trailing whitespace
                 self.assertEqual(out.rstrip(), out_t.rstrip())
                 self.assertEqual(out_raw.rstrip(), raw.rstrip())
-    
+
+    def test_transform_cell(self):
+        isp = self.isp
+        # Same source as pushing the cell
+        for example in syntax_ml.itervalues():
+            raw = '\n'.join(r for line_pairs in example for r, o in line_pairs)
+            isp.push(raw)
+            self.assertEqual(isp.transform_cell(raw), isp.source_reset())
+        # Escapes inside strings, brackets and comments are left alone
+        for cell in ["s = '''\n!ls\n'''\n", "f(1,\n%run)\n", "# why?\n"]:
+            self.assertEqual(isp.transform_cell(cell), cell)
+        self.assertEqual(isp.transform_cell('x = [1,\n2]\n!ls'),
+                         'x = [1,\n2]\nget_ipython().system("ls")\n')
+        # The state of the splitter is untouched
+        self.assertEqual(isp.source, '')
+
 
 #-----------------------------------------------------------------------------
 # Main - use as a script, mostly for developer experiments
@@ -5,8 +5,11 @@
 #-----------------------------------------------------------------------------
 
 # stdlib
+import ast
 import os
 import shutil
+import subprocess
+import sys
 import tempfile
 
 # third party
@@ -269,3 +272,51 @@ def test_db():
     nt.assert_equals(ip.db['__unittest_'], 12)
     del ip.db['__unittest_']
     assert '__unittest_' not in ip.db
+
+
+def test_lazy_completer():
+    """The completer isn't built when a terminal shell starts."""
+    code = ("from IPython.frontend.terminal.interactiveshell import "
+            "TerminalInteractiveShell\n"
+            "shell = TerminalInteractiveShell.instance()\n"
+            "print 'Completer' in shell.__dict__\n")
+    out = subprocess.Popen([sys.executable, '-c', code],
+                           stdout=subprocess.PIPE).communicate()[0]
+    nt.assert_equals(out.strip(), 'False')
+
+
+def test_run_cell():
+    """Multi-line cells are run statement by statement, stopping at errors."""
+    ip.run_cell('a = 1\n%who_ls\nb = a + 1\nb*10\n')
+    nt.assert_equals(ip.user_ns['b'], 2)
+    ip.run_cell('c = 1\n1/0\nc = 2\n')
+    nt.assert_equals(ip.user_ns['c'], 1)
+    # Syntax errors prevent the whole cell from running
+    ip.run_cell('c = 3\nc c\n')
+    nt.assert_equals(ip.user_ns['c'], 1)
+
+
+class Negator(ast.NodeTransformer):
+    """Negates all number literals in an AST."""
+    def visit_Num(self, node):
+        node.n = -node.n
+        return node
+
+
+class Breaker(ast.NodeTransformer):
+    def visit_Num(self, node):
+        raise ValueError('broken transformer')
+
+
+def test_ast_transformers():
+    ip.ast_transformers.append(Negator())
+    try:
+        ip.run_cell('d = 3\ne = 4\n')
+    finally:
+        ip.ast_transformers.pop()
+    nt.assert_equals((ip.user_ns['d'], ip.user_ns['e']), (-3, -4))
+    # Transformers which fail are removed
+    ip.ast_transformers.append(Breaker())
+    ip.run_cell('d = 3\ne = 4\n')
+    nt.assert_equals((ip.user_ns['d'], ip.user_ns['e']), (3, 4))
+    nt.assert_equals(ip.ast_transformers, [])
@@ -42,6 +42,44 @@ def test_rehashx():
     yield (nt.assert_true, len(scoms) > 10)
 
 
+def test_rehashx_cache():
+    _ip = get_ipython()
+    _ip.magic('rehashx -f')
+    cache = _ip.db['rehashx_cache']
+    nt.assert_true(len(cache) > 0)
+    scoms = _ip.db['syscmdlist']
+    # A second call with no changes in $PATH reuses the cached listings and
+    # finds the same commands
+    _ip.magic('rehashx')
+    nt.assert_equals(_ip.db['rehashx_cache'], cache)
+    nt.assert_equals(_ip.db['syscmdlist'], scoms)
+
+
+def test_scan_executables():
+    from IPython.core.magic import scan_executables
+    tdir = tempfile.mkdtemp()
+    try:
+        for name in ['a', 'b', 'c']:
+            open(os.path.join(tdir, name), 'w').close()
+        isfile = os.path.isfile
+        scanned = scan_executables([tdir, tdir+'-nonexistent'], isfile)
+        nt.assert_equals(scanned.keys(), [tdir])
+        mtime, names = scanned[tdir]
+        nt.assert_equals(sorted(names), ['a', 'b', 'c'])
+        # An up to date cache entry is used without listing the directory
+        cache = {tdir: (mtime, ['cached'])}
+        scanned = scan_executables([tdir], isfile, cache)
+        nt.assert_equals(scanned[tdir], (mtime, ['cached']))
+        # A stale one is ignored
+        cache = {tdir: (mtime-1, ['cached'])}
+        scanned = scan_executables([tdir], isfile, cache)
+        nt.assert_equals(sorted(scanned[tdir][1]), ['a', 'b', 'c'])
+    finally:
+        for name in os.listdir(tdir):
+            os.remove(os.path.join(tdir, name))
+        os.rmdir(tdir)
+
+
 def test_magic_parse_options():
     """Test that we don't mangle paths when parsing magic options."""
     ip = get_ipython()
@@ -66,3 +66,53 @@ def test_issue114():
             yield nt.assert_equals(ip.prefilter(raw), raw)
     finally:
         ip.prefilter_manager.multi_line_specials = msp
+
+
+@dec.parametric
+def test_plain_lines():
+    """Plain python lines skip the checkers, others don't"""
+    pm = ip.prefilter_manager
+    ip.alias_manager.define_alias('g++', 'true')
+    ip.user_ns['f'] = lambda x: x
+    try:
+        plain = ['x = 1', 'f(1)', 'a != b', '"%s" % x', 'for i in x:',
+                 'else:', 'ls = 1', 'f +1']
+        special = ['!ls', 'x = !ls', '%who', 'y = %who', 'x?', ',f a', '/f a',
+                   '>>> x', 'In [1]: x', 'who', 'ls -la', 'g++ x', '   ']
+        for autocall in (0, 2):
+            ip.magic('autocall %d' % autocall)
+            for line in plain:
+                yield nt.assert_true(pm.is_plain_line(line), line)
+            for line in special:
+                yield nt.assert_false(pm.is_plain_line(line), line)
+        # With autocall, a callable name followed by arguments isn't plain
+        yield nt.assert_false(pm.is_plain_line('f 1'))
+        yield nt.assert_equals(ip.prefilter('f 1'), 'f(1)')
+        yield nt.assert_true(pm.is_plain_line('return x'))
+        ip.magic('autocall 0')
+        yield nt.assert_true(pm.is_plain_line('f 1'))
+        yield nt.assert_equals(ip.prefilter('f 1'), 'f 1')
+    finally:
+        ip.magic('autocall 0')
+        ip.alias_manager.undefine_alias('g++')
+        del ip.user_ns['f']
+
+
+@dec.parametric
+def test_plain_path_checkers():
+    """Disabling or adding checkers turns the fast path off"""
+    pm = ip.prefilter_manager
+    yield nt.assert_true(pm._check_plain_path())
+    checker = pm.checkers[-1]
+    checker.enabled = False
+    try:
+        yield nt.assert_true(pm._plain_path is None)
+        yield nt.assert_false(pm._check_plain_path())
+    finally:
+        checker.enabled = True
+    pm.unregister_checker(checker)
+    try:
+        yield nt.assert_false(pm._check_plain_path())
+    finally:
+        pm.register_checker(checker)
+    yield nt.assert_true(pm._check_plain_path())
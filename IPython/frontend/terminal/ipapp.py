@@ -221,6 +221,10 @@ class IPAppConfigLoader(BaseAppConfigLoader):
         paa('--quick',
             action='store_true', dest='Global.quick',
             help="Enable quick startup with no config files.")
+        paa('--startup-timing',
+            action='store_true', dest='InteractiveShell.startup_timing',
+            help="Report the time taken by each initialization step of the "
+            "shell, and by the imports they do.")
         paa('--readline',
             action='store_true', dest='InteractiveShell.readline_use',
             help="Enable readline for command line usage.")
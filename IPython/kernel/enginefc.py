@@ -42,6 +42,7 @@ from IPython.kernel.engineservice import (
     StrictDict
 )
 from IPython.kernel.pickleutil import (
+    Pickled,
     can,
     canDict,
     canSequence,
@@ -320,7 +321,10 @@ class EngineFromReference(object):
     
     def push(self, namespace):
         try:
-            package = pickle.dumps(namespace, 2)
+            if isinstance(namespace, Pickled):
+                package = namespace.getData()
+            else:
+                package = pickle.dumps(namespace, 2)
         except:
             return defer.fail(failure.Failure())
         else:
@@ -346,7 +350,10 @@ class EngineFromReference(object):
     
     def push_function(self, namespace):
         try:
-            package = pickle.dumps(canDict(namespace), 2)
+            if isinstance(namespace, Pickled):
+                package = namespace.getData()
+            else:
+                package = pickle.dumps(canDict(namespace), 2)
         except:
             return defer.fail(failure.Failure())
         else:
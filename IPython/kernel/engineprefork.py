@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+A template process which forks engines with their imports already done.
+
+Usage::
+
+    python engineprefork.py [module ...] -- [ipengine arguments]
+
+The template imports the core of the engine and the modules given, then
+reads commands on its stdin, one per line:
+
+* ``fork``: fork an engine, which runs ipengine with the arguments given.
+  The template answers ``started <pid>``.
+* ``signal <pid> <sig>``: send a signal (a name like ``INT`` or a number)
+  to an engine.
+
+When an engine exits, the template prints ``stopped <pid> <exit_code>
+<signal>``.  The template kills its engines and exits when its stdin is
+closed.
+
+The Twisted reactor can't be shared by the forked engines, so none of the
+modules imported by the template may import it.
+"""
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import errno
+import os
+import select
+import signal
+import sys
+import time
+
+#-----------------------------------------------------------------------------
+# Template
+#-----------------------------------------------------------------------------
+
+# The modules imported by every template.  They are the bulk of the import
+# time of an engine which doesn't import the reactor.
+core_modules = ['IPython.kernel.core.interpreter', 'IPython.kernel.clusterdir',
+                'twisted.internet.defer']
+
+
+def parse_signal(sig):
+    try:
+        return int(sig)
+    except ValueError:
+        return getattr(signal, 'SIG' + sig)
+
+
+def warm_up(modules):
+    """Import the modules, checking that the reactor stays out."""
+    for module in modules:
+        __import__(module)
+    if 'twisted.internet.reactor' in sys.modules:
+        raise ImportError('The modules of an engine template must not '
+                          'import the Twisted reactor: %r' % modules)
+
+
+def run_engine(engine_args):
+    """Run ipengine in a forked process, never returning."""
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    status = 0
+    try:
+        sys.argv = ['ipengine'] + engine_args
+        from IPython.kernel.ipengineapp import launch_new_instance
+        launch_new_instance()
+    except SystemExit, e:
+        status = e.code if isinstance(e.code, int) else 1
+    except:
+        import traceback
+        traceback.print_exc()
+        status = 1
+    os._exit(status)
+
+
+class Template(object):
+    """Fork engines on the requests read from stdin."""
+
+    def __init__(self, engine_args, stdin=sys.stdin, stdout=sys.stdout):
+        self.engine_args = engine_args
+        self.stdin = stdin
+        self.stdout = stdout
+        self.engines = set()
+
+    def reply(self, line):
+        self.stdout.write(line + '\n')
+        self.stdout.flush()
+
+    def fork(self):
+        pid = os.fork()
+        if pid == 0:
+            run_engine(self.engine_args)
+        self.engines.add(pid)
+        self.reply('started %d' % pid)
+
+    def signal(self, pid, sig):
+        pid = int(pid)
+        if pid in self.engines:
+            try:
+                os.kill(pid, parse_signal(sig))
+            except OSError:
+                pass
+
+    def reap(self):
+        """Report the engines which exited."""
+        while self.engines:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError, e:
+                if e.errno == errno.ECHILD:
+                    return
+                raise
+            if pid == 0:
+                return
+            self.engines.discard(pid)
+            if os.WIFSIGNALED(status):
+                self.reply('stopped %d None %d' % (pid, os.WTERMSIG(status)))
+            else:
+                self.reply('stopped %d %d None' % (pid,
+                                                   os.WEXITSTATUS(status)))
+
+    def handle(self, line):
+        words = line.split()
+        if words == ['fork']:
+            self.fork()
+        elif len(words) == 3 and words[0] == 'signal':
+            self.signal(words[1], words[2])
+
+    def run(self):
+        # Interrupting the cluster interrupts the engines, not their template
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        fd = self.stdin.fileno()
+        data = ''
+        while True:
+            if select.select([fd], [], [], 0.1)[0]:
+                read = os.read(fd, 4096)
+                if not read:
+                    break
+                data += read
+                while '\n' in data:
+                    line, data = data.split('\n', 1)
+                    self.handle(line)
+            self.reap()
+        for pid in list(self.engines):
+            self.signal(pid, 'KILL')
+        while self.engines:
+            time.sleep(0.05)
+            self.reap()
+
+
+def launch_new_instance():
+    """Start a template from the command line arguments."""
+    args = sys.argv[1:]
+    if '--' in args:
+        i = args.index('--')
+        modules, engine_args = args[:i], args[i+1:]
+    else:
+        modules, engine_args = args, []
+    warm_up(core_modules + modules)
+    Template(engine_args).run()
+
+
+if __name__ == '__main__':
+    launch_new_instance()
@@ -41,6 +41,8 @@ __test__ = {}
 import copy
 import sys
 import cPickle as pickle
+from collections import deque
+from types import ModuleType
 
 from twisted.application import service
 from twisted.internet import defer, reactor
@@ -49,6 +51,13 @@ import zope.interface as zi
 
 from IPython.kernel.core.interpreter import Interpreter
 from IPython.kernel import newserialized, error
+from IPython.kernel.pickleutil import unpickled
+from IPython.kernel.sharedmem import resolve, share, share_values
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #-------------------------------------------------------------------------------
 # Interface specification for the Engine
@@ -337,21 +346,129 @@ def drop_engine(id):
     if _apiDict.has_key(id):
         del _apiDict[id]
 
+def preload_module(spec):
+    """Import a module for an engine namespace, return (name, module).
+
+    `spec` is a module name, bound like by ``import os.path``, or a module
+    name and an alias, like ``'numpy as np'``.
+    """
+    words = spec.split()
+    if len(words) == 3 and words[1] == 'as':
+        __import__(words[0])
+        return words[2], sys.modules[words[0]]
+    elif len(words) == 1:
+        return spec.split('.')[0], __import__(spec)
+    raise ValueError("A preloaded module is given as 'module' or "
+                     "'module as name', not %r" % spec)
+
+
+class NamespaceSnapshots(object):
+    """Named copies of parts of an engine namespace, which outlive reset.
+
+    An engine puts its snapshots in its namespace as ``snapshots``, so that
+    a job can save the data it shares with the next ones::
+
+        snapshots.save('tables', ['lut', 'weights'])
+
+    and get it back after a reset, without pushing it again::
+
+        snapshots.restore('tables')
+
+    The values are copied when they are saved and when they are restored, so
+    that a job changing them doesn't change the snapshot.  Numpy arrays are
+    not: they are saved as read only copies and restored as read only views
+    of them, which a job copies before changing.
+    """
+
+    # The names of the engine namespace which are never saved by default.
+    hidden = ['__name__', '_ih', '_oh', '__builtins__', 'In', 'Out', '_',
+              '__', '___', '__IP', 'input', 'raw_input', 'mpi', 'id',
+              'snapshots']
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._snapshots = {}
+
+    def __repr__(self):
+        return '<NamespaceSnapshots %r>' % self.names()
+
+    def names(self):
+        return sorted(self._snapshots)
+
+    def save(self, name, keys=None):
+        """Save the values of `keys` as the snapshot `name`.
+
+        By default all the values of the namespace are saved, but for the
+        modules and the names in :attr:`hidden`.  Returns the keys saved.
+        """
+        ns = self.engine.shell.user_ns
+        if keys is None:
+            keys = [k for k, v in ns.iteritems() if k not in self.hidden
+                    and not isinstance(v, ModuleType)]
+        elif isinstance(keys, str):
+            keys = [keys]
+        values = {}
+        for key in keys:
+            if key not in ns:
+                raise NameError("name '%s' is not defined" % key)
+            values[key] = self._freeze(ns[key])
+        self._snapshots[name] = values
+        return sorted(values)
+
+    def restore(self, name, keys=None):
+        """Put the values of the snapshot `name` back in the namespace."""
+        try:
+            values = self._snapshots[name]
+        except KeyError:
+            raise KeyError('No snapshot named %r' % name)
+        if keys is None:
+            keys = values.keys()
+        elif isinstance(keys, str):
+            keys = [keys]
+        self.engine.shell.push(dict((key, self._thaw(values[key]))
+                                    for key in keys))
+
+    def drop(self, name):
+        """Forget the snapshot `name`."""
+        self._snapshots.pop(name, None)
+
+    def _freeze(self, value):
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            value = value.copy()
+            value.flags.writeable = False
+            return value
+        return copy.deepcopy(value)
+
+    def _thaw(self, value):
+        if numpy is not None and isinstance(value, numpy.ndarray):
+            return value.view()
+        return copy.deepcopy(value)
+
+
 class EngineService(object, service.Service):
     """Adapt a IPython shell into a IEngine implementing Twisted Service."""
     
     zi.implements(IEngineBase)
     name = 'EngineService'
     
-    def __init__(self, shellClass=Interpreter, mpi=None):
+    def __init__(self, shellClass=Interpreter, mpi=None, preload=None,
+                 share_threshold=0):
         """Create an EngineService.
         
         shellClass: something that implements IInterpreter or core1
         mpi:        an mpi module that has rank and size attributes
+        preload:    modules to import now and put in the namespace, also
+                    after a reset (see preload_module)
+        share_threshold: the size in bytes from which pulled values are
+                    passed through shared memory, or 0 to never do it (see
+                    IPython.kernel.sharedmem)
         """
         self.shellClass = shellClass
         self.shell = self.shellClass()
         self.mpi = mpi
+        self.share_threshold = share_threshold
+        self.preloaded = dict(preload_module(spec) for spec in preload or [])
+        self.snapshots = NamespaceSnapshots(self)
         self.id = None
         self.properties = get_engine(self.id).properties
         if self.mpi is not None:
@@ -373,7 +490,9 @@ class EngineService(object, service.Service):
     id = property(_getID, _setID)
     
     def _seedNamespace(self):
-        self.shell.push({'mpi': self.mpi, 'id' : self.id})
+        self.shell.push(self.preloaded)
+        self.shell.push({'mpi': self.mpi, 'id' : self.id,
+                         'snapshots': self.snapshots})
     
     def executeAndRaise(self, msg, callable, *args, **kwargs):
         """Call a method of self.shell and wrap any exception."""
@@ -413,6 +532,7 @@ class EngineService(object, service.Service):
         return result
     
     def push(self, namespace):
+        namespace = resolve(unpickled(namespace), depth=1)
         msg = {'engineid':self.id,
                'method':'push',
                'args':[repr(namespace.keys())]}
@@ -424,9 +544,17 @@ class EngineService(object, service.Service):
                'method':'pull',
                'args':[repr(keys)]}
         d = self.executeAndRaise(msg, self.shell.pull, keys)
+        if self.share_threshold:
+            d.addCallback(self._share, keys)
         return d
     
+    def _share(self, result, keys):
+        if isinstance(keys, str):
+            return share(result, self.share_threshold)
+        return share_values(result, self.share_threshold)
+    
     def push_function(self, namespace):
+        namespace = unpickled(namespace)
         msg = {'engineid':self.id,
                'method':'push_function',
                'args':[repr(namespace.keys())]}
@@ -564,6 +692,19 @@ def queue(methodToQueue):
         name = methodToQueue.__name__
         return this.submitCommand(Command(name, *args, **kwargs))
     return queuedMethod
+
+
+def result_size(result):
+    """Estimate the number of bytes held by an execute result."""
+    if isinstance(result, basestring):
+        return len(result)
+    elif isinstance(result, dict):
+        return sum(result_size(k) + result_size(v)
+                   for k, v in result.iteritems())
+    elif isinstance(result, (list, tuple)):
+        return sum(result_size(v) for v in result)
+    else:
+        return 8
     
 class QueuedEngine(object):
     """Adapt an IEngineBase to an IEngineQueued by wrapping it.
@@ -576,16 +717,32 @@ class QueuedEngine(object):
     mix-in intefaces.  The problem I have with this is adpatation is
     more difficult and complicated because there can be can multiple
     original and final Interfaces. 
+
+    Up to `window` commands are sent to the engine without waiting for the
+    results of the previous ones.  The engine runs the commands in the order
+    it receives them, and their results are handed back in that order too.
+    When a command fails, the commands which haven't been sent yet are
+    cleared; the ones already sent still run.
     """
     
     zi.implements(IEngineQueued)
+
+    # The number of commands sent to the engine and not finished yet.
+    window = 1
+
+    # The largest number of execute results, and of their bytes, kept for
+    # get_result.  Older results are fetched from the engine.
+    history_size = 1000
+    history_bytes = 10 * 1024 * 1024
     
-    def __init__(self, engine):
+    def __init__(self, engine, window=None, history_size=None,
+                 history_bytes=None):
         """Create a QueuedEngine object from an engine
         
-        engine:       An implementor of IEngineCore and IEngineSerialized
-        keepUpToDate: whether to update the remote status when the 
-                      queue is empty.  Defaults to False.
+        engine:        An implementor of IEngineCore and IEngineSerialized
+        window:        The number of commands in flight to the engine.
+        history_size:  The number of execute results kept.
+        history_bytes: The approximate size of the execute results kept.
         """
         
         # This is the right way to do these tests rather than 
@@ -596,10 +753,22 @@ class QueuedEngine(object):
             
         self.engine = engine
         self.id = engine.id
-        self.queued = []
+        if window is not None:
+            self.window = window
+        if history_size is not None:
+            self.history_size = history_size
+        if history_bytes is not None:
+            self.history_bytes = history_bytes
+        # Commands not sent yet, and sent but not handed back yet
+        self.queued = deque()
+        self.inflight = deque()
         self.history = {}
+        # (number, nbytes) of the results in history, oldest first
+        self._history_order = deque()
+        self._history_nbytes = 0
+        self.counters = dict(submitted=0, completed=0, failed=0, cleared=0,
+                             evicted=0)
         self.engineStatus = {}
-        self.currentCommand = None
         self.failureObservers = []
     
     def _get_properties(self):
@@ -613,79 +782,93 @@ class QueuedEngine(object):
         
         d = defer.Deferred()
         cmd.setDeferred(d)
-        if self.currentCommand is not None:
-            if self.currentCommand.finished:
-                # log.msg("Running command immediately: %r" % cmd)
-                self.currentCommand = cmd
-                self.runCurrentCommand()
-            else:  # command is still running  
-                # log.msg("Command is running: %r" % self.currentCommand)
-                # log.msg("Queueing: %r" % cmd)
-                self.queued.append(cmd)
-        else:
-            # log.msg("No current commands, running: %r" % cmd)
-            self.currentCommand = cmd
-            self.runCurrentCommand()
+        self.counters['submitted'] += 1
+        self.queued.append(cmd)
+        self._flushQueue()
         return d
     
-    def runCurrentCommand(self):
-        """Run current command."""
+    def runCommand(self, cmd):
+        """Send a command to the engine."""
         
-        cmd = self.currentCommand
         f = getattr(self.engine, cmd.remoteMethod, None)
         if f:
             d = f(*cmd.args, **cmd.kwargs)
             if cmd.remoteMethod is 'execute':
                 d.addCallback(self.saveResult)
-            d.addCallback(self.finishCommand)
-            d.addErrback(self.abortCommand)
+            d.addCallback(self.finishCommand, cmd)
+            d.addErrback(self.abortCommand, cmd)
         else:
-            return defer.fail(AttributeError(cmd.remoteMethod))
+            self.abortCommand(failure.Failure(AttributeError(cmd.remoteMethod)),
+                              cmd)
     
     def _flushQueue(self):
-        """Pop next command in queue and run it."""
+        """Send the next commands in queue while the window has room."""
         
-        if len(self.queued) > 0:
-            self.currentCommand = self.queued.pop(0)
-            self.runCurrentCommand()
+        while self.queued and len(self.inflight) < self.window:
+            cmd = self.queued.popleft()
+            self.inflight.append(cmd)
+            self.runCommand(cmd)
     
     def saveResult(self, result):
-        """Put the result in the history."""
-        self.history[result['number']] = result
+        """Put the result in the history, dropping the oldest ones."""
+        number = result['number']
+        nbytes = result_size(result)
+        self.history[number] = result
+        self._history_order.append((number, nbytes))
+        self._history_nbytes += nbytes
+        while len(self._history_order) > self.history_size or \
+              (self._history_nbytes > self.history_bytes and
+               len(self._history_order) > 1):
+            number, nbytes = self._history_order.popleft()
+            self.history.pop(number, None)
+            self._history_nbytes -= nbytes
+            self.counters['evicted'] += 1
         return result
     
-    def finishCommand(self, result):
-        """Finish currrent command."""
+    def finishCommand(self, result, cmd):
+        """Finish a command, and hand back the results ready in order."""
         
-        # The order of these commands is absolutely critical.
-        self.currentCommand.handleResult(result)
-        self.currentCommand.finished = True
-        self._flushQueue()
+        cmd.finished = True
+        cmd.result = result
+        self._handBack()
         return result
     
-    def abortCommand(self, reason):
-        """Abort current command.
+    def abortCommand(self, reason, cmd):
+        """Abort a command.
         
         This eats the Failure but first passes it onto the Deferred that the 
         user has.
         
         It also clear out the queue so subsequence commands don't run.
         """
-
-        # The order of these 3 commands is absolutely critical.  The currentCommand
-        # must first be marked as finished BEFORE the queue is cleared and before
-        # the current command is sent the failure.
-        # Also, the queue must be cleared BEFORE the current command is sent the Failure
-        # otherwise the errback chain could trigger new commands to be added to the 
-        # queue before we clear it.  We should clear ONLY the commands that were in
-        # the queue when the error occured. 
-        self.currentCommand.finished = True
-        s = "%r %r %r" % (self.currentCommand.remoteMethod, self.currentCommand.args, self.currentCommand.kwargs)
-        self.clear_queue(msg=s)
-        self.currentCommand.handleError(reason)
         
+        cmd.finished = True
+        cmd.failure = reason
+        self._handBack()
         return None
     
+    def _handBack(self):
+        """Relay the results of the finished commands, in submission order."""
+        
+        while self.inflight and self.inflight[0].finished:
+            # The command must leave the window before its result is relayed,
+            # so that the callbacks of the user can submit new commands.
+            cmd = self.inflight.popleft()
+            if cmd.failure is None:
+                self.counters['completed'] += 1
+                cmd.handleResult(cmd.result)
+            else:
+                # The queue must be cleared BEFORE the command is sent the
+                # Failure otherwise the errback chain could trigger new
+                # commands to be added to the queue before we clear it.  We
+                # should clear ONLY the commands that were in the queue when
+                # the error occured.
+                self.counters['failed'] += 1
+                s = "%r %r %r" % (cmd.remoteMethod, cmd.args, cmd.kwargs)
+                self.clear_queue(msg=s)
+                cmd.handleError(cmd.failure)
+        self._flushQueue()
+    
     #---------------------------------------------------------------------------
     # IEngineCore methods
     #---------------------------------------------------------------------------
@@ -724,7 +907,10 @@ class QueuedEngine(object):
         
     def reset(self):
         self.clear_queue()
-        self.history = {}  # reset the cache - I am not sure we should do this
+        # reset the cache - I am not sure we should do this
+        self.history = {}
+        self._history_order.clear()
+        self._history_nbytes = 0
         return self.submitCommand(Command('reset'))
     
     def kill(self):
@@ -776,22 +962,28 @@ class QueuedEngine(object):
     #---------------------------------------------------------------------------
     
     def clear_queue(self, msg=''):
-        """Clear the queue, but doesn't cancel the currently running commmand."""
+        """Clear the queue, but doesn't cancel the commands already sent."""
         
-        for cmd in self.queued:
+        queued, self.queued = self.queued, deque()
+        self.counters['cleared'] += len(queued)
+        for cmd in queued:
             cmd.deferred.errback(failure.Failure(error.QueueCleared(msg)))
-        self.queued = []
         return defer.succeed(None)
     
     def queue_status(self):
-        if self.currentCommand is not None:
-            if self.currentCommand.finished:
-                pending = repr(None)
-            else:
-                pending = repr(self.currentCommand)
+        """Get the queued and in flight commands, and the queue counters.
+
+        'pending' is the oldest command sent to the engine, for which we are
+        waiting.
+        """
+        if self.inflight:
+            pending = repr(self.inflight[0])
         else:
             pending = repr(None)
-        dikt = {'queue':map(repr,self.queued), 'pending':pending}
+        dikt = {'queue':map(repr,self.queued), 'pending':pending,
+                'inflight':map(repr,self.inflight), 'window':self.window,
+                'history':len(self.history)}
+        dikt.update(self.counters)
         return defer.succeed(dikt)
         
     def register_failure_observer(self, obs):
@@ -822,6 +1014,8 @@ class Command(object):
         self.args = args
         self.kwargs = kwargs
         self.finished = False
+        self.result = None
+        self.failure = None
     
     def setDeferred(self, d):
         """Sets the deferred attribute of the Command."""  
@@ -862,8 +1056,10 @@ class ThreadedEngineService(EngineService):
     
     zi.implements(IEngineBase)
 
-    def __init__(self, shellClass=Interpreter, mpi=None):
-        EngineService.__init__(self, shellClass, mpi)
+    def __init__(self, shellClass=Interpreter, mpi=None, preload=None,
+                 share_threshold=0):
+        EngineService.__init__(self, shellClass, mpi, preload,
+                               share_threshold)
     
     def wrapped_execute(self, msg, lines):
         """Wrap self.shell.execute to add extra information to tracebacks"""
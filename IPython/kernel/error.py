@@ -104,6 +104,11 @@ class TaskTimeout(KernelError):
     pass
 
 
+class TaskDependencyError(KernelError):
+    """A task was not run because a task it runs after failed."""
+    pass
+
+
 class NotAPendingResult(KernelError):
     pass
 
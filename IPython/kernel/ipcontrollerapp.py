@@ -25,7 +25,7 @@ from twisted.internet import reactor
 from twisted.python import log
 
 from IPython.config.loader import Config
-from IPython.kernel import controllerservice
+from IPython.kernel import controllerservice, engineservice, task
 from IPython.kernel.clusterdir import (
     ApplicationWithClusterDir,
     ClusterDirConfigLoader
@@ -195,6 +195,13 @@ class IPControllerApp(ApplicationWithClusterDir):
         # as those are set in a component.
         self.default_config.Global.import_statements = []
         self.default_config.Global.clean_logs = True
+        self.default_config.Global.task_max_results = 0
+        self.default_config.Global.task_result_ttl = 0
+        self.default_config.Global.task_result_file = u''
+        self.default_config.Global.task_speculation_factor = 0
+        self.default_config.Global.engine_window = 1
+        self.default_config.Global.engine_history_size = 1000
+        self.default_config.Global.engine_history_bytes = 10 * 1024 * 1024
 
     def pre_construct(self):
         super(IPControllerApp, self).pre_construct()
@@ -218,6 +225,23 @@ class IPControllerApp(ApplicationWithClusterDir):
         self.start_logging()
         self.import_statements()
 
+        # How the task controller keeps the results
+        c = self.master_config
+        task.TaskController.result_store_args = dict(
+            max_results=c.Global.task_max_results,
+            ttl=c.Global.task_result_ttl,
+            spill_file=c.Global.task_result_file or None
+        )
+        task.TaskController.speculationFactor = \
+            c.Global.task_speculation_factor
+        # How the engines are driven, once adapted to IEngineQueued when
+        # they register
+        engineservice.QueuedEngine.window = max(1, c.Global.engine_window)
+        engineservice.QueuedEngine.history_size = \
+            c.Global.engine_history_size
+        engineservice.QueuedEngine.history_bytes = \
+            c.Global.engine_history_bytes
+
         # Create the service hierarchy
         self.main_service = service.MultiService()
         # The controller service
@@ -115,6 +115,8 @@ class IPEngineApp(ApplicationWithClusterDir):
 
         # Global config attributes
         self.default_config.Global.exec_lines = []
+        self.default_config.Global.preload_modules = []
+        self.default_config.Global.share_threshold = 0
         self.default_config.Global.shell_class = 'IPython.kernel.core.interpreter.Interpreter'
 
         # Configuration related to the controller
@@ -167,7 +169,11 @@ class IPEngineApp(ApplicationWithClusterDir):
 
         # Create the underlying shell class and EngineService
         shell_class = import_item(self.master_config.Global.shell_class)
-        self.engine_service = EngineService(shell_class, mpi=mpi)
+        self.engine_service = EngineService(
+            shell_class, mpi=mpi,
+            preload=self.master_config.Global.preload_modules,
+            share_threshold=self.master_config.Global.share_threshold
+        )
 
         self.exec_lines()
 
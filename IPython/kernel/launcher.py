@@ -18,10 +18,11 @@ Facilities for launching IPython processes asynchronously.
 import os
 import re
 import sys
+from collections import deque
 
 from IPython.config.configurable import Configurable
 from IPython.external import Itpl
-from IPython.utils.traitlets import Str, Int, List, Unicode
+from IPython.utils.traitlets import Str, Int, List, Unicode, Float, Bool
 from IPython.utils.path import get_ipython_module_path
 from IPython.utils.process import find_cmd, pycmd2argv, FindCmdError
 from IPython.kernel.twistedutil import (
@@ -60,6 +61,10 @@ ipcontroller_cmd_argv = pycmd2argv(get_ipython_module_path(
     'IPython.kernel.ipcontrollerapp'
 ))
 
+prefork_cmd_argv = pycmd2argv(get_ipython_module_path(
+    'IPython.kernel.engineprefork'
+))
+
 #-----------------------------------------------------------------------------
 # Base launchers and errors
 #-----------------------------------------------------------------------------
@@ -264,6 +269,8 @@ class LocalProcessLauncher(BaseLauncher):
     # spawnProcess.
     cmd_and_args = List([])
 
+    protocol_class = LocalProcessLauncherProtocol
+
     def __init__(self, work_dir=u'', config=None):
         super(LocalProcessLauncher, self).__init__(
             work_dir=work_dir, config=config
@@ -276,7 +283,7 @@ class LocalProcessLauncher(BaseLauncher):
 
     def start(self):
         if self.state == 'before':
-            self.process_protocol = LocalProcessLauncherProtocol(self)
+            self.process_protocol = self.protocol_class(self)
             self.start_deferred = defer.Deferred()
             self.process_transport = reactor.spawnProcess(
                 self.process_protocol,
@@ -347,39 +354,347 @@ class LocalEngineLauncher(LocalProcessLauncher):
         return super(LocalEngineLauncher, self).start()
 
 
+class PreforkTemplateProtocol(LocalProcessLauncherProtocol):
+    """A ProcessProtocol to go with the PreforkTemplateLauncher."""
+
+    def __init__(self, process_launcher):
+        LocalProcessLauncherProtocol.__init__(self, process_launcher)
+        self.buffer = ''
+
+    def outReceived(self, data):
+        lines = (self.buffer + data).split('\n')
+        self.buffer = lines.pop()
+        for line in lines:
+            self.lineReceived(line)
+
+    def lineReceived(self, line):
+        words = line.split()
+        if not words:
+            return
+        elif words[0] == 'started':
+            self.process_launcher.engine_started(int(words[1]))
+        elif words[0] == 'stopped':
+            pid, exit_code, sig = [None if w == 'None' else int(w)
+                                   for w in words[1:]]
+            self.process_launcher.engine_stopped(pid, exit_code, sig)
+
+
+class PreforkTemplateLauncher(LocalProcessLauncher):
+    """Start a template process, and fork engines from it.
+
+    The template has imported the modules of an engine (see
+    :mod:`IPython.kernel.engineprefork`), so that the engines forked from it
+    start quickly.
+    """
+
+    template_cmd = List(prefork_cmd_argv, config=True)
+    protocol_class = PreforkTemplateProtocol
+
+    def __init__(self, work_dir=u'', config=None):
+        super(PreforkTemplateLauncher, self).__init__(
+            work_dir=work_dir, config=config
+        )
+        self.modules = []
+        self.engine_args = []
+        # Engines waiting for their pid, and running engines by pid
+        self.forking = deque()
+        self.engines = {}
+
+    def find_args(self):
+        return self.template_cmd + self.modules + ['--'] + self.engine_args
+
+    def start(self, modules, engine_args):
+        """Start the template, with the modules to import and the arguments
+        of the engines."""
+        self.modules = list(modules)
+        self.engine_args = list(engine_args)
+        return super(PreforkTemplateLauncher, self).start()
+
+    def fork(self, engine):
+        """Fork an engine for a PreforkedEngineLauncher."""
+        self.forking.append(engine)
+        self.process_transport.write('fork\n')
+
+    def signal_engine(self, pid, sig):
+        self.process_transport.write('signal %d %s\n' % (pid, sig))
+
+    def engine_started(self, pid):
+        engine = self.forking.popleft()
+        self.engines[pid] = engine
+        engine.notify_start(pid)
+
+    def engine_stopped(self, pid, exit_code, sig):
+        engine = self.engines.pop(pid, None)
+        if engine is not None:
+            engine.notify_stop({'exit_code':exit_code, 'signal':sig,
+                                'status':None, 'pid':pid})
+
+    def notify_stop(self, data):
+        for pid in self.engines.keys():
+            self.engine_stopped(pid, None, None)
+        return super(PreforkTemplateLauncher, self).notify_stop(data)
+
+    def stop(self):
+        """Stop the template, which kills the engines left."""
+        if self.state == 'running':
+            self.process_transport.closeStdin()
+        return defer.succeed(None)
+
+
+class PreforkedEngineLauncher(BaseLauncher):
+    """An engine forked from a template process."""
+
+    def __init__(self, work_dir=u'', config=None, template=None):
+        super(PreforkedEngineLauncher, self).__init__(
+            work_dir=work_dir, config=config
+        )
+        self.template = template
+        self.start_deferred = None
+
+    def find_args(self):
+        return ['preforked engine']
+
+    def start(self):
+        self.start_deferred = defer.Deferred()
+        self.template.fork(self)
+        return self.start_deferred
+
+    def notify_start(self, data):
+        super(PreforkedEngineLauncher, self).notify_start(data)
+        self.start_deferred.callback(data)
+
+    @make_deferred
+    def signal(self, sig):
+        if self.state == 'running':
+            self.template.signal_engine(self.start_data, sig)
+
+    @inlineCallbacks
+    def interrupt_then_kill(self, delay=2.0):
+        """Send INT, wait a delay and then send KILL."""
+        yield self.signal('INT')
+        yield sleep_deferred(delay)
+        yield self.signal('KILL')
+
+    def stop(self):
+        return self.interrupt_then_kill()
+
+
 class LocalEngineSetLauncher(BaseLauncher):
-    """Launch a set of engines as regular external processes."""
+    """Launch a set of engines as regular external processes.
+
+    The engines are launched at most :attr:`concurrency` at a time, until
+    they register with the controller, and :attr:`stagger` seconds apart.
+    Only the engines registered after :meth:`start` are counted.  The
+    controller is only asked for them when needed: before the first launch
+    with :attr:`concurrency`, and by the first :meth:`observe_ready`
+    otherwise, which must then be called before the engines register.
+    With :attr:`prefork`, they are forked from a template process which has
+    already imported IPython and :attr:`prefork_modules`.  Use
+    :meth:`observe_ready` to know when the engines have registered.
+    """
 
     # Command line arguments for ipengine.
     engine_args = List(
         ['--log-to-file','--log-level', '40'], config=True
     )
+    # The largest number of engines launched and not registered yet, or 0
+    # for no limit.
+    concurrency = Int(0, config=True)
+    # The delay between two engine launches, in seconds.
+    stagger = Float(0.0, config=True)
+    # Whether to fork the engines from a template process, and the modules
+    # it imports on top of IPython.  They must not import the Twisted
+    # reactor.
+    prefork = Bool(False, config=True)
+    prefork_modules = List([], config=True)
+    # The delay between two polls of the number of registered engines.
+    poll_interval = Float(0.2, config=True)
 
     def __init__(self, work_dir=u'', config=None):
         super(LocalEngineSetLauncher, self).__init__(
             work_dir=work_dir, config=config
         )
         self.launchers = []
+        self.template = None
+        # The number of engines registered since start, and before it
+        self.registered = 0
+        self._registered_before = None
+        self._to_launch = 0
+        # The delayed call of the next staggered launch
+        self._launch_later = None
+        self._start_deferreds = []
+        self._started = None
+        # (n, deferred) pairs from observe_ready
+        self._ready_deferreds = []
+        self._polling = False
+        self._client = None
+        # Set when the registrations couldn't be counted, to stop limiting
+        # the concurrency
+        self._unlimited = False
 
     def start(self, n, cluster_dir):
-        """Start n engines by profile or cluster_dir."""
+        """Start n engines by profile or cluster_dir.
+
+        The deferred returned fires when all the engines are launched, which
+        may be before they register with the controller.
+        """
         self.cluster_dir = unicode(cluster_dir)
-        dlist = []
-        for i in range(n):
-            el = LocalEngineLauncher(work_dir=self.work_dir, config=self.config)
-            # Copy the engine args over to each engine launcher.
-            import copy
-            el.engine_args = copy.deepcopy(self.engine_args)
-            d = el.start(cluster_dir)
-            if i==0:
-                log.msg("Starting LocalEngineSetLauncher: %r" % el.args)
-            self.launchers.append(el)
-            dlist.append(d)
-        # The consumeErrors here could be dangerous
-        dfinal = gatherBoth(dlist, consumeErrors=True)
+        self.n = n
+        self._to_launch = n
+        self._started = defer.Deferred()
+        self.registered = 0
+        self._registered_before = None
+        self._unlimited = False
+        if self.prefork:
+            self.template = PreforkTemplateLauncher(work_dir=self.work_dir,
+                                                    config=self.config)
+            d = self.template.start(self.prefork_modules, self.engine_args +
+                                    ['--cluster-dir', self.cluster_dir])
+        else:
+            d = defer.succeed(None)
+        if self.concurrency:
+            # The engines already registered must not count against the
+            # concurrency, so they are counted before the first launch
+            d.addCallback(lambda _: self._count_before())
+        d.addCallback(self._launch_engines)
+        d.addErrback(self._started.errback)
+        dfinal = self._started
         dfinal.addCallback(self.notify_start)
         return dfinal
 
+    def _launch_engine(self):
+        if self.template is not None:
+            el = PreforkedEngineLauncher(work_dir=self.work_dir,
+                                         config=self.config,
+                                         template=self.template)
+            d = el.start()
+        else:
+            el = LocalEngineLauncher(work_dir=self.work_dir, config=self.config)
+            # Copy the engine args over to each engine launcher.
+            el.engine_args = list(self.engine_args)
+            d = el.start(self.cluster_dir)
+        if not self.launchers:
+            log.msg("Starting LocalEngineSetLauncher: %r" % el.args)
+        self.launchers.append(el)
+        self._start_deferreds.append(d)
+        self._to_launch -= 1
+        if not self._to_launch:
+            # The consumeErrors here could be dangerous
+            dlist = gatherBoth(self._start_deferreds, consumeErrors=True)
+            dlist.chainDeferred(self._started)
+
+    def _launch_engines(self, r=None):
+        """Launch as many engines as the concurrency and stagger allow."""
+        if self._launch_later is not None and self._launch_later.active():
+            # The next launch waits for the stagger
+            return
+        self._launch_later = None
+        while self._to_launch:
+            if self._blocked():
+                # Wait for registrations
+                self._poll()
+                return
+            self._launch_engine()
+            if self.stagger and self._to_launch:
+                self._launch_later = reactor.callLater(self.stagger,
+                                                       self._launch_engines)
+                return
+
+    def count_registered(self):
+        """Return a deferred to the number of engines of the controller."""
+        if self._client is None:
+            from IPython.kernel.clientconnector import AsyncClientConnector
+            d = AsyncClientConnector().get_multiengine_client(
+                cluster_dir=self.cluster_dir
+            )
+            d.addCallback(lambda client: setattr(self, '_client', client))
+        else:
+            d = defer.succeed(None)
+        d.addCallback(lambda _: self._client.get_ids())
+        d.addCallback(len)
+        return d
+
+    def _count_before(self):
+        def counted(count):
+            self._registered_before = count
+        def failed(f):
+            log.msg('Could not count the registered engines: %s' %
+                    f.getErrorMessage())
+            self._registered_before = 0
+        d = self.count_registered()
+        d.addCallbacks(counted, failed)
+        return d
+
+    def observe_ready(self, n=None):
+        """Get a deferred that fires when n engines have registered.
+
+        Only the engines registered since :meth:`start` are counted, and n
+        defaults to the number of engines started.  The deferred fires
+        with the number of engines registered.
+        """
+        if n is None:
+            n = self.n
+        if self.registered >= n:
+            return defer.succeed(self.registered)
+        d = defer.Deferred()
+        self._ready_deferreds.append((n, d))
+        self._poll()
+        return d
+
+    def _blocked(self):
+        """Are the launches waiting for engines to register?"""
+        return bool(self._to_launch and self.concurrency and
+                    not self._unlimited and
+                    len(self.launchers) - self.registered >= self.concurrency)
+
+    def _waiting(self):
+        """Is something waiting for engines to register?"""
+        return bool(self._ready_deferreds or self._blocked())
+
+    def _poll(self, delay=0):
+        if not self._polling:
+            self._polling = True
+            reactor.callLater(delay, self._count)
+
+    def _count(self):
+        d = self.count_registered()
+        d.addCallbacks(self._handle_count, self._handle_poll_error)
+
+    def _handle_count(self, count):
+        self._polling = False
+        if self._registered_before is None:
+            if self.concurrency:
+                # Still counting the engines registered before start
+                self._poll(self.poll_interval)
+                return
+            # The first count of observe_ready is taken before the engines
+            # register
+            self._registered_before = count
+        count = max(count - self._registered_before, 0)
+        if count != self.registered:
+            self.registered = count
+            waiting = []
+            for n, d in self._ready_deferreds:
+                if count >= n:
+                    d.callback(count)
+                else:
+                    waiting.append((n, d))
+            self._ready_deferreds = waiting
+            self._launch_engines()
+        if self._waiting():
+            self._poll(self.poll_interval)
+
+    def _handle_poll_error(self, f):
+        self._polling = False
+        log.msg('Could not count the registered engines: %s' %
+                f.getErrorMessage())
+        ready, self._ready_deferreds = self._ready_deferreds, []
+        for n, d in ready:
+            d.errback(f)
+        # Without registrations to wait for, launch the engines anyway
+        self._unlimited = True
+        self._launch_engines()
+
     def find_args(self):
         return ['engine set']
 
@@ -392,11 +707,17 @@ class LocalEngineSetLauncher(BaseLauncher):
         return dfinal
 
     def interrupt_then_kill(self, delay=1.0):
+        self._to_launch = 0
+        if self._launch_later is not None and self._launch_later.active():
+            self._launch_later.cancel()
+        self._launch_later = None
         dlist = []
         for el in self.launchers:
             d = el.interrupt_then_kill(delay)
             dlist.append(d)
         dfinal = gatherBoth(dlist, consumeErrors=True)
+        if self.template is not None:
+            dfinal.addBoth(lambda r: self.template.stop())
         return dfinal
 
     def stop(self):
@@ -19,103 +19,178 @@ __docformat__ = "restructuredtext en"
 # Imports
 #-------------------------------------------------------------------------------
 
-import types
+import itertools
 
-from IPython.utils.data import flatten as utils_flatten
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 #-------------------------------------------------------------------------------
-# Figure out which array packages are present and their array types
+# Maps
 #-------------------------------------------------------------------------------
 
-arrayModules = []
-try:
-    import Numeric
-except ImportError:
-    pass
-else:
-    arrayModules.append({'module':Numeric, 'type':Numeric.arraytype})
-try:
-    import numpy
-except ImportError:
-    pass
-else:
-    arrayModules.append({'module':numpy, 'type':numpy.ndarray})
-try:
-    import numarray
-except ImportError:
-    pass
-else:
-    arrayModules.append({'module':numarray,
-        'type':numarray.numarraycore.NumArray})
+def _is_array(obj):
+    return numpy is not None and isinstance(obj, numpy.ndarray)
+
+
+def _join_sequence(pieces, like):
+    """Join slices of the sequence `like` into one of its type."""
+    if _is_array(like):
+        if not pieces:
+            return like[:0]
+        return numpy.concatenate(pieces)
+    elif isinstance(like, basestring):
+        return like[:0].join(pieces)
+    elif isinstance(like, tuple):
+        return tuple(itertools.chain.from_iterable(pieces))
+    return list(itertools.chain.from_iterable(pieces))
+
 
 class Map:
-    """A class for partitioning a sequence using a map."""
-            
+    """A class for partitioning a sequence using a map.
+
+    The sequence is cut in q contiguous blocks, the first len(seq)%q of which
+    have one more item.  The partitions are slices, so those of a numpy array
+    are views of it.
+    """
+
+    def __init__(self):
+        # The bounds of the last sequence partitioned, by (len(seq), q)
+        self._bounds = (None, None)
+
+    def getBounds(self, n, q):
+        """Returns the (lo, hi) bounds of the q partitions of n items."""
+        if self._bounds[0] != (n, q):
+            self._bounds = ((n, q), self.computeBounds(n, q))
+        return self._bounds[1]
+
+    def computeBounds(self, n, q):
+        basesize, remainder = divmod(n, q)
+        lo = [p*basesize + min(p, remainder) for p in range(q+1)]
+        return zip(lo[:-1], lo[1:])
+
     def getPartition(self, seq, p, q):
         """Returns the pth partition of q partitions of seq."""
-        
+
         # Test for error conditions here
         if p<0 or p>=q:
           print "No partition exists."
           return
-          
-        remainder = len(seq)%q
-        basesize = len(seq)/q
-        hi = []
-        lo = []
-        for n in range(q):
-            if n < remainder:
-                lo.append(n * (basesize + 1))
-                hi.append(lo[-1] + basesize + 1)
-            else:
-                lo.append(n*basesize + remainder)
-                hi.append(lo[-1] + basesize)
-
-        
-        result = seq[lo[p]:hi[p]]
-        return result
-           
+
+        lo, hi = self.getBounds(len(seq), q)[p]
+        return seq[lo:hi]
+
+    def getPartitions(self, seq, q):
+        """Returns the q partitions of seq."""
+        return [seq[lo:hi] for lo, hi in self.getBounds(len(seq), q)]
+
     def joinPartitions(self, listOfPartitions):
         return self.concatenate(listOfPartitions)
-                    
+
     def concatenate(self, listOfPartitions):
         testObject = listOfPartitions[0]
-        # First see if we have a known array type
-        for m in arrayModules:
-            #print m
-            if isinstance(testObject, m['type']):
-                return m['module'].concatenate(listOfPartitions)
+        # First see if we have an array
+        if _is_array(testObject):
+            return numpy.concatenate(listOfPartitions)
         # Next try for Python sequence types
-        if isinstance(testObject, (types.ListType, types.TupleType)):
-            return utils_flatten(listOfPartitions)
+        if isinstance(testObject, (list, tuple)):
+            return list(itertools.chain.from_iterable(listOfPartitions))
         # If we have scalars, just return listOfPartitions
         return listOfPartitions
 
-class RoundRobinMap(Map):
-    """Partitions a sequence in a roun robin fashion.
-    
-    This currently does not work!
+
+class WeightedMap(Map):
+    """Partitions a sequence in contiguous blocks sized by weights.
+
+    The pth partition gets weights[p]/sum(weights) of the items, so that
+    engines given weights proportional to their speed finish at about the
+    same time.  There must be a weight for each partition.
     """
 
+    def __init__(self, weights):
+        Map.__init__(self)
+        self.weights = list(weights)
+        if not self.weights or min(self.weights) < 0 or \
+                not sum(self.weights) > 0:
+            raise ValueError('weights must be positive: %r' % (weights,))
+
+    def computeBounds(self, n, q):
+        if q != len(self.weights):
+            raise ValueError('%i weights for %i partitions' %
+                             (len(self.weights), q))
+        total = float(sum(self.weights))
+        lo = [0]
+        cumulative = 0
+        for weight in self.weights[:-1]:
+            cumulative += weight
+            lo.append(int(round(n*cumulative/total)))
+        lo.append(n)
+        return zip(lo[:-1], lo[1:])
+
+
+class BlockCyclicMap(Map):
+    """Partitions a sequence in blocks of `block` items dealt in turn.
+
+    The pth partition gets the blocks p, p+q, p+2q...  With blocks of one
+    item, the partitions of a numpy array are strided views of it, otherwise
+    they are copies.  Joining the partitions puts the items back in order.
+    """
+
+    def __init__(self, block=1):
+        Map.__init__(self)
+        if block < 1:
+            raise ValueError('block must be at least 1: %r' % block)
+        self.block = block
+
     def getPartition(self, seq, p, q):
-        return seq[p:len(seq):q]
-        #result = []
-        #for i in range(p,len(seq),q):
-        #    result.append(seq[i])
-        #return result
+        if p<0 or p>=q:
+          print "No partition exists."
+          return
+
+        b = self.block
+        if b == 1:
+            return seq[p::q]
+        return _join_sequence([seq[start:start+b] for start
+                               in xrange(p*b, len(seq), q*b)], seq)
+
+    def getPartitions(self, seq, q):
+        return [self.getPartition(seq, p, q) for p in range(q)]
 
     def joinPartitions(self, listOfPartitions):
-        #lengths = [len(x) for x in listOfPartitions]
-        #maxPartitionLength = len(listOfPartitions[0])
-        #numberOfPartitions = len(listOfPartitions)
-        #concat = self.concatenate(listOfPartitions)
-        #totalLength = len(concat)
-        #result = []
-        #for i in range(maxPartitionLength):
-        #    result.append(concat[i:totalLength:maxPartitionLength])
-        return self.concatenate(listOfPartitions)
-        
-dists = {'b':Map}
+        testObject = listOfPartitions[0]
+        if not (_is_array(testObject) or
+                isinstance(testObject, (list, tuple))):
+            # Scalars are in order already
+            return listOfPartitions
+        b = self.block
+        q = len(listOfPartitions)
+        if b == 1 and _is_array(testObject):
+            n = sum(len(part) for part in listOfPartitions)
+            result = numpy.empty((n,) + testObject.shape[1:],
+                                 testObject.dtype)
+            for p, part in enumerate(listOfPartitions):
+                result[p::q] = part
+            return result
+        longest = max(len(part) for part in listOfPartitions)
+        pieces = [part[start:start+b] for start in xrange(0, longest, b)
+                  for part in listOfPartitions if start < len(part)]
+        if _is_array(testObject):
+            return _join_sequence(pieces, testObject)
+        return list(itertools.chain.from_iterable(pieces))
+
+
+# The name kept for the round robin map of older versions
+RoundRobinMap = BlockCyclicMap
+
+dists = {'b':Map, 'r':BlockCyclicMap}
+
 
-    
-    
+def get_map(dist):
+    """Returns the Map for dist, a key of `dists` or a Map instance."""
+    if isinstance(dist, Map):
+        return dist
+    try:
+        return dists[dist]()
+    except (KeyError, TypeError):
+        raise ValueError('unknown distribution: %r' % (dist,))
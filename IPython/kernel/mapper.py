@@ -95,9 +95,10 @@ class MultiEngineMapper(object):
         :Parameters:
             multiengine : `IMultiEngine` implementer
                 The multiengine to use for running the map commands
-            dist : str
-                The type of decomposition to use.  Only block ('b') is
-                supported currently
+            dist : str or Map
+                The type of decomposition to use, a key of
+                `IPython.kernel.map.dists` ('b' for blocks, 'r' for round
+                robin) or a `Map` instance
             targets : (str, int, tuple of ints)
                 The engines to use in the map
             block : boolean
@@ -173,7 +174,7 @@ class TaskMapper(object):
         if self.block:
             def get_results(task_ids):
                 d = self.task_controller.barrier(task_ids)
-                d.addCallback(lambda _: gatherBoth([self.task_controller.get_task_result(tid) for tid in task_ids], consumeErrors=1))
+                d.addCallback(lambda _: gatherBoth([self.task_controller.get_task_result(tid, forget=True) for tid in task_ids], consumeErrors=1))
                 d.addCallback(collect_exceptions, 'map')
                 return d
             dlist.addCallback(get_results)
@@ -226,7 +227,7 @@ class SynchronousTaskMapper(object):
             task_ids.append(self.task_controller.run(task))
         if self.block:
             self.task_controller.barrier(task_ids)
-            task_results = [self.task_controller.get_task_result(tid) for tid in task_ids]
+            task_results = [self.task_controller.get_task_result(tid, forget=True) for tid in task_ids]
             return task_results
         else:
             return task_ids
\ No newline at end of file
@@ -34,6 +34,7 @@ from zope.interface import Interface, implements
 from IPython.kernel.twistedutil import gatherBoth
 from IPython.kernel import error
 from IPython.kernel.pendingdeferred import PendingDeferredManager, two_phase
+from IPython.kernel.pickleutil import Pickled, canDict
 from IPython.kernel.controllerservice import (
     ControllerAdapterBase,
     IControllerBase
@@ -332,12 +333,17 @@ class MultiEngine(ControllerAdapterBase):
         return self._performOnEnginesAndGatherBoth('execute', lines, targets=targets)
     
     def push(self, ns, targets='all'):
+        # Pickle the namespace once for all the engines
+        if not isinstance(ns, Pickled):
+            ns = Pickled(ns)
         return self._performOnEnginesAndGatherBoth('push', ns, targets=targets)
         
     def pull(self, keys, targets='all'):
         return self._performOnEnginesAndGatherBoth('pull', keys, targets=targets)
     
     def push_function(self, ns, targets='all'):
+        if not isinstance(ns, Pickled):
+            ns = Pickled(ns, can=canDict)
         return self._performOnEnginesAndGatherBoth('push_function', ns, targets=targets)
         
     def pull_function(self, keys, targets='all'):
@@ -238,6 +238,8 @@ class QueueStatusList(list):
         for e in self:
             output.append("Engine: %s\n" % repr(e[0]))
             output.append("    Pending: %s\n" % repr(e[1]['pending']))
+            for q in e[1]['inflight'][1:]:
+                output.append("    Sent: %s\n" % repr(q))
             for q in e[1]['queue']:
                 output.append("    Command: %s\n" % repr(q))
         return ''.join(output)
@@ -349,7 +351,18 @@ class FullBlockingMultiEngineClient(InteractiveMultiEngineClient):
         self.smultiengine = smultiengine
         self.block = True
         self.targets = 'all'
-    
+
+    def _get_share_threshold(self):
+        return self.smultiengine.share_threshold
+
+    def _set_share_threshold(self, threshold):
+        self.smultiengine.share_threshold = threshold
+
+    share_threshold = property(_get_share_threshold, _set_share_threshold,
+        doc="""The size in bytes from which pushed values are passed through
+        shared memory, or 0 to never do it.  Only set it when the engines run
+        on the host of the client.""")
+
     def _findBlock(self, block=None):
         if block is None:
             return self.block
@@ -775,9 +788,9 @@ class FullBlockingMultiEngineClient(InteractiveMultiEngineClient):
         the map happens.
         
         :Parameters:
-            dist : str
-                What decomposition to use, 'b' is the only one supported
-                currently
+            dist : str or Map
+                What decomposition to use, a key of `IPython.kernel.map.dists`
+                ('b' for blocks, 'r' for round robin) or a `Map` instance
             targets : str, int, sequence of ints
                 Which engines to use for the map
             block : boolean
@@ -800,9 +813,9 @@ class FullBlockingMultiEngineClient(InteractiveMultiEngineClient):
         This causes f(0,0), f(1,1), ... to be called in parallel.
         
         :Parameters:
-            dist : str
-                What decomposition to use, 'b' is the only one supported
-                currently
+            dist : str or Map
+                What decomposition to use, a key of `IPython.kernel.map.dists`
+                ('b' for blocks, 'r' for round robin) or a `Map` instance
             targets : str, int, sequence of ints
                 Which engines to use for the map
             block : boolean
@@ -43,7 +43,9 @@ from IPython.kernel.multiengine import (
     IFullSynchronousMultiEngine,
     ISynchronousMultiEngine)
 from IPython.kernel.pendingdeferred import PendingDeferredManager
+from IPython.kernel.sharedmem import release, resolve, share_namespace
 from IPython.kernel.pickleutil import (
+    Pickled,
     canDict,
     canSequence, uncanDict, uncanSequence
 )
@@ -150,6 +152,8 @@ class FCSynchronousMultiEngineFromMultiEngine(Referenceable):
         except:
             d = defer.fail(failure.Failure())
         else:
+            # Send the pickle of the client to the engines
+            namespace = Pickled(namespace, binaryNS)
             d = self.smultiengine.push(namespace, targets=targets, block=block)
         return d
     
@@ -165,7 +169,7 @@ class FCSynchronousMultiEngineFromMultiEngine(Referenceable):
         except:
             d = defer.fail(failure.Failure())
         else:
-            namespace = uncanDict(namespace)
+            namespace = Pickled(uncanDict(namespace), binaryNS, canDict)
             d = self.smultiengine.push_function(namespace, targets=targets, block=block)
         return d
     
@@ -296,9 +300,16 @@ class FCFullSynchronousMultiEngineClient(object):
         IMapper
     )
     
+    # The size in bytes from which pushed values are passed through shared
+    # memory, or 0 to never do it.  Only for engines on the host of the
+    # client (see IPython.kernel.sharedmem).
+    share_threshold = 0
+    
     def __init__(self, remote_reference):
         self.remote_reference = remote_reference
         self._deferredIDCallbacks = {}
+        # The shared memory handles to release with each deferred id
+        self._deferredIDHandles = {}
         # This class manages some pending deferreds through this instance.  This
         # is required for methods like gather/scatter as it enables us to
         # create our own pending deferreds for composite operations.
@@ -326,6 +337,10 @@ class FCFullSynchronousMultiEngineClient(object):
         else:
             d = self.remote_reference.callRemote('get_pending_deferred', deferredID, block)
             d.addCallback(self.unpackage)
+            d.addCallback(resolve, True, 1)
+            handles = self._deferredIDHandles.pop(deferredID, None)
+            if handles:
+                d.addBoth(self._release, handles)
             try:
                 callback = self._deferredIDCallbacks.pop(deferredID)
             except KeyError:
@@ -345,6 +360,14 @@ class FCFullSynchronousMultiEngineClient(object):
     def _addDeferredIDCallback(self, did, callback, *args, **kwargs):
         self._deferredIDCallbacks[did] = (callback, args, kwargs)
         return did
+    
+    def _addDeferredIDHandles(self, did, handles):
+        self._deferredIDHandles[did] = handles
+        return did
+    
+    def _release(self, result, handles):
+        release(handles)
+        return result
        
     #---------------------------------------------------------------------------
     # IEngineMultiplexer related methods
@@ -356,14 +379,27 @@ class FCFullSynchronousMultiEngineClient(object):
         return d
     
     def push(self, namespace, targets='all', block=True):
+        handles = []
+        if self.share_threshold:
+            namespace, handles = share_namespace(namespace,
+                                                 self.share_threshold)
         serial = pickle.dumps(namespace, 2)
         d =  self.remote_reference.callRemote('push', serial, targets, block)
         d.addCallback(self.unpackage)
+        if handles:
+            # The engines are done with the shared memory once they answer
+            if block:
+                d.addBoth(self._release, handles)
+            else:
+                d.addCallbacks(self._addDeferredIDHandles, self._release,
+                               callbackArgs=(handles,),
+                               errbackArgs=(handles,))
         return d
     
     def pull(self, keys, targets='all', block=True):
         d = self.remote_reference.callRemote('pull', keys, targets, block)
         d.addCallback(self.unpackage)
+        d.addCallback(resolve, True, 1)
         return d
     
     def push_function(self, namespace, targets='all', block=True):
@@ -497,13 +533,12 @@ class FCFullSynchronousMultiEngineClient(object):
         # difficult to get right though.
         def do_scatter(engines):
             nEngines = len(engines)
-            mapClass = Map.dists[dist]
-            mapObject = mapClass()
+            mapObject = Map.get_map(dist)
+            partitions = mapObject.getPartitions(seq, nEngines)
             d_list = []
             # Loop through and push to each engine in non-blocking mode.
             # This returns a set of deferreds to deferred_ids
-            for index, engineid in enumerate(engines):
-                partition = mapObject.getPartition(seq, index, nEngines)
+            for engineid, partition in zip(engines, partitions):
                 if flatten and len(partition) == 1:
                     d = self.push({key: partition[0]}, targets=engineid, block=False)
                 else:
@@ -562,9 +597,7 @@ class FCFullSynchronousMultiEngineClient(object):
         # deferred id that corresponds to the entire group.  This logic is extremely
         # difficult to get right though.
         def do_gather(engines):
-            nEngines = len(engines)
-            mapClass = Map.dists[dist]
-            mapObject = mapClass()
+            mapObject = Map.get_map(dist)
             d_list = []
             # Loop through and push to each engine in non-blocking mode.
             # This returns a set of deferreds to deferred_ids
@@ -678,9 +711,9 @@ class FCFullSynchronousMultiEngineClient(object):
         the map happens.
         
         :Parameters:
-            dist : str
-                What decomposition to use, 'b' is the only one supported
-                currently
+            dist : str or Map
+                What decomposition to use, a key of `IPython.kernel.map.dists`
+                ('b' for blocks, 'r' for round robin) or a `Map` instance
             targets : str, int, sequence of ints
                 Which engines to use for the map
             block : boolean
@@ -703,9 +736,9 @@ class FCFullSynchronousMultiEngineClient(object):
         This causes f(0,0), f(1,1), ... to be called in parallel.
         
         :Parameters:
-            dist : str
-                What decomposition to use, 'b' is the only one supported
-                currently
+            dist : str or Map
+                What decomposition to use, a key of `IPython.kernel.map.dists`
+                ('b' for blocks, 'r' for round robin) or a `Map` instance
             targets : str, int, sequence of ints
                 Which engines to use for the map
             block : boolean
@@ -37,9 +37,9 @@ class IMultiEngineParallelDecorator(Interface):
         This causes f(0,0), f(1,1), ... to be called in parallel.
         
         :Parameters:
-            dist : str
-                What decomposition to use, 'b' is the only one supported
-                currently
+            dist : str or Map
+                What decomposition to use, a key of `IPython.kernel.map.dists`
+                ('b' for blocks, 'r' for round robin) or a `Map` instance
             targets : str, int, sequence of ints
                 Which engines to use for the map
             block : boolean
@@ -15,8 +15,13 @@ __docformat__ = "restructuredtext en"
 # Imports
 #-------------------------------------------------------------------------------
 
+import copy
+import cPickle as pickle
 from types import FunctionType
 
+# Registers the pickling of code objects, for the canned functions
+import IPython.kernel.codeutil
+
 class CannedObject(object):
     pass
     
@@ -80,3 +85,52 @@ def uncanSequence(obj, g=None):
 
 def rebindFunctionGlobals(f, glbls):
     return FunctionType(f.func_code, glbls)
+
+
+class Pickled(object):
+    """An object with its pickle, made at most once.
+
+    The controller sends the objects pushed to many engines as a Pickled, so
+    that they are pickled once whatever the number of engines.  The engines
+    of the controller process use :attr:`obj`, and the references to remote
+    engines send :meth:`getData`.
+
+    When only `data` is given, the object is unpickled the first time it is
+    needed.  `can` is applied to a copy of the object before pickling it.
+    """
+
+    def __init__(self, obj=None, data=None, can=None):
+        self._obj = obj
+        self._data = data
+        self.can = can
+
+    def _get_obj(self):
+        if self._obj is None and self._data is not None:
+            self._obj = pickle.loads(self._data)
+        return self._obj
+
+    obj = property(_get_obj)
+
+    def getData(self):
+        if self._data is None:
+            obj = self._obj
+            if self.can is not None:
+                obj = self.can(copy.copy(obj))
+            self._data = pickle.dumps(obj, 2)
+        return self._data
+
+    def getDataSize(self, units=10.0**6):
+        return len(self.getData())/units
+
+    def __repr__(self):
+        if self._obj is None:
+            return '<Pickled data>'
+        else:
+            return '<Pickled %s>' % type(self._obj).__name__
+
+def unpickled(obj):
+    """Return the object held by a Pickled, or obj itself."""
+    if isinstance(obj, Pickled):
+        return obj.obj
+    else:
+        return obj
@@ -0,0 +1,216 @@
+# encoding: utf-8
+
+"""Stores for the results of the tasks run by a task controller.
+
+A task controller keeps the result of each task until a client gets it.
+:class:`ResultStore` keeps them in memory, and can bound their number, drop
+those which were not used for some time, and spill those it evicts to an
+SQLite file instead of dropping them.
+"""
+
+__docformat__ = "restructuredtext en"
+
+#-------------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# Imports
+#-------------------------------------------------------------------------------
+
+import cPickle as pickle
+import time
+from collections import deque
+
+from twisted.python import failure
+
+#-------------------------------------------------------------------------------
+# Result stores
+#-------------------------------------------------------------------------------
+
+def result_failed(result):
+    """Is the result of a task a failure, or None if it is not a result."""
+    if isinstance(result, failure.Failure):
+        return True
+    if hasattr(result, 'failure'):
+        return result.failure is not None
+    return None
+
+
+class SQLiteResults(object):
+    """Results of tasks pickled in an SQLite file, by task id."""
+
+    def __init__(self, filename):
+        import sqlite3
+        self.filename = filename
+        self.db = sqlite3.connect(filename)
+        # The results are only kept for the life of the controller
+        self.db.execute('PRAGMA synchronous = OFF')
+        self.db.execute('DROP TABLE IF EXISTS results')
+        self.db.execute('CREATE TABLE results (taskid INTEGER PRIMARY KEY, '
+                        'used REAL, failed INTEGER, result BLOB)')
+        self.db.commit()
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def __contains__(self, taskid):
+        return self.db.execute('SELECT 1 FROM results WHERE taskid = ?',
+                               (taskid,)).fetchone() is not None
+
+    def get(self, taskid):
+        """Return the result of a task, raising KeyError if there is none."""
+        row = self.db.execute('SELECT result FROM results WHERE taskid = ?',
+                              (taskid,)).fetchone()
+        if row is None:
+            raise KeyError(taskid)
+        return pickle.loads(str(row[0]))
+
+    def put(self, taskid, result, used):
+        import sqlite3
+        data = sqlite3.Binary(pickle.dumps(result, 2))
+        self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                        (taskid, used, result_failed(result), data))
+        self.db.commit()
+
+    def delete(self, taskid):
+        self.db.execute('DELETE FROM results WHERE taskid = ?', (taskid,))
+        self.db.commit()
+
+    def expire(self, before):
+        """Delete the results last used before the time `before`."""
+        self.db.execute('DELETE FROM results WHERE used < ?', (before,))
+        self.db.commit()
+
+    def statuses(self):
+        """Yield (taskid, failed) for each result."""
+        return iter(self.db.execute('SELECT taskid, failed FROM results'))
+
+    def clear(self):
+        self.db.execute('DELETE FROM results')
+        self.db.commit()
+
+
+class ResultStore(object):
+    """The results of tasks, by task id.
+
+    With `max_results`, only that many results are kept in memory, and the
+    least recently used ones are evicted first.  With `ttl`, the results
+    which have not been used for that many seconds are dropped.  With
+    `spill_file`, the results evicted from memory are kept in that SQLite
+    file instead of being dropped.  The defaults keep all the results in
+    memory.
+    """
+
+    def __init__(self, max_results=0, ttl=0, spill_file=None):
+        self.max_results = max_results
+        self.ttl = ttl
+        # taskid: (last use, result, tick of the last use)
+        self._results = {}
+        # (tick, taskid) from the least recently used.  An entry is stale,
+        # and skipped, once the result is used again or removed.
+        self._order = deque()
+        self._tick = 0
+        self.spill = None
+        if spill_file:
+            self.spill = SQLiteResults(spill_file)
+        # The number of results dropped by eviction or expiry
+        self.dropped = 0
+        self._spill_expired = 0
+
+    def __len__(self):
+        self._expire()
+        if self.spill is None:
+            return len(self._results)
+        return len(self._results) + len(self.spill)
+
+    def __contains__(self, taskid):
+        self._expire()
+        return taskid in self._results or \
+            (self.spill is not None and taskid in self.spill)
+
+    def __getitem__(self, taskid):
+        self._expire()
+        if taskid in self._results:
+            result = self._results[taskid][1]
+            self._use(taskid, result)
+            return result
+        elif self.spill is not None:
+            return self.spill.get(taskid)
+        raise KeyError(taskid)
+
+    def __setitem__(self, taskid, result):
+        self._use(taskid, result)
+        while self.max_results and len(self._results) > self.max_results:
+            old_taskid, (used, old_result, tick) = self._oldest()
+            del self._results[old_taskid]
+            if self.spill is not None:
+                self.spill.put(old_taskid, old_result, used)
+            else:
+                self.dropped += 1
+        self._expire()
+
+    def pop(self, taskid, default=None):
+        """Remove the result of a task and return it."""
+        if taskid in self._results:
+            return self._results.pop(taskid)[1]
+        elif self.spill is not None and taskid in self.spill:
+            result = self.spill.get(taskid)
+            self.spill.delete(taskid)
+            return result
+        return default
+
+    def statuses(self):
+        """Yield (taskid, failed) for each result, as for result_failed."""
+        self._expire()
+        for taskid, (used, result, tick) in self._results.items():
+            yield taskid, result_failed(result)
+        if self.spill is not None:
+            for taskid, failed in self.spill.statuses():
+                yield taskid, failed if failed is None else bool(failed)
+
+    def clear(self):
+        self._results.clear()
+        self._order.clear()
+        if self.spill is not None:
+            self.spill.clear()
+
+    def _use(self, taskid, result):
+        self._tick += 1
+        self._results[taskid] = (time.time(), result, self._tick)
+        self._order.append((self._tick, taskid))
+        if len(self._order) > 2*len(self._results) + 100:
+            # Drop the stale entries
+            self._order = deque(sorted((tick, taskid) for taskid,
+                                       (used, result, tick)
+                                       in self._results.iteritems()))
+
+    def _oldest(self):
+        """Return (taskid, entry) of the least recently used result."""
+        order = self._order
+        while order:
+            tick, taskid = order[0]
+            entry = self._results.get(taskid)
+            if entry is not None and entry[2] == tick:
+                return taskid, entry
+            order.popleft()
+        return None, None
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        before = time.time() - self.ttl
+        while self._results:
+            taskid, (used, result, tick) = self._oldest()
+            if used >= before:
+                break
+            del self._results[taskid]
+            self.dropped += 1
+        # Expiring spilled results is a write, so it is done at most once a
+        # second
+        if self.spill is not None and self._spill_expired < time.time() - 1:
+            self.spill.expire(before)
+            self._spill_expired = time.time()
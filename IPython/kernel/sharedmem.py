@@ -0,0 +1,205 @@
+# encoding: utf-8
+
+"""Pass large values through shared memory between processes of one host.
+
+A large value is written to a file in shared memory (``/dev/shm`` where it
+exists) and replaced by a :class:`SharedHandle`, which pickles to a few
+hundred bytes whatever the size of the value.  The handle goes through the
+controller instead of the value, and the process at the other end maps the
+file to get the value back with :func:`resolve`.  Numpy arrays are mapped
+copy-on-write, without being copied.
+
+This only works between processes on the same host, so it is only used when
+asked for: by the ``share_threshold`` of a multiengine client for what it
+pushes, and of an engine for what is pulled from it.
+"""
+
+__docformat__ = "restructuredtext en"
+
+#-------------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# Imports
+#-------------------------------------------------------------------------------
+
+import atexit
+import cPickle as pickle
+import mmap
+import os
+import socket
+import tempfile
+
+from IPython.kernel import error
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#-------------------------------------------------------------------------------
+# Shared memory files
+#-------------------------------------------------------------------------------
+
+# The files created by this process and not released yet, some of which may
+# have been removed by the process which read them.
+_owned = set()
+
+
+def shm_dir():
+    """The directory of the shared memory files."""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+def release(handles):
+    """Remove the files of handles created by this process."""
+    for handle in handles:
+        _owned.discard(handle.path)
+        try:
+            os.unlink(handle.path)
+        except OSError:
+            pass
+
+
+def _release_all():
+    for path in list(_owned):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+    _owned.clear()
+
+atexit.register(_release_all)
+
+
+class SharedHandle(object):
+    """A value written to a shared memory file.
+
+    `kind` is 'bytes' for a str, 'array' for a numpy array, whose `dtype`
+    and `shape` are kept, and 'pickle' for anything else.
+    """
+
+    def __init__(self, path, size, kind, dtype=None, shape=None):
+        self.path = path
+        self.size = size
+        self.kind = kind
+        self.dtype = dtype
+        self.shape = shape
+        self.host = socket.gethostname()
+
+    def __repr__(self):
+        return '<SharedHandle %s %s, %d bytes>' % (self.kind, self.path,
+                                                  self.size)
+
+    def load(self):
+        """Map the file and return the value."""
+        if self.host != socket.gethostname():
+            raise error.KernelError('The shared memory of %r is on host %s, '
+                                    'not on this one' % (self.path, self.host))
+        f = open(self.path, 'rb')
+        try:
+            data = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_COPY)
+        finally:
+            f.close()
+        if self.kind == 'array':
+            # The array keeps the map alive, and writes to it stay private
+            return numpy.frombuffer(data, self.dtype).reshape(self.shape)
+        try:
+            if self.kind == 'bytes':
+                return data[:]
+            return pickle.loads(data[:])
+        finally:
+            data.close()
+
+
+def _write(data):
+    if len(_owned) >= 1000:
+        _owned.difference_update([path for path in _owned
+                                  if not os.path.exists(path)])
+    fd, path = tempfile.mkstemp(prefix='ipython-shm-', dir=shm_dir())
+    _owned.add(path)
+    try:
+        view = buffer(data)
+        while view:
+            view = view[os.write(fd, view):]
+    finally:
+        os.close(fd)
+    return path
+
+
+def share(obj, threshold):
+    """Return a SharedHandle for obj if it is `threshold` bytes or more.
+
+    Smaller values are returned as they are.  Lists and tuples are pickled
+    to know their size if they have at least threshold/8 items.
+    """
+    if isinstance(obj, str):
+        if len(obj) >= threshold:
+            return SharedHandle(_write(obj), len(obj), 'bytes')
+    elif numpy is not None and isinstance(obj, numpy.ndarray):
+        if obj.nbytes >= threshold and not obj.dtype.hasobject:
+            obj = numpy.ascontiguousarray(obj)
+            return SharedHandle(_write(obj), obj.nbytes, 'array',
+                                obj.dtype, obj.shape)
+    elif isinstance(obj, (list, tuple)) and len(obj)*8 >= threshold:
+        data = pickle.dumps(obj, 2)
+        if len(data) >= threshold:
+            return SharedHandle(_write(data), len(data), 'pickle')
+    return obj
+
+
+class SharedList(list):
+    """Values pulled together, of which some are SharedHandles."""
+    pass
+
+
+def share_namespace(namespace, threshold):
+    """Share the large values of a dict, return the new dict and handles."""
+    shared = {}
+    handles = []
+    for key, value in namespace.iteritems():
+        shared[key] = share(value, threshold)
+        if isinstance(shared[key], SharedHandle):
+            handles.append(shared[key])
+    return shared, handles
+
+
+def share_values(values, threshold):
+    """Share the large values of a sequence, in a SharedList if any is."""
+    shared = [share(value, threshold) for value in values]
+    for value in shared:
+        if isinstance(value, SharedHandle):
+            return SharedList(shared)
+    return values
+
+
+def resolve(obj, unlink=False, depth=0):
+    """Replace the handles in obj by their values.
+
+    obj is a SharedHandle, a SharedList or, with `depth`, a list, tuple or
+    dict of them.  Other values are returned as they are, without looking
+    into them.  With `unlink`, the files of the handles are removed once
+    loaded, which is for values with a single reader.
+    """
+    if isinstance(obj, SharedHandle):
+        value = obj.load()
+        if unlink:
+            release([obj])
+        return value
+    elif isinstance(obj, SharedList):
+        return [resolve(value, unlink) for value in obj]
+    elif depth > 0:
+        if isinstance(obj, list):
+            return [resolve(value, unlink, depth-1) for value in obj]
+        elif isinstance(obj, tuple):
+            return tuple(resolve(value, unlink, depth-1) for value in obj)
+        elif isinstance(obj, dict):
+            return dict((key, resolve(value, unlink, depth-1))
+                        for key, value in obj.iteritems())
+    return obj
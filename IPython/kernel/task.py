@@ -19,6 +19,7 @@ __docformat__ = "restructuredtext en"
 # Tell nose to skip the testing of this module
 __test__ = {}
 
+import copy
 import time
 from types import FunctionType
 
@@ -31,6 +32,8 @@ from IPython.kernel import controllerservice as cs
 from IPython.kernel.twistedutil import DeferredList
 
 from IPython.kernel.pickleutil import can, uncan
+from IPython.kernel.resultstore import ResultStore, result_failed
+from IPython.kernel.sharedmem import resolve
 
 #-----------------------------------------------------------------------------
 # Definition of the Task objects
@@ -169,7 +172,7 @@ class BaseTask(object):
     zi.implements(ITask)
     
     def __init__(self, clear_before=False, clear_after=False, retries=0,
-            recovery_task=None, depend=None):
+            recovery_task=None, depend=None, after=None):
         """
         Make a generic task.
         
@@ -187,12 +190,27 @@ class BaseTask(object):
             depend : FunctionType
                 A function that is called to test for properties.  This function
                 must take one argument, the properties dict and return a boolean
+            after : int or list of ints
+                The ids of the tasks which must succeed before this one is
+                run.  The variables pulled by those of them which are
+                `StringTask` are in the namespace of this task.
         """
         self.clear_before = clear_before
         self.clear_after = clear_after
         self.retries = retries
         self.recovery_task = recovery_task
         self.depend = depend
+        if after is None:
+            self.after = ()
+        elif isinstance(after, int):
+            self.after = (after,)
+        elif isinstance(after, (list, tuple)):
+            self.after = tuple(after)
+        else:
+            raise TypeError('after must be a task id or a sequence of them')
+        # The variables of the upstream tasks to push before running this
+        # one, set by the task controller
+        self.upstream_ns = {}
         self.taskid = None
     
     def start_time(self, result):
@@ -216,10 +234,14 @@ class BaseTask(object):
     
     def pre_task(self, d, queued_engine):
         """
-        Clear the engine before running the task if clear_before is set.
+        Clear the engine before running the task if clear_before is set,
+        and push the variables of the upstream tasks.
         """
         if self.clear_before:
             d.addCallback(lambda r: queued_engine.reset())
+        if self.upstream_ns:
+            upstream_ns = self.upstream_ns
+            d.addCallback(lambda r: queued_engine.push(upstream_ns))
     
     def post_task(self, d, queued_engine):
         """
@@ -273,7 +295,8 @@ class MapTask(BaseTask):
     zi.implements(ITask)
     
     def __init__(self, function, args=None, kwargs=None, clear_before=False, 
-            clear_after=False, retries=0, recovery_task=None, depend=None):
+            clear_after=False, retries=0, recovery_task=None, depend=None,
+            after=None):
         """
         Create a task based on a function, args and kwargs.
         
@@ -284,7 +307,7 @@ class MapTask(BaseTask):
         exception is the task result for this type of task.
         """
         BaseTask.__init__(self, clear_before, clear_after, retries, 
-            recovery_task, depend)
+            recovery_task, depend, after)
         if not isinstance(function, FunctionType):
             raise TypeError('a task function must be a FunctionType')
         self.function = function
@@ -312,6 +335,7 @@ class MapTask(BaseTask):
             '_ipython_task_result = _ipython_task_function(*_ipython_task_args,**_ipython_task_kwargs)')
         )
         d.addCallback(lambda r: queued_engine.pull('_ipython_task_result'))
+        d.addCallback(resolve, True)
     
     def can_task(self):
         self.function = can(self.function)
@@ -329,7 +353,7 @@ class StringTask(BaseTask):
 
     def __init__(self, expression, pull=None, push=None,
             clear_before=False, clear_after=False, retries=0, 
-            recovery_task=None, depend=None):
+            recovery_task=None, depend=None, after=None):
         """
         Create a task based on a Python expression and variables
         
@@ -363,7 +387,7 @@ class StringTask(BaseTask):
             raise TypeError('push must be a dict')
         
         BaseTask.__init__(self, clear_before, clear_after, retries, 
-            recovery_task, depend)
+            recovery_task, depend, after)
 
     def submit_task(self, d, queued_engine):
         if self.push is not None:
@@ -373,6 +397,7 @@ class StringTask(BaseTask):
         
         if self.pull is not None:
             d.addCallback(lambda r: queued_engine.pull(self.pull))
+            d.addCallback(resolve, True)
         else:
             d.addCallback(lambda r: None)    
     
@@ -593,7 +618,9 @@ class IScheduler(zi.Interface):
             task : an `ITask` implementer
                 The task to be queued.
             flags : dict
-                General keywords for more sophisticated scheduling
+                General keywords for more sophisticated scheduling.  The
+                `TaskController` gives `first=True` for a task whose upstream
+                tasks just finished, which should be run before the others.
         """
     
     def pop_task(id=None):
@@ -619,7 +646,9 @@ class IScheduler(zi.Interface):
         :Parameters:
             worker : an `IWorker` implementer
             flags : dict
-                General keywords for more sophisticated scheduling
+                General keywords for more sophisticated scheduling.  The
+                `TaskController` gives the `rank` of the worker: workers of
+                a lower rank should be given tasks first.
         """
     
     def pop_worker(id=None):
@@ -658,6 +687,7 @@ class FIFOScheduler(object):
     def __init__(self):
         self.tasks = []
         self.workers = []
+        self.ranks = {} # dict of {workerid:rank}
     
     def _ntasks(self):
         return len(self.tasks)
@@ -677,8 +707,11 @@ class FIFOScheduler(object):
     taskids = property(_taskids, lambda self,_:None)
     workerids = property(_workerids, lambda self,_:None)
     
-    def add_task(self, task, **flags):    
-        self.tasks.append(task)
+    def add_task(self, task, first=False, **flags):
+        if first:
+            self.tasks.insert(0, task)
+        else:
+            self.tasks.append(task)
     
     def pop_task(self, id=None):
         if id is None:
@@ -690,8 +723,9 @@ class FIFOScheduler(object):
                     return self.tasks.pop(i)
             raise IndexError("No task #%i"%id)
     
-    def add_worker(self, worker, **flags):
+    def add_worker(self, worker, rank=0, **flags):
         self.workers.append(worker)
+        self.ranks[worker.workerid] = rank
     
     def pop_worker(self, id=None):
         if id is None:
@@ -704,8 +738,18 @@ class FIFOScheduler(object):
             raise IndexError("No worker #%i"%id)
     
     def schedule(self):
+        # The sort is stable, so workers of a rank keep their order
+        workers = sorted(self.workers,
+                         key=lambda w: self.ranks.get(w.workerid, 0))
         for t in self.tasks:
-            for w in self.workers:
+            # The workers which hold the inputs of a task are tried first
+            affinity = getattr(t, 'affinity', None)
+            if affinity:
+                candidates = sorted(workers,
+                                    key=lambda w: w.workerid not in affinity)
+            else:
+                candidates = workers
+            for w in candidates:
                 try:# do not allow exceptions to break this
                     # Allow the task to check itself using its
                     # check_depend method.
@@ -727,17 +771,78 @@ class LIFOScheduler(FIFOScheduler):
     low load, where starvation does not really matter.
     """
     
-    def add_task(self, task, **flags):
+    def add_task(self, task, first=False, **flags):
         # self.tasks.reverse()
         self.tasks.insert(0, task)
         # self.tasks.reverse()
     
-    def add_worker(self, worker, **flags):
+    def add_worker(self, worker, rank=0, **flags):
         # self.workers.reverse()
         self.workers.insert(0, worker)
+        self.ranks[worker.workerid] = rank
         # self.workers.reverse()
     
 
+class WorkerHealth(object):
+    """Statistics on the tasks run by a worker.
+    
+    The failure rate and the duration of the tasks are moving averages, in
+    which the latest task weighs `decay`.
+    """
+    
+    decay = 0.2
+    
+    def __init__(self):
+        self.completed = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.failure_rate = 0.0
+        self.mean_duration = None # of the tasks which succeeded
+        self.started = None # time the running task started, if any
+    
+    def __repr__(self):
+        return 'WorkerHealth(completed=%r, failed=%r, failure_rate=%.2f, ' \
+            'mean_duration=%r)' % (self.completed, self.failed,
+                                   self.failure_rate, self.mean_duration)
+    
+    def _get_ntasks(self):
+        return self.completed + self.failed
+    
+    ntasks = property(_get_ntasks)
+    
+    def task_started(self):
+        self.started = time.time()
+    
+    def task_done(self, success, duration=None):
+        self.started = None
+        self.failure_rate += self.decay*((not success) - self.failure_rate)
+        if success:
+            self.completed += 1
+            self.consecutive_failures = 0
+            if duration is not None:
+                if self.mean_duration is None:
+                    self.mean_duration = duration
+                else:
+                    self.mean_duration += self.decay*(duration -
+                                                      self.mean_duration)
+        else:
+            self.failed += 1
+            self.consecutive_failures += 1
+    
+    def lag(self, now=None):
+        """The time the running task has been running for, or 0."""
+        if self.started is None:
+            return 0
+        return (now or time.time()) - self.started
+
+
+def median(values):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[len(values)//2]
+
+
 class ITaskController(cs.IControllerBase):
     """
     The Task based interface to a `ControllerService` object
@@ -755,19 +860,25 @@ class ITaskController(cs.IControllerBase):
         :Returns: the integer ID of the task
         """
     
-    def get_task_result(taskid, block=False):
+    def get_task_result(taskid, block=False, forget=False):
         """
         Get the result of a task by its ID.
         
         :Parameters:
             taskid : int
                 the id of the task whose result is requested
+            block : boolean
+                wait for the task to be done
+            forget : boolean
+                drop the result once it is returned, for clients which need
+                it only once
         
         :Returns: `Deferred` to the task result if the task is done, and None
             if not.
         
         :Exceptions:
-            actualResult will be an `IndexError` if no such task has been submitted
+            actualResult will be an `IndexError` if no such task has been
+            submitted, or if its result is no longer kept
         """
     
     def abort(taskid):
@@ -823,13 +934,51 @@ class TaskController(cs.ControllerAdapterBase):
     
     If you want to use a different scheduler, just subclass this and set
     the `SchedulerClass` member to the *class* of your chosen scheduler.
+    The results are kept by an instance of `ResultStoreClass`, created with
+    the keyword arguments in `result_store_args`.
+    
+    The controller keeps the `WorkerHealth` of each worker.  Workers which
+    are slow or fail often compared to their peers are given tasks last, a
+    worker which failed is kept out for longer after each failure, and one
+    which fails much more often than its peers is quarantined.  With
+    `speculationFactor` set, a task which runs for much longer than usual is
+    run again on an idle worker, and the first result is kept.  This is off
+    by default, as only tasks without side effects can safely run twice.
+    
+    A task with `after` task ids waits until they are all done.  It fails
+    with a `TaskDependencyError` if one of them fails, and otherwise is
+    given first to the worker which ran them.  The variables they pulled are
+    pushed before the task is run, unless it runs right after the task which
+    pulled them on the same worker.
     """
     
     zi.implements(ITaskController)
     SchedulerClass = FIFOScheduler
+    ResultStoreClass = ResultStore
+    result_store_args = {}
     
     timeout = 30
     
+    # A worker which failed a task is readmitted after failurePenalty seconds
+    # (an attribute of the instances), doubled for each further failure in a
+    # row up to maxFailurePenalty.
+    maxFailurePenalty = 60
+    # A worker failing more than quarantineFailureRate of its tasks, and
+    # twice as often as its peers, is kept out for quarantinePenalty seconds
+    # once it ran quarantineTasks tasks.
+    quarantineFailureRate = 0.5
+    quarantineTasks = 5
+    quarantinePenalty = 300
+    # Workers taking slowFactor times longer than the median of their peers
+    # for their tasks are given tasks last.
+    slowFactor = 2.0
+    # A task running speculationFactor times longer than the median task,
+    # and at least minSpeculationTime seconds, is run again on an idle
+    # worker.  0, the default, turns this off: only set it if running a
+    # task twice is harmless, like 3.0 for tasks without side effects.
+    speculationFactor = 0
+    minSpeculationTime = 1.0
+    
     def __init__(self, controller):
         self.controller = controller
         self.controller.on_register_engine_do(self.registerWorker, True)
@@ -839,10 +988,22 @@ class TaskController(cs.ControllerAdapterBase):
                                 # a worker for failing a task
         self.pendingTasks = {} # dict of {workerid:(taskid, task)}
         self.deferredResults = {} # dict of {taskid:deferred}
-        self.finishedResults = {} # dict of {taskid:actualResult}
+        # {taskid:actualResult}
+        self.finishedResults = self.ResultStoreClass(**self.result_store_args)
         self.workers = {} # dict of {workerid:worker}
+        self.health = {} # dict of {workerid:WorkerHealth}
         self.abortPending = [] # dict of {taskid:abortDeferred}
         self.idleLater = None # delayed call object for timeout
+        self.speculateLater = None # delayed call object for stragglers
+        self.waitingTasks = {} # dict of {taskid:task} waiting for others
+        self.dependents = {} # dict of {taskid:[ids of the tasks after it]}
+        # {taskid:{upstream taskid:(result, producer)}} for the waiting and
+        # queued tasks, where producer is (workerid, generation) or None
+        self.inputs = {}
+        # {taskid:(workerid, generation)} of the tasks with dependents
+        self.producers = {}
+        # {workerid:generation}, incremented for each task run on the worker
+        self.generations = {}
         self.scheduler = self.SchedulerClass()
         
         for id in self.controller.engines.keys():
@@ -856,6 +1017,9 @@ class TaskController(cs.ControllerAdapterBase):
             raise ValueError("worker with id %s already exists.  This should not happen." % id)
         self.workers[id] = IWorker(self.controller.engines[id])
         self.workers[id].workerid = id
+        self.health[id] = WorkerHealth()
+        # A new engine may reuse the id of one which is gone
+        self.generations[id] = self.generations.get(id, 0) + 1
         if not self.pendingTasks.has_key(id):# if not working
             self.scheduler.add_worker(self.workers[id])
         self.distributeTasks()
@@ -869,6 +1033,7 @@ class TaskController(cs.ControllerAdapterBase):
             except IndexError:
                 pass
             self.workers.pop(id)
+            self.health.pop(id, None)
     
     def _pendingTaskIDs(self):
         return [t.taskid for t in self.pendingTasks.values()]
@@ -881,35 +1046,71 @@ class TaskController(cs.ControllerAdapterBase):
         """
         Run a task and return `Deferred` to its taskid.
         """
+        after = set(getattr(task, 'after', ()))
+        for upstream in after:
+            if not isinstance(upstream, int) or \
+                    not 0 <= upstream < self.taskid:
+                return defer.fail(IndexError("task ID not registered: %r" %
+                                             upstream))
         task.taskid = self.taskid
         task.start = time.localtime()
         self.taskid += 1
-        d = defer.Deferred()
-        self.scheduler.add_task(task)
-        log.msg('Queuing task: %i' % task.taskid)
-        
         self.deferredResults[task.taskid] = []
-        self.distributeTasks()
+        self.inputs[task.taskid] = {}
+        
+        waiting = False
+        for upstream in sorted(after):
+            if upstream in self.deferredResults:
+                self.dependents.setdefault(upstream, []).append(task.taskid)
+                waiting = True
+            elif upstream in self.finishedResults:
+                result = self.finishedResults[upstream]
+                if result_failed(result):
+                    self._failDependent(task.taskid, upstream)
+                    return defer.succeed(task.taskid)
+                self.inputs[task.taskid][upstream] = (result, None)
+            else:
+                self._failDependent(task.taskid, upstream,
+                                    "is no longer kept")
+                return defer.succeed(task.taskid)
+        if waiting:
+            log.msg('Task %i waits for tasks %r' % (task.taskid,
+                                                   sorted(after)))
+            self.waitingTasks[task.taskid] = task
+        else:
+            self.queueTask(task)
+            self.distributeTasks()
         return defer.succeed(task.taskid)
     
-    def get_task_result(self, taskid, block=False):
+    def get_task_result(self, taskid, block=False, forget=False):
         """
         Returns a `Deferred` to the task result, or None.
         """
         log.msg("Getting task result: %i" % taskid)
-        if self.finishedResults.has_key(taskid):
-            tr = self.finishedResults[taskid]
+        if taskid in self.finishedResults:
+            if forget:
+                tr = self.finishedResults.pop(taskid)
+            else:
+                tr = self.finishedResults[taskid]
             return defer.succeed(tr)
         elif self.deferredResults.has_key(taskid):
             if block:
                 d = defer.Deferred()
                 self.deferredResults[taskid].append(d)
+                if forget:
+                    d.addBoth(self._forget, taskid)
                 return d
             else:
                 return defer.succeed(None)
+        elif isinstance(taskid, int) and 0 <= taskid < self.taskid:
+            return defer.fail(IndexError("task result no longer kept: %r" % taskid))
         else:
             return defer.fail(IndexError("task ID not registered: %r" % taskid))
     
+    def _forget(self, result, taskid):
+        self.finishedResults.pop(taskid)
+        return result
+    
     def abort(self, taskid):
         """
         Remove a task from the queue if it has not been run already.
@@ -919,10 +1120,13 @@ class TaskController(cs.ControllerAdapterBase):
         try:
             self.scheduler.pop_task(taskid)
         except IndexError, e:
-            if taskid in self.finishedResults.keys():
+            if taskid in self.finishedResults:
                 d = defer.fail(IndexError("Task Already Completed"))
             elif taskid in self.abortPending:
                 d = defer.fail(IndexError("Task Already Aborted"))
+            elif taskid in self.waitingTasks:
+                self.waitingTasks.pop(taskid)
+                d = defer.execute(self._doAbort, taskid)
             elif taskid in self._pendingTaskIDs():# task is pending
                 self.abortPending.append(taskid)
                 d = defer.succeed(None)
@@ -948,23 +1152,24 @@ class TaskController(cs.ControllerAdapterBase):
         return defer.succeed(self.distributeTasks())
     
     def queue_status(self, verbose=False):
-        pending = self._pendingTaskIDs()
+        # Tasks with a copy running are pending once
+        pending = sorted(set(self._pendingTaskIDs()))
         failed = []
         succeeded = []
-        for k,v in self.finishedResults.iteritems():
-            if not isinstance(v, failure.Failure):
-                if hasattr(v,'failure'):
-                    if v.failure is None:
-                        succeeded.append(k)
-                    else:
-                        failed.append(k)
+        for k, taskFailed in self.finishedResults.statuses():
+            if taskFailed is False:
+                succeeded.append(k)
+            elif taskFailed:
+                failed.append(k)
         scheduled = self.scheduler.taskids
+        waiting = sorted(self.waitingTasks)
         if verbose:
             result = dict(pending=pending, failed=failed, 
-                succeeded=succeeded, scheduled=scheduled)
+                succeeded=succeeded, scheduled=scheduled, waiting=waiting)
         else:
             result = dict(pending=len(pending),failed=len(failed),
-                succeeded=len(succeeded),scheduled=len(scheduled))
+                succeeded=len(succeeded),scheduled=len(scheduled),
+                waiting=len(waiting))
         return defer.succeed(result)
     
     #---------------------------------------------------------------------------
@@ -985,8 +1190,71 @@ class TaskController(cs.ControllerAdapterBase):
         dlist = self.deferredResults.pop(taskid)
         # result.taskid = taskid   # The TaskResult should save the taskid
         self.finishedResults[taskid] = result
+        self.inputs.pop(taskid, None)
         for d in dlist:
             d.callback(result)
+        self._releaseDependents(taskid, result)
+    
+    #---------------------------------------------------------------------------
+    # Task dependencies
+    #---------------------------------------------------------------------------
+    
+    def queueTask(self, task, first=False):
+        """Add a task whose upstream tasks are done to the scheduler."""
+        task.affinity = set(producer[0] for result, producer
+                            in self.inputs[task.taskid].itervalues()
+                            if producer is not None)
+        self.scheduler.add_task(task, first=first)
+        log.msg('Queuing task: %i' % task.taskid)
+    
+    def _failDependent(self, taskid, upstream, why="failed"):
+        log.msg("Task %i not run, as task %i %s" % (taskid, upstream, why))
+        self.waitingTasks.pop(taskid, None)
+        msg = "task %i was not run, as task %i %s" % (taskid, upstream, why)
+        self._finishTask(taskid, failure.Failure(
+            error.TaskDependencyError(msg)))
+    
+    def _releaseDependents(self, taskid, result):
+        """Queue the tasks waiting for no other task than taskid."""
+        producer = self.producers.pop(taskid, None)
+        released = False
+        for id in self.dependents.pop(taskid, []):
+            task = self.waitingTasks.get(id)
+            if task is None: # failed or aborted already
+                continue
+            if result_failed(result):
+                self._failDependent(id, taskid)
+                continue
+            self.inputs[id][taskid] = (result, producer)
+            if len(self.inputs[id]) == len(set(task.after)):
+                self.waitingTasks.pop(id)
+                # Its inputs are fresh on the worker which is readmitted
+                # right after this, so it goes first
+                self.queueTask(task, first=True)
+                released = True
+        if released and (producer is None or producer[0] not in self.workers):
+            self.distributeTasks()
+    
+    def upstreamNamespace(self, task, workerid):
+        """The variables of the upstream tasks to push to a worker.
+        
+        Those pulled by the last task run on that worker are left out,
+        unless this task resets the namespace first.  Any other task may
+        have changed them.  Changes through the multiengine interface are
+        not seen.
+        """
+        ns = {}
+        inputs = self.inputs.get(task.taskid, {})
+        for upstream in sorted(inputs):
+            result, producer = inputs[upstream]
+            if not isinstance(result, TaskResult) or \
+                    result.failure is not None:
+                continue
+            if producer == (workerid, self.generations.get(workerid, 0)) \
+                    and not task.clear_before:
+                continue
+            ns.update(result.results)
+        return ns
     
     def distributeTasks(self):
         """
@@ -999,21 +1267,86 @@ class TaskController(cs.ControllerAdapterBase):
                 self.idleLater = None
             else:
                 self.checkIdle()
+            self.checkStragglers()
             return False
         # else something to do:
         while worker and task:
-            # get worker and task
-            # add to pending
-            self.pendingTasks[worker.workerid] = task
-            # run/link callbacks
-            d = worker.run(task)
-            log.msg("Running task %i on worker %i" %(task.taskid, worker.workerid))
-            d.addBoth(self.taskCompleted, task.taskid, worker.workerid)
+            self.runTask(worker, task)
             worker, task = self.scheduler.schedule()
         # check for idle timeout:
         self.checkIdle()
+        self.checkStragglers()
         return True
     
+    def runTask(self, worker, task):
+        """Run a task on a worker taken from the scheduler."""
+        # add to pending
+        self.pendingTasks[worker.workerid] = task
+        if worker.workerid in self.health:
+            self.health[worker.workerid].task_started()
+        if getattr(task, 'after', None):
+            task.upstream_ns = self.upstreamNamespace(task, worker.workerid)
+        self.generations[worker.workerid] = \
+            self.generations.get(worker.workerid, 0) + 1
+        # run/link callbacks
+        d = worker.run(task)
+        log.msg("Running task %i on worker %i" %(task.taskid, worker.workerid))
+        d.addBoth(self.taskCompleted, task.taskid, worker.workerid)
+    
+    def checkStragglers(self):
+        """Run a copy of the tasks which are late on idle workers.
+        
+        A task is late after `speculationFactor` times the median duration of
+        the tasks, and at least `minSpeculationTime` seconds.  This checks
+        again when the next running task is due, if there are idle workers.
+        """
+        if self.speculateLater and not self.speculateLater.called:
+            self.speculateLater.cancel()
+        self.speculateLater = None
+        typical = median([h.mean_duration for h in self.health.itervalues()
+                          if h.mean_duration is not None])
+        if not self.speculationFactor or typical is None or \
+                self.scheduler.ntasks:
+            return
+        late = max(self.speculationFactor*typical, self.minSpeculationTime)
+        copies = {}
+        for workerid, task in self.pendingTasks.iteritems():
+            copies.setdefault(task.taskid, []).append(workerid)
+        now = time.time()
+        nextDue = None
+        for workerid, task in self.pendingTasks.items():
+            health = self.health.get(workerid)
+            if len(copies[task.taskid]) > 1 or health is None or \
+                    health.started is None or \
+                    task.taskid in self.abortPending or \
+                    task.taskid not in self.deferredResults:
+                continue
+            due = health.started + late
+            if due > now:
+                nextDue = min(nextDue or due, due)
+            elif self.scheduler.nworkers:
+                self.speculate(task, workerid)
+        if nextDue is not None and self.scheduler.nworkers:
+            self.speculateLater = reactor.callLater(nextDue - now,
+                                                    self.checkStragglers)
+    
+    def speculate(self, task, workerid):
+        """Run a copy of a task late on a worker on an idle worker."""
+        for id in sorted(self.scheduler.workerids, key=self.workerRank):
+            if id == workerid:
+                continue
+            worker = self.workers[id]
+            try:
+                cando = task.check_depend(worker.properties)
+            except:
+                cando = False
+            if cando:
+                log.msg("Task %i is late on worker %i, running a copy" %
+                        (task.taskid, workerid))
+                self.runTask(self.scheduler.pop_worker(id), copy.copy(task))
+                return True
+        return False
+    
     def checkIdle(self):
         if self.idleLater and not self.idleLater.called:
             self.idleLater.cancel()
@@ -1046,6 +1379,22 @@ class TaskController(cs.ControllerAdapterBase):
             log.msg("Result: %r"%result)
             log.msg("Pending tasks: %s"%self.pendingTasks)
             return
+        if workerid in self.health:
+            self.health[workerid].task_done(success,
+                                            getattr(task, 'duration', None))
+        
+        # Copies of a task: the first result is kept, and a failure is only
+        # kept if no other copy is running
+        if taskid not in self.deferredResults:
+            log.msg("Discarding the result of task %i from worker %i, which "
+                    "is already done" % (taskid, workerid))
+            self.readmitAfterTask(workerid, success)
+            return
+        if not success and taskid in self._pendingTaskIDs():
+            log.msg("Task %i failed on worker %i, waiting for its copy" %
+                    (taskid, workerid))
+            self.readmitAfterTask(workerid, success)
+            return
         
         # Check if aborted while pending
         aborted = False
@@ -1074,18 +1423,75 @@ class TaskController(cs.ControllerAdapterBase):
                     self.distributeTasks()
                 else: # done trying
                     self._finishTask(taskid, result)
-                # wait a second before readmitting a worker that failed
-                # it may have died, and not yet been unregistered
-                reactor.callLater(self.failurePenalty, self.readmitWorker, workerid)
+                self.readmitAfterTask(workerid, success)
             else: # we succeeded
                 log.msg("Task completed: %i"% taskid)
+                if taskid in self.dependents and not task.clear_after:
+                    self.producers[taskid] = (workerid,
+                                              self.generations.get(workerid, 0))
                 self._finishTask(taskid, result)
-                self.readmitWorker(workerid)
+                self.readmitAfterTask(workerid, success)
         else: # we aborted the task
-            if not success:
-                reactor.callLater(self.failurePenalty, self.readmitWorker, workerid)
-            else:
-                self.readmitWorker(workerid)
+            self.readmitAfterTask(workerid, success)
+    
+    def readmitAfterTask(self, workerid, success):
+        """Readmit a worker, after its penalty if its task failed."""
+        if success:
+            self.readmitWorker(workerid)
+        else:
+            # wait before readmitting a worker that failed
+            # it may have died, and not yet been unregistered
+            reactor.callLater(self.failureDelay(workerid), self.readmitWorker,
+                              workerid)
+    
+    #---------------------------------------------------------------------------
+    # Worker health
+    #---------------------------------------------------------------------------
+    
+    def _peers(self, workerid):
+        return [h for id, h in self.health.iteritems()
+                if id != workerid and h.ntasks]
+    
+    def failsMoreThanPeers(self, workerid, rate):
+        """Does the worker fail `rate` of its tasks, twice its peers' rate."""
+        health = self.health.get(workerid)
+        peers = self._peers(workerid)
+        if health is None or health.ntasks < self.quarantineTasks or \
+                health.failure_rate < rate or not peers:
+            return False
+        peerRate = sum(h.failure_rate for h in peers)/len(peers)
+        return health.failure_rate >= 2*peerRate
+    
+    def isSlow(self, workerid):
+        """Is the worker slowFactor times slower than the median peer."""
+        health = self.health.get(workerid)
+        if health is None or health.mean_duration is None:
+            return False
+        peer = median([h.mean_duration for h in self._peers(workerid)
+                       if h.mean_duration is not None])
+        return peer is not None and \
+            health.mean_duration > self.slowFactor*peer
+    
+    def workerRank(self, workerid):
+        """0 for a healthy worker, 1 for a slow or unreliable one."""
+        if self.isSlow(workerid) or \
+                self.failsMoreThanPeers(workerid, self.quarantineFailureRate/2):
+            return 1
+        return 0
+    
+    def failureDelay(self, workerid):
+        """The time to wait before readmitting a worker which failed."""
+        if not self.failurePenalty:
+            return 0
+        if self.failsMoreThanPeers(workerid, self.quarantineFailureRate):
+            log.msg("Quarantining worker %i for %s seconds: %r" % (workerid,
+                    self.quarantinePenalty, self.health[workerid]))
+            return self.quarantinePenalty
+        failures = 1
+        if workerid in self.health:
+            failures = max(self.health[workerid].consecutive_failures, 1)
+        return min(self.failurePenalty*2**(failures-1),
+                   self.maxFailurePenalty)
     
     def readmitWorker(self, workerid):
         """
@@ -1096,7 +1502,8 @@ class TaskController(cs.ControllerAdapterBase):
         """
         
         if workerid in self.workers.keys() and workerid not in self.pendingTasks.keys():
-            self.scheduler.add_worker(self.workers[workerid])
+            self.scheduler.add_worker(self.workers[workerid],
+                                      rank=self.workerRank(workerid))
             self.distributeTasks()
     
     def clear(self):
@@ -1108,7 +1515,7 @@ class TaskController(cs.ControllerAdapterBase):
         tasks.  Users should call this periodically to clean out these
         cached task results.
         """
-        self.finishedResults = {}
+        self.finishedResults.clear()
         return defer.succeed(None)
         
     
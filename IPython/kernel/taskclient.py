@@ -95,7 +95,7 @@ class BlockingTaskClient(object):
         else:
             return tid
     
-    def get_task_result(self, taskid, block=False):
+    def get_task_result(self, taskid, block=False, forget=False):
         """
         Get a task result by taskid.
         
@@ -104,11 +104,15 @@ class BlockingTaskClient(object):
                 The taskid of the task to be retrieved.
             block : boolean
                 Should I block until the task is done?
+            forget : boolean
+                Should the controller drop the result once it is returned?
+                Results which are not needed again should be forgotten, so
+                that the controller doesn't keep them.
         
         :Returns: A `TaskResult` object that encapsulates the task result.
         """
         return self._bcft(self.task_controller.get_task_result,
-            taskid, block)
+            taskid, block, forget)
     
     def abort(self, taskid):
         """
@@ -60,7 +60,7 @@ class IFCTaskController(Interface):
     def remote_abort(taskid):
         """"""
         
-    def remote_get_task_result(taskid, block=False):
+    def remote_get_task_result(taskid, block=False, forget=False):
         """"""
         
     def remote_barrier(taskids):
@@ -123,8 +123,8 @@ class FCTaskControllerFromTaskController(Referenceable):
         d.addErrback(self.packageFailure)
         return d
     
-    def remote_get_task_result(self, taskid, block=False):
-        d = self.taskController.get_task_result(taskid, block)
+    def remote_get_task_result(self, taskid, block=False, forget=False):
+        d = self.taskController.get_task_result(taskid, block, forget)
         d.addCallback(self.packageSuccess)
         d.addErrback(self.packageFailure)
         return d
@@ -213,7 +213,7 @@ class FCTaskClient(object):
         d.addCallback(self.unpackage)
         return d
     
-    def get_task_result(self, taskid, block=False):
+    def get_task_result(self, taskid, block=False, forget=False):
         """
         Get a task result by taskid.
         
@@ -222,10 +222,13 @@ class FCTaskClient(object):
                 The taskid of the task to be retrieved.
             block : boolean
                 Should I block until the task is done?
+            forget : boolean
+                Should the controller drop the result once it is returned?
         
         :Returns: A `TaskResult` object that encapsulates the task result.
         """
-        d = self.remote_reference.callRemote('get_task_result', taskid, block)
+        d = self.remote_reference.callRemote('get_task_result', taskid, block,
+                                             forget)
         d.addCallback(self.unpackage)
         return d 
     
@@ -307,7 +307,8 @@ class IEngineQueuedTestCase(object):
         result = self.engine.clear_queue()
         d1 = self.assertDeferredEquals(result, None)
         d1.addCallback(lambda _: self.engine.queue_status())
-        d2 = self.assertDeferredEquals(d1, {'queue':[], 'pending':'None'})
+        d1.addCallback(lambda r: (r['queue'], r['pending']))
+        d2 = self.assertDeferredEquals(d1, ([], 'None'))
         return d2
         
     def testQueueStatus(self):
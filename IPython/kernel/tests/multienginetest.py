@@ -698,6 +698,15 @@ class IMultiEngineCoordinatorTestCase(object):
         d.addErrback(lambda f: self.assertRaises(NameError, _raise_it, f))
         return d
 
+    def testScatterGatherRoundRobin(self):
+        self.addEngine(4)
+        d= self.multiengine.scatter('a', range(14), dist='r')
+        d.addCallback(lambda r: self.multiengine.pull('a', targets=1))
+        d.addCallback(lambda r: self.assertEquals(r, [[1, 5, 9, 13]]))
+        d.addCallback(lambda r: self.multiengine.gather('a', dist='r'))
+        d.addCallback(lambda r: self.assertEquals(r, range(14)))
+        return d
+
     def testScatterGatherNumpy(self):
         try:
             import numpy
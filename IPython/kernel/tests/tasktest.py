@@ -186,6 +186,41 @@ class ITaskControllerTestCase(TaskTestBase):
         d.addErrback(lambda f: self.assertRaises(IndexError, f.raiseException))
         return d
 
+    def test_forget(self):
+        self.addEngine(1)
+        d = self.tc.run(task.StringTask('a=5', pull='a'))
+        d.addCallback(lambda tid: self.tc.get_task_result(tid, block=True,
+                                                          forget=True))
+        d.addCallback(lambda r: self.assertEquals(r.ns.a, 5))
+        d.addCallback(lambda _: self.tc.get_task_result(0))
+        d.addErrback(lambda f: self.assertRaises(IndexError, f.raiseException))
+        return d
+
+    def test_after(self):
+        self.addEngine(2)
+        d = self.tc.run(task.StringTask('a = 5', pull='a', clear_after=True))
+        d.addCallback(lambda tid: self.tc.run(task.StringTask('b = 2*a',
+                                                  pull='b', after=tid)))
+        d.addCallback(self.tc.get_task_result, block=True)
+        d.addCallback(lambda tr: self.assertEquals(tr.ns.b, 10))
+        d.addCallback(lambda _: self.tc.run(task.StringTask('1/0')))
+        d.addCallback(lambda tid: self.tc.run(task.StringTask('pass',
+                                                              after=tid)))
+        d.addCallback(self.tc.get_task_result, block=True)
+        d.addErrback(lambda f: self.assertRaises(error.TaskDependencyError,
+                                                 f.raiseException))
+        return d
+
+    def test_after_intervening_task(self):
+        self.addEngine(1)
+        d = self.tc.run(task.StringTask('x = 10', pull='x'))
+        d.addCallback(lambda a: self.tc.run(task.StringTask('x = 99')))
+        d.addCallback(lambda c: self.tc.run(task.StringTask('y = x**2',
+                                                  pull='y', after=[0, c])))
+        d.addCallback(self.tc.get_task_result, block=True)
+        d.addCallback(lambda tr: self.assertEquals(tr.ns.y, 100))
+        return d
+
     def get_traceback_frames(self, result):
         """Execute a failing string as a task and return stack frame strings.
 
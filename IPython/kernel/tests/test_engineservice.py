@@ -27,9 +27,10 @@ __docformat__ = "restructuredtext en"
 __test__ = {}
 
 from twisted.internet import defer
+from twisted.python import failure
 from twisted.application.service import IService
 
-from IPython.kernel import engineservice as es
+from IPython.kernel import engineservice as es, error
 from IPython.testing.util import DeferredTestCase
 from IPython.kernel.tests.engineservicetest import \
     IEngineCoreTestCase, \
@@ -77,3 +78,111 @@ class QueuedEngineServiceTest(DeferredTestCase,
         return self.rawEngine.stopService()
 
 
+
+class DelayedEngineService(es.EngineService):
+    """An engine whose execute results are given by the test."""
+
+    def __init__(self):
+        es.EngineService.__init__(self)
+        self.calls = []
+
+    def execute(self, lines):
+        d = defer.Deferred()
+        self.calls.append((lines, d))
+        return d
+
+
+class QueuedEnginePipelineTest(DeferredTestCase):
+
+    def setUp(self):
+        self.rawEngine = DelayedEngineService()
+        self.engine = es.QueuedEngine(self.rawEngine, window=2)
+        self.results = []
+
+    def execute(self, lines):
+        d = self.engine.execute(lines)
+        d.addBoth(self.results.append)
+
+    def status(self):
+        return self.engine.queue_status().result
+
+    def testWindow(self):
+        for lines in ['a', 'b', 'c']:
+            self.execute(lines)
+        self.assertEquals([c[0] for c in self.rawEngine.calls], ['a', 'b'])
+        self.assertEquals(self.status()['queue'], ["execute('c')"])
+        self.assertEquals(self.status()['pending'], "execute('a')")
+        # Results are handed back in the order of the commands
+        self.rawEngine.calls[1][1].callback({'number':1})
+        self.assertEquals(self.results, [])
+        self.rawEngine.calls[0][1].callback({'number':0})
+        self.assertEquals(self.results, [{'number':0}, {'number':1}])
+        self.assertEquals([c[0] for c in self.rawEngine.calls], ['a', 'b', 'c'])
+        status = self.status()
+        self.assertEquals((status['submitted'], status['completed']), (3, 2))
+        self.assertEquals(status['inflight'], ["execute('c')"])
+
+    def testFailure(self):
+        for lines in ['a', 'b', 'c']:
+            self.execute(lines)
+        self.rawEngine.calls[0][1].errback(failure.Failure(ValueError()))
+        # The commands not sent yet are cleared first, the others still run
+        self.assert_(self.results[0].check(error.QueueCleared))
+        self.assert_(self.results[1].check(ValueError))
+        self.rawEngine.calls[1][1].callback({'number':1})
+        self.assertEquals(self.results[2], {'number':1})
+        status = self.status()
+        self.assertEquals((status['failed'], status['cleared']), (1, 1))
+        self.assertEquals(status['pending'], 'None')
+
+    def testHistory(self):
+        self.engine.history_size = 2
+        self.engine.history_bytes = 100
+        for i in range(3):
+            self.engine.saveResult({'number':i})
+        self.assertEquals(sorted(self.engine.history), [1, 2])
+        self.engine.saveResult({'number':3, 'stdout':'x' * 100})
+        self.assertEquals(sorted(self.engine.history), [3])
+        self.assertEquals(self.status()['evicted'], 3)
+        d = self.engine.get_result(3)
+        return self.assertDeferredEquals(d, self.engine.history[3])
+
+
+class EngineServiceSnapshotTest(DeferredTestCase):
+
+    def setUp(self):
+        self.engine = es.EngineService(preload=['os.path', 'math as m'])
+        self.engine.startService()
+
+    def tearDown(self):
+        return self.engine.stopService()
+
+    def testPreload(self):
+        d = self.engine.reset()
+        d.addCallback(lambda _: self.engine.execute('r = m.sqrt(4), os.sep'))
+        d.addCallback(lambda _: self.engine.pull('r'))
+        import os
+        return self.assertDeferredEquals(d, (2.0, os.sep))
+
+    def testBadPreload(self):
+        self.assertRaises(ValueError, es.EngineService, preload=['import m'])
+        self.assertRaises(ImportError, es.EngineService,
+                          preload=['not_a_module'])
+
+    def testSnapshot(self):
+        d = self.engine.push(dict(a=[1, 2], b=10))
+        d.addCallback(lambda _: self.engine.execute(
+            "saved = snapshots.save('s'); a.append(3)"))
+        d.addCallback(lambda _: self.engine.pull('saved'))
+        d.addCallback(lambda saved: self.assertEquals(saved, ['a', 'b']))
+        d.addCallback(lambda _: self.engine.reset())
+        # A restored value can change without changing the snapshot
+        d.addCallback(lambda _: self.engine.execute(
+            "snapshots.restore('s'); a.append(4)"))
+        d.addCallback(lambda _: self.engine.execute(
+            "snapshots.restore('s', 'a')"))
+        d.addCallback(lambda _: self.engine.pull(('a', 'b')))
+        d.addCallback(lambda r: self.assertEquals(r, [[1, 2], 10]))
+        d.addCallback(lambda _: self.engine.snapshots.drop('s'))
+        d.addCallback(lambda _: self.engine.execute("snapshots.restore('s')"))
+        return self.assertDeferredRaises(d, KeyError)
@@ -0,0 +1,135 @@
+# encoding: utf-8
+
+"""Tests for launcher.py"""
+
+__docformat__ = "restructuredtext en"
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2008  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Tell nose to skip this module
+__test__ = {}
+
+import sys
+import time
+
+from twisted.internet import defer
+from twisted.trial import unittest
+
+from IPython.config.loader import Config
+from IPython.kernel.launcher import LocalEngineSetLauncher
+from IPython.kernel.twistedutil import gatherBoth
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+class FakeEngineSetLauncher(LocalEngineSetLauncher):
+    """Engines which register when the count is polled after their launch.
+
+    The count returned by a poll is the one of the previous poll.
+    """
+
+    existing = 0
+    fail = False
+
+    def count_registered(self):
+        self.polls += 1
+        if self.fail:
+            return defer.fail(Exception('no controller'))
+        count, self.next_count = self.next_count, len(self.launchers)
+        return defer.succeed(self.existing + count)
+
+    def _launch_engine(self):
+        self.launch_times.append(time.time())
+        LocalEngineSetLauncher._launch_engine(self)
+
+
+class LocalEngineSetLauncherTest(unittest.TestCase):
+
+    def setUp(self):
+        config = Config()
+        config.LocalEngineLauncher.engine_cmd = [
+            sys.executable, '-c', 'import time; time.sleep(30)']
+        self.launcher = FakeEngineSetLauncher(work_dir=u'.', config=config)
+        self.launcher.poll_interval = 0.01
+        self.launcher.polls = 0
+        self.launcher.launch_times = []
+        self.launcher.next_count = 0
+
+    def tearDown(self):
+        return gatherBoth([self.launcher.observe_stop(),
+                           self.launcher.interrupt_then_kill(0.1)])
+
+    def testConcurrency(self):
+        self.launcher.concurrency = 2
+        d = self.launcher.start(5, u'.')
+        self.assertEquals(len(self.launcher.launchers), 2)
+        d.addCallback(lambda pids: self.assertEquals(len(pids), 5))
+        d.addCallback(lambda _: self.assert_(self.launcher.polls >= 2))
+        return d
+
+    def testStagger(self):
+        self.launcher.stagger = 0.05
+        d = self.launcher.start(3, u'.')
+        self.assertEquals(len(self.launcher.launchers), 1)
+        d.addCallback(lambda pids: self.assertEquals(len(pids), 3))
+        return d
+
+    def testObserveReady(self):
+        d = self.launcher.start(3, u'.')
+        d.addCallback(lambda _: self.launcher.observe_ready())
+        d.addCallback(self.assertEquals, 3)
+        d.addCallback(lambda _: self.launcher.observe_ready(2))
+        d.addCallback(self.assertEquals, 3)
+        return d
+
+    def testStaggerWhileObserving(self):
+        self.launcher.stagger = 0.1
+        d = self.launcher.start(3, u'.')
+        self.launcher.observe_ready()
+        def check(_):
+            times = self.launcher.launch_times
+            for t1, t2 in zip(times, times[1:]):
+                self.assert_(t2 - t1 >= 0.09, times)
+        d.addCallback(check)
+        return d
+
+    def testExistingEngines(self):
+        self.launcher.existing = 4
+        self.launcher.concurrency = 1
+        d = self.launcher.start(3, u'.')
+        d.addCallback(lambda _: self.launcher.observe_ready())
+        d.addCallback(self.assertEquals, 3)
+        d.addCallback(lambda _: self.assert_(self.launcher.polls >= 3))
+        return d
+
+    def testNoCountWithoutObserver(self):
+        d = self.launcher.start(3, u'.')
+        d.addCallback(lambda _: self.assertEquals(self.launcher.polls, 0))
+        return d
+
+    def testObserveReadyExisting(self):
+        self.launcher.existing = 4
+        d = self.launcher.start(3, u'.')
+        d.addCallback(lambda _: self.launcher.observe_ready())
+        d.addCallback(self.assertEquals, 3)
+        return d
+
+    def testPollError(self):
+        self.launcher.fail = True
+        self.launcher.concurrency = 2
+        d = self.launcher.start(5, u'.')
+        d.addCallback(lambda pids: self.assertEquals(len(pids), 5))
+        # The configured concurrency is left alone
+        d.addCallback(lambda _: self.assertEquals(self.launcher.concurrency,
+                                                  2))
+        return d
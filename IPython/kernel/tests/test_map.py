@@ -0,0 +1,86 @@
+# encoding: utf-8
+
+"""Tests for map.py"""
+
+__docformat__ = "restructuredtext en"
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Tell nose to skip this module
+__test__ = {}
+
+from twisted.trial import unittest
+
+from IPython.kernel import map as Map
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+class MapTestCase(unittest.TestCase):
+
+    def test_block(self):
+        m = Map.Map()
+        parts = m.getPartitions(range(10), 4)
+        self.assertEquals(parts, [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]])
+        self.assertEquals([m.getPartition(range(10), p, 4) for p in range(4)],
+                          parts)
+        self.assertEquals(m.joinPartitions(parts), range(10))
+        self.assertEquals(m.getPartitions(range(2), 3), [[0], [1], []])
+        self.assertEquals(m.joinPartitions([(0, 1), (2,)]), [0, 1, 2])
+        self.assertEquals(m.joinPartitions([1, 2]), [1, 2])
+
+    def test_weighted(self):
+        m = Map.WeightedMap([1, 2, 1])
+        parts = m.getPartitions(range(8), 3)
+        self.assertEquals(parts, [[0, 1], [2, 3, 4, 5], [6, 7]])
+        self.assertEquals(m.joinPartitions(parts), range(8))
+        self.assertRaises(ValueError, m.getPartitions, range(8), 2)
+        self.assertRaises(ValueError, Map.WeightedMap, [0, 0])
+
+    def test_block_cyclic(self):
+        m = Map.BlockCyclicMap()
+        parts = m.getPartitions(range(7), 3)
+        self.assertEquals(parts, [[0, 3, 6], [1, 4], [2, 5]])
+        self.assertEquals(m.joinPartitions(parts), range(7))
+        m = Map.BlockCyclicMap(2)
+        parts = m.getPartitions(range(11), 3)
+        self.assertEquals(parts, [[0, 1, 6, 7], [2, 3, 8, 9], [4, 5, 10]])
+        self.assertEquals(m.joinPartitions(parts), range(11))
+        self.assertEquals(m.getPartitions('abcdefg', 2), ['abef', 'cdg'])
+
+    def test_get_map(self):
+        self.failUnless(isinstance(Map.get_map('b'), Map.Map))
+        self.failUnless(isinstance(Map.get_map('r'), Map.BlockCyclicMap))
+        m = Map.WeightedMap([1])
+        self.failUnless(Map.get_map(m) is m)
+        self.assertRaises(ValueError, Map.get_map, 'x')
+
+    def test_arrays(self):
+        a = numpy.arange(20.0).reshape(10, 2)
+        m = Map.Map()
+        parts = m.getPartitions(a, 3)
+        # The partitions are views
+        self.failUnless(all(numpy.may_share_memory(part, a)
+                            for part in parts))
+        self.failUnless((m.joinPartitions(parts) == a).all())
+        for m in [Map.BlockCyclicMap(), Map.BlockCyclicMap(3)]:
+            parts = m.getPartitions(a, 3)
+            self.failUnless((m.joinPartitions(parts) == a).all())
+
+    if numpy is None:
+        test_arrays.skip = 'numpy is not installed'
@@ -21,7 +21,9 @@ __test__ = {}
 from twisted.internet import defer
 from IPython.testing.util import DeferredTestCase
 from IPython.kernel.controllerservice import ControllerService
+from IPython.kernel import engineservice as es
 from IPython.kernel import multiengine as me
+from IPython.kernel.pickleutil import Pickled
 from IPython.kernel.tests.multienginetest import (IMultiEngineTestCase,
     ISynchronousMultiEngineTestCase)
 
@@ -53,3 +55,41 @@ class SynchronousMultiEngineTestCase(DeferredTestCase, ISynchronousMultiEngineTe
         for e in self.engines:
             e.stopService()
 
+
+
+class RecordingEngineService(es.EngineService):
+    """An engine which keeps the namespaces pushed to it."""
+
+    def push(self, namespace):
+        self.pushed = namespace
+        return es.EngineService.push(self, namespace)
+
+
+class BroadcastTestCase(DeferredTestCase):
+
+    def setUp(self):
+        self.controller = ControllerService()
+        self.controller.startService()
+        self.multiengine = me.IMultiEngine(self.controller)
+        self.engines = []
+        for i in range(3):
+            e = RecordingEngineService()
+            e.startService()
+            regDict = self.controller.register_engine(es.QueuedEngine(e), None)
+            e.id = regDict['id']
+            self.engines.append(e)
+
+    def tearDown(self):
+        self.controller.stopService()
+        for e in self.engines:
+            e.stopService()
+
+    def testPushSharesPickle(self):
+        d = self.multiengine.push(dict(a=range(10)))
+        def check(r):
+            pushed = [e.pushed for e in self.engines]
+            self.assert_(isinstance(pushed[0], Pickled))
+            self.assert_(pushed[1] is pushed[0] and pushed[2] is pushed[0])
+        d.addCallback(check)
+        d.addCallback(lambda _: self.multiengine.pull('a'))
+        return self.assertDeferredEquals(d, [range(10)] * 3)
@@ -31,6 +31,7 @@ from IPython.kernel.clientconnector import AsyncClientConnector
 from IPython.kernel.parallelfunction import ParallelFunction
 from IPython.kernel.error import CompositeError
 from IPython.kernel.util import printer
+from IPython.kernel import sharedmem
 
 
 def _raise_it(f):
@@ -144,3 +145,30 @@ class FullSynchronousMultiEngineTestCase(
         d.addBoth(lambda f: self.assertRaises(ZeroDivisionError, _raise_it, f))
         return d
 
+
+    def test_shared_memory(self):
+        self.addEngine(2)
+        for e in self.engines:
+            e.share_threshold = 1000
+        self.multiengine.share_threshold = 1000
+        seq = range(1000)
+        d = self.multiengine.push(dict(a='x' * 1000, b=1))
+        d.addCallback(lambda _: self.multiengine.pull(('a', 'b')))
+        d.addCallback(lambda r: self.assertEquals(r, [['x' * 1000, 1]] * 2))
+        # The engines only send handles
+        d.addCallback(lambda _: self.engines[0].pull('a'))
+        d.addCallback(lambda r: self.assert_(isinstance(r,
+                                                        sharedmem.SharedHandle)))
+        d.addCallback(lambda _: sharedmem._release_all())
+        d.addCallback(lambda _: self.multiengine.scatter('seq', seq))
+        d.addCallback(lambda _: self.multiengine.gather('seq'))
+        d.addCallback(lambda r: self.assertEquals(r, seq))
+        d.addCallback(lambda _: self.multiengine.push(dict(a='y' * 1000),
+                                                     block=False))
+        d.addCallback(lambda did: self.multiengine.get_pending_deferred(did,
+                                                                        True))
+        d.addCallback(lambda _: self.multiengine.pull('a', targets=0))
+        d.addCallback(lambda r: self.assertEquals(r, ['y' * 1000]))
+        # All the shared memory is released once read
+        d.addCallback(lambda _: self.assertEquals(sharedmem._owned, set()))
+        return d
@@ -0,0 +1,63 @@
+# encoding: utf-8
+
+"""Tests for pickleutil.py"""
+
+__docformat__ = "restructuredtext en"
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2008  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Tell nose to skip this module
+__test__ = {}
+
+import cPickle as pickle
+
+from twisted.trial import unittest
+
+from IPython.kernel.pickleutil import (
+    CannedFunction,
+    Pickled,
+    canDict,
+    unpickled
+)
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def f(x):
+    return x
+
+
+class PickledTestCase(unittest.TestCase):
+
+    def testPickleOnce(self):
+        ns = {'a':range(10)}
+        p = Pickled(ns)
+        data = p.getData()
+        self.assertEquals(pickle.loads(data), ns)
+        self.assert_(p.getData() is data)
+        self.assert_(unpickled(p) is ns)
+        self.assert_(unpickled(ns) is ns)
+
+    def testFromData(self):
+        data = pickle.dumps({'a':5}, 2)
+        p = Pickled(data=data)
+        self.assert_(p.getData() is data)
+        self.assertEquals(p.obj, {'a':5})
+
+    def testCan(self):
+        ns = {'f':f}
+        p = Pickled(ns, can=canDict)
+        self.assert_(isinstance(pickle.loads(p.getData())['f'],
+                                CannedFunction))
+        # The object itself isn't canned
+        self.assert_(p.obj['f'] is f)
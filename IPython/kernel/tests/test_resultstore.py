@@ -0,0 +1,90 @@
+# encoding: utf-8
+
+"""Tests for resultstore.py"""
+
+__docformat__ = "restructuredtext en"
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Tell nose to skip this module
+__test__ = {}
+
+import os
+import tempfile
+
+from twisted.python import failure
+from twisted.trial import unittest
+
+from IPython.kernel import error
+from IPython.kernel.resultstore import ResultStore
+from IPython.kernel.task import TaskResult
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+class ResultStoreTestCase(unittest.TestCase):
+
+    def test_lru(self):
+        store = ResultStore(max_results=2)
+        for i in range(3):
+            store[i] = i
+        store[1]
+        store[3] = 3
+        self.assertEquals(sorted(store._results), [1, 3])
+        self.assertEquals(store.dropped, 2)
+        self.failIf(0 in store)
+        self.assertRaises(KeyError, store.__getitem__, 0)
+        self.assertEquals(store.pop(1), 1)
+        self.assertEquals(store.pop(1), None)
+        self.assertEquals(len(store), 1)
+
+    def test_ttl(self):
+        store = ResultStore(ttl=10)
+        store[0] = 0
+        store[1] = 1
+        used, result, tick = store._results[0]
+        store._results[0] = (used - 11, result, tick)
+        self.assertEquals(len(store), 1)
+        self.failUnless(1 in store)
+
+    def test_stale_order(self):
+        store = ResultStore(max_results=10)
+        for i in range(10):
+            store[i] = i
+        for j in range(200):
+            store[0]
+        # The order of use is compacted, and kept
+        self.failUnless(len(store._order) < 150)
+        store[10] = 10
+        self.failIf(1 in store)
+        self.failUnless(0 in store)
+
+    def test_spill(self):
+        fd, filename = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, filename)
+        store = ResultStore(max_results=1, spill_file=filename)
+        aborted = failure.Failure(error.TaskAborted())
+        store[0] = TaskResult({'a': 1}, 0)
+        store[1] = aborted
+        store[2] = TaskResult({'b': 2}, 0)
+        self.assertEquals(store._results.keys(), [2])
+        self.assertEquals(len(store), 3)
+        self.assertEquals(store[0].ns.a, 1)
+        self.failUnless(store[1].check(error.TaskAborted))
+        self.assertEquals(sorted(store.statuses()),
+                          [(0, False), (1, True), (2, False)])
+        self.assertEquals(store.pop(0).ns.a, 1)
+        self.failIf(0 in store)
+        store.clear()
+        self.assertEquals(len(store), 0)
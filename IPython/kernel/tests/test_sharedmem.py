@@ -0,0 +1,103 @@
+# encoding: utf-8
+
+"""Tests for sharedmem.py"""
+
+__docformat__ = "restructuredtext en"
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Tell nose to skip this module
+__test__ = {}
+
+import cPickle as pickle
+import os
+
+from twisted.trial import unittest
+
+from IPython.kernel import sharedmem
+from IPython.kernel.sharedmem import (
+    SharedHandle,
+    SharedList,
+    resolve,
+    share,
+    share_namespace,
+    share_values
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+class SharedMemoryTestCase(unittest.TestCase):
+
+    def tearDown(self):
+        sharedmem._release_all()
+
+    def test_share(self):
+        self.assertEquals(share('x' * 9, 10), 'x' * 9)
+        self.assertEquals(share(range(5), 100), range(5))
+        self.assertEquals(share(dict(a='x' * 10), 10), dict(a='x' * 10))
+        handle = share('x' * 10, 10)
+        self.assert_(isinstance(handle, SharedHandle))
+        # Only the handle is pickled
+        self.assert_(len(pickle.dumps(handle, 2)) < 1000)
+        handle = pickle.loads(pickle.dumps(share(range(1000), 100), 2))
+        self.assertEquals(handle.kind, 'pickle')
+        self.assertEquals(handle.load(), range(1000))
+        self.assertEquals(handle.load(), range(1000))
+
+    def test_namespace(self):
+        ns, handles = share_namespace(dict(a='x' * 100, b=1), 100)
+        self.assertEquals(ns['b'], 1)
+        self.assertEquals(handles, [ns['a']])
+        self.assertEquals(resolve(ns, depth=1), dict(a='x' * 100, b=1))
+        sharedmem.release(handles)
+        self.failIf(os.path.exists(handles[0].path))
+
+    def test_resolve(self):
+        values = share_values(['x' * 100, [1]], 100)
+        self.assert_(isinstance(values, SharedList))
+        self.assertEquals(share_values(['x', [1]], 100), ['x', [1]])
+        path = values[0].path
+        # Values in lists are only looked into as deep as asked
+        self.assertEquals(resolve([values, 'y'], unlink=True, depth=1),
+                          [['x' * 100, [1]], 'y'])
+        self.failIf(os.path.exists(path))
+        handle = share('x' * 100, 100)
+        self.assertEquals(resolve([[handle]], depth=1), [[handle]])
+        handle.host = 'elsewhere'
+        self.assertRaises(sharedmem.error.KernelError, resolve, handle)
+
+    def test_arrays(self):
+        a = numpy.arange(200.0).reshape(20, 10)[:, ::2]
+        self.failUnless(share(a, a.nbytes + 1) is a)
+        handle = pickle.loads(pickle.dumps(share(a, 100), 2))
+        self.assertEquals(handle.kind, 'array')
+        self.assertEquals(handle.dtype, a.dtype)
+        self.assertEquals(handle.shape, a.shape)
+        b = handle.load()
+        self.assertEquals(b.dtype, a.dtype)
+        self.assertEquals(b.shape, a.shape)
+        self.failUnless((b == a).all())
+        # Writes are private to the process which made them
+        b[:] = -1
+        self.failUnless((numpy.fromfile(handle.path, a.dtype) ==
+                         a.ravel()).all())
+        self.failUnless((handle.load() == a).all())
+
+    if numpy is None:
+        test_arrays.skip = 'numpy is not installed'
@@ -21,9 +21,11 @@ __test__ = {}
 import time
 
 from twisted.internet import defer
+from twisted.python import failure
 from twisted.trial import unittest
 
 from IPython.kernel import task, controllerservice as cs, engineservice as es
+from IPython.kernel import error
 from IPython.kernel.multiengine import IMultiEngine
 from IPython.testing.util import DeferredTestCase
 from IPython.kernel.tests.tasktest import ITaskControllerTestCase
@@ -49,3 +51,155 @@ class BasicTaskControllerTestCase(DeferredTestCase, ITaskControllerTestCase):
             e.stopService()
 
 
+
+
+class FakeWorker(object):
+    """A worker whose tasks finish when the test says so."""
+
+    def __init__(self, workerid):
+        self.workerid = workerid
+        self.properties = {}
+        self.running = []
+
+    def run(self, task):
+        d = defer.Deferred()
+        self.running.append((task, d))
+        return d
+
+    def finish(self, success=True, duration=1.0, result=None):
+        task, d = self.running.pop(0)
+        task.duration = duration
+        if result is None:
+            result = 'result %i' % self.workerid
+        d.callback((success, result))
+
+
+class FakeWorkerTestCase(unittest.TestCase):
+    """A task controller with three FakeWorkers."""
+
+    def setUp(self):
+        self.controller = cs.ControllerService()
+        self.tc = task.TaskController(self.controller)
+        self.workers = [FakeWorker(i) for i in range(3)]
+        for w in self.workers:
+            self.tc.workers[w.workerid] = w
+            self.tc.health[w.workerid] = task.WorkerHealth()
+            self.tc.scheduler.add_worker(w)
+
+    def tearDown(self):
+        for call in [self.tc.idleLater, self.tc.speculateLater]:
+            if call and call.active():
+                call.cancel()
+
+
+class WorkerHealthTestCase(FakeWorkerTestCase):
+
+    def setUp(self):
+        FakeWorkerTestCase.setUp(self)
+        self.tc.speculationFactor = 3.0
+        self.tc.minSpeculationTime = 0
+
+    def test_health(self):
+        health = task.WorkerHealth()
+        health.task_done(True, 2.0)
+        health.task_done(False)
+        health.task_done(True, 4.0)
+        self.assertEquals((health.completed, health.failed), (2, 1))
+        self.assertEquals(health.consecutive_failures, 0)
+        self.assertAlmostEquals(health.mean_duration, 2.4)
+        self.assertAlmostEquals(health.failure_rate, 0.16)
+
+    def test_ranks(self):
+        scheduler = task.FIFOScheduler()
+        for w in self.workers:
+            scheduler.add_worker(w, rank=int(w.workerid == 0))
+        scheduler.add_task(task.StringTask('pass'))
+        self.assertEquals(scheduler.schedule()[0].workerid, 1)
+
+    def test_penalties(self):
+        self.tc.health[1].task_done(True, 1.0)
+        health = self.tc.health[0]
+        for i in range(3):
+            health.task_done(False)
+        self.assertEquals(self.tc.failureDelay(0), 4)
+        self.assertEquals(self.tc.workerRank(0), 0)
+        # Failing more often than its peers gets a worker quarantined
+        for i in range(2):
+            health.task_done(False)
+        self.assertEquals(self.tc.failureDelay(0), self.tc.quarantinePenalty)
+        self.assertEquals(self.tc.workerRank(0), 1)
+        self.failIf(self.tc.isSlow(0))
+        health.task_done(True, 3.0)
+        self.failUnless(self.tc.isSlow(0))
+
+    def test_speculation_off(self):
+        tc = task.TaskController(self.controller)
+        self.assertEquals(tc.speculationFactor, 0)
+
+    def test_speculation(self):
+        for w in self.workers:
+            self.tc.health[w.workerid].task_done(True, 0.1)
+        self.tc.run(task.StringTask('pass'))
+        self.tc.health[0].started -= 1
+        self.tc.checkStragglers()
+        # The copy runs on another worker, and its result is kept
+        self.assertEquals(len(self.workers[1].running), 1)
+        self.workers[1].finish()
+        d = self.tc.get_task_result(0)
+        d.addCallback(lambda tr: self.assertEquals(tr, 'result 1'))
+        d.addCallback(lambda _: self.workers[0].finish())
+        d.addCallback(lambda _: self.tc.get_task_result(0))
+        d.addCallback(lambda tr: self.assertEquals(tr, 'result 1'))
+        d.addCallback(lambda _: self.assertEquals(self.tc.pendingTasks, {}))
+        return d
+
+
+class TaskDependencyTestCase(FakeWorkerTestCase):
+
+    def test_after(self):
+        self.tc.run(task.StringTask('x = 1', pull='x'))
+        self.tc.run(task.StringTask('y = 2', pull='y'))
+        self.tc.run(task.StringTask('z = x + y', after=[0, 1]))
+        self.assertEquals(self.tc.waitingTasks.keys(), [2])
+        self.workers[0].finish(result=task.TaskResult(dict(x=1), 0))
+        self.assertEquals(self.tc.waitingTasks.keys(), [2])
+        self.workers[1].finish(result=task.TaskResult(dict(y=2), 1))
+        # The task runs where one of its inputs is, and gets the others
+        t = self.workers[0].running[0][0]
+        self.assertEquals(t.taskid, 2)
+        self.assertEquals(t.upstream_ns, dict(y=2))
+        self.workers[0].finish()
+        d = self.tc.get_task_result(2)
+        d.addCallback(lambda tr: self.assertEquals(tr, 'result 0'))
+        return d
+
+    def test_after_intervening_task(self):
+        for w in self.workers[1:]:
+            self.tc.scheduler.pop_worker(w.workerid)
+        self.tc.run(task.StringTask('x = 10', pull='x'))
+        self.tc.run(task.StringTask('x = 99'))
+        self.tc.run(task.StringTask('y = x**2', pull='y', after=[0, 1]))
+        self.workers[0].finish(result=task.TaskResult(dict(x=10), 0))
+        self.workers[0].finish(result=task.TaskResult({}, 0))
+        # The second task changed x on the worker, so it is pushed again
+        t = self.workers[0].running[0][0]
+        self.assertEquals(t.taskid, 2)
+        self.assertEquals(t.upstream_ns, dict(x=10))
+        self.workers[0].finish()
+
+    def test_after_failure(self):
+        self.tc.failurePenalty = 0
+        self.tc.run(task.StringTask('1/0'))
+        self.tc.run(task.StringTask('pass', after=0))
+        self.tc.run(task.StringTask('pass', after=1))
+        self.workers[0].finish(False,
+                               result=failure.Failure(ZeroDivisionError()))
+        self.assertEquals(self.tc.waitingTasks, {})
+        d = self.assertFailure(self.tc.get_task_result(2),
+                               error.TaskDependencyError)
+        d.addCallback(lambda _: self.tc.run(task.StringTask('pass', after=0)))
+        d.addCallback(lambda tid: self.assertFailure(
+            self.tc.get_task_result(tid), error.TaskDependencyError))
+        d.addCallback(lambda _: self.assertFailure(
+            self.tc.run(task.StringTask('pass', after=10)), IndexError))
+        return d
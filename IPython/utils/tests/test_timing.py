@@ -0,0 +1,51 @@
+# encoding: utf-8
+"""Tests for timing.py"""
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import __builtin__
+import sys
+
+import nose.tools as nt
+
+from IPython.utils.timing import StartupTimer
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_startup_timer_steps():
+    timer = StartupTimer()
+    inner = timer.wrap('inner', lambda x: x+1)
+    outer = timer.wrap('outer', lambda x: inner(x)*2)
+    nt.assert_equal(outer(1), 4)
+    names = [(name, depth) for name, secs, depth in timer.steps]
+    nt.assert_equal(names, [('outer', 0), ('inner', 1)])
+    report = timer.report()
+    nt.assert_true('outer' in report)
+    nt.assert_true('    inner' in report)
+
+
+def test_startup_timer_imports():
+    timer = StartupTimer()
+    real_import = __builtin__.__import__
+    sys.modules.pop('colorsys', None)
+    timer.start_imports()
+    try:
+        import colorsys
+        # Already imported modules aren't recorded
+        import os
+    finally:
+        timer.stop_imports()
+    nt.assert_true(__builtin__.__import__ is real_import)
+    names = [name for name, secs, depth in timer.imports]
+    nt.assert_equal(names, ['colorsys'])
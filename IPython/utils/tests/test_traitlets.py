@@ -322,6 +322,63 @@ class TestHasTraitsNotify(TestCase):
 
         self.assertEquals(len(a._trait_notifiers['a']),0)
 
+    def test_notifiers_not_extended(self):
+
+        class A(HasTraits):
+            a = Int
+
+        a = A()
+        a.on_trait_change(self.notify1, 'a')
+        a.on_trait_change(self.notify2)
+        a.a = 10
+        a.a = 20
+        self.assertEquals(a._trait_notifiers['a'], [self.notify1])
+        self.assertEquals(self._notify1, [('a',0,10), ('a',10,20)])
+        self.assertEquals(self._notify2, [('a',0,10), ('a',10,20)])
+
+    def test_traits_set_on_class(self):
+
+        class A(HasTraits):
+            a = Int
+
+        class B(A):
+            pass
+
+        A.b = Float(1.0)
+        B._b_changed = lambda self, name, old, new: self._notify1.append(new)
+        self.assertEquals(A.b.name, 'b')
+        b = B()
+        b._notify1 = []
+        self.assertEquals(b.b, 1.0)
+        b.b = 2.0
+        self.assertEquals(b._notify1, [2.0])
+        self.assertEquals(sorted(b.trait_names()), ['a', 'b'])
+        del A.b
+        self.assertEquals(B().trait_names(), ['a'])
+
+    def test_trait_shadowed_on_class(self):
+
+        class A(HasTraits):
+            a = Int(config=True)
+
+        class B(A):
+            pass
+
+        B.a = 5
+        self.assertEquals(B().traits(config=True), {})
+        self.assertEquals(A().traits(config=True).keys(), ['a'])
+
+    def test_instance_handler(self):
+
+        class A(HasTraits):
+            a = Int
+
+        a = A()
+        changes = []
+        a._a_changed = lambda name, old, new: changes.append(new)
+        a.a = 10
+        self.assertEquals(changes, [10])
+
 
 class TestHasTraits(TestCase):
 
@@ -14,6 +14,8 @@ Utilities for timing code execution.
 # Imports
 #-----------------------------------------------------------------------------
 
+import __builtin__
+import sys
 import time
 
 #-----------------------------------------------------------------------------
@@ -114,3 +116,80 @@ def timing(func,*args,**kw):
 
     return timings_out(1,func,*args,**kw)[0]
 
+
+
+class StartupTimer(object):
+    """Record the wall clock time spent in initialization steps and imports.
+
+    Steps are timed by calling the wrappers returned by :meth:`wrap`, and the
+    imports of modules not yet in sys.modules by replacing
+    ``__builtin__.__import__`` between :meth:`start_imports` and
+    :meth:`stop_imports`.  Nested steps and imports are recorded with their
+    nesting depth, so :meth:`report` can show them as a tree.
+    """
+
+    def __init__(self):
+        # Lists of [name, seconds, depth] entries, in the order they started
+        self.steps = []
+        self.imports = []
+        self._step_depth = 0
+        self._import_depth = 0
+        self._real_import = None
+
+    def wrap(self, name, func):
+        """Return a wrapper of `func` which records its run time as `name`."""
+        def timed(*args, **kw):
+            entry = [name, None, self._step_depth]
+            self.steps.append(entry)
+            self._step_depth += 1
+            t0 = time.time()
+            try:
+                return func(*args, **kw)
+            finally:
+                entry[1] = time.time() - t0
+                self._step_depth -= 1
+        return timed
+
+    def start_imports(self):
+        """Start recording the time taken by new imports."""
+        if self._real_import is not None:
+            return
+        real_import = self._real_import = __builtin__.__import__
+
+        def timed_import(name, *args, **kw):
+            if not name or name in sys.modules:
+                return real_import(name, *args, **kw)
+            entry = [name, None, self._import_depth]
+            self.imports.append(entry)
+            self._import_depth += 1
+            t0 = time.time()
+            try:
+                return real_import(name, *args, **kw)
+            finally:
+                entry[1] = time.time() - t0
+                self._import_depth -= 1
+
+        __builtin__.__import__ = timed_import
+
+    def stop_imports(self):
+        """Stop recording imports, restoring the original __import__."""
+        if self._real_import is not None:
+            __builtin__.__import__ = self._real_import
+            self._real_import = None
+
+    def report(self, threshold=0.0):
+        """Return a formatted report of the recorded timings.
+
+        Entries which took less than `threshold` seconds are omitted.
+        """
+        out = []
+        for title, entries in [('Initialization steps', self.steps),
+                               ('Imports', self.imports)]:
+            total = sum(secs for name, secs, depth in entries
+                        if depth == 0 and secs is not None)
+            out.append('%s (total %.4f s):' % (title, total))
+            for name, secs, depth in entries:
+                if secs is None or secs < threshold:
+                    continue
+                out.append('%9.4f  %s%s' % (secs, '  '*depth, name))
+        return '\n'.join(out)
@@ -52,6 +52,7 @@ Authors:
 import inspect
 import sys
 import types
+from weakref import WeakKeyDictionary
 from types import (
     InstanceType, ClassType, FunctionType,
     ListType, TupleType
@@ -115,6 +116,33 @@ def repr_type(obj):
     return msg
 
 
+# The number of arguments of the trait change callbacks, by function
+_callback_nargs = WeakKeyDictionary()
+
+def callback_nargs(c):
+    """Return the number of arguments a trait change callback takes.
+
+    The result is cached, so that :func:`inspect.getargspec` is only called
+    once per function.
+    """
+    func = getattr(c, 'im_func', c)
+    try:
+        nargs = _callback_nargs[func]
+    except (KeyError, TypeError):
+        nargs = len(inspect.getargspec(c)[0])
+        try:
+            _callback_nargs[func] = nargs
+        except TypeError:
+            # Not weak referenceable
+            pass
+    # Bound methods have an additional 'self' argument
+    # I don't know how to treat unbound methods, but they
+    # can't really be used for callbacks.
+    if isinstance(c, types.MethodType):
+        nargs -= 1
+    return nargs
+
+
 def parse_notifier_name(name):
     """Convert the name argument to a list of names.
     
@@ -212,6 +240,9 @@ class TraitType(object):
             self._metadata = self.metadata
 
         self.init()
+        # Pick the validation method once, rather than on every assignment.
+        if type(self)._validate.im_func is TraitType._validate.im_func:
+            self._validate = self._get_validator()
 
     def init(self):
         pass
@@ -275,7 +306,10 @@ class TraitType(object):
 
     def __set__(self, obj, value):
         new_value = self._validate(obj, value)
-        old_value = self.__get__(obj)
+        try:
+            old_value = obj._trait_values[self.name]
+        except KeyError:
+            old_value = self.__get__(obj)
         if old_value != new_value:
             obj._trait_values[self.name] = new_value
             obj._notify_trait(self.name, old_value, new_value)
@@ -294,6 +328,15 @@ class TraitType(object):
         else:
             return value
 
+    def _get_validator(self):
+        """Return the function :meth:`_validate` ends up calling."""
+        if hasattr(self, 'validate'):
+            return self.validate
+        elif hasattr(self, 'is_valid_for') or hasattr(self, 'value_for'):
+            return TraitType._validate.__get__(self)
+        else:
+            return lambda obj, value: value
+
     def info(self):
         return self.info_text
 
@@ -324,6 +367,10 @@ class MetaHasTraits(type):
     
     This metaclass makes sure that any TraitType class attributes are
     instantiated and sets their name attribute.
+
+    It also builds, once per class, the tables that instances use to find
+    their traits and static change handlers (see :meth:`_build_trait_tables`).
+    These are rebuilt if traits or handlers are later set on the class.
     """
     
     def __new__(mcls, name, bases, classdict):
@@ -355,6 +402,59 @@ class MetaHasTraits(type):
             if isinstance(v, TraitType):
                 v.this_class = cls
         super(MetaHasTraits, cls).__init__(name, bases, classdict)
+        cls._build_trait_tables()
+
+    def _build_trait_tables(cls):
+        """Compute the traits of the class and their static handlers.
+
+        This sets:
+
+        * ``_trait_table``: a dict of the traits of the class by name.
+        * ``_trait_list``: the traits of the class, sorted by name.
+        * ``_static_notifiers``: a dict mapping the names of the traits which
+          have a static ``_[traitname]_changed`` handler to the name of the
+          handler.
+        """
+        table = {}
+        seen = set()
+        for klass in cls.__mro__:
+            for k, v in klass.__dict__.iteritems():
+                if k in seen:
+                    continue
+                seen.add(k)
+                if isinstance(v, TraitType):
+                    table[k] = v
+        notifiers = {}
+        for k in table:
+            handler_name = '_%s_changed' % k
+            if hasattr(cls, handler_name):
+                notifiers[k] = handler_name
+        type.__setattr__(cls, '_trait_table', table)
+        type.__setattr__(cls, '_trait_list',
+                         [table[k] for k in sorted(table)])
+        type.__setattr__(cls, '_static_notifiers', notifiers)
+
+    def _rebuild_trait_tables(cls):
+        cls._build_trait_tables()
+        for sub in type.__subclasses__(cls):
+            if isinstance(sub, MetaHasTraits):
+                sub._rebuild_trait_tables()
+
+    def __setattr__(cls, name, value):
+        old_value = cls.__dict__.get(name)
+        if isinstance(value, TraitType):
+            value.name = name
+            value.this_class = cls
+        super(MetaHasTraits, cls).__setattr__(name, value)
+        # A plain value can also shadow an inherited trait
+        if isinstance(value, TraitType) or isinstance(old_value, TraitType) \
+           or name in cls._trait_table or name.endswith('_changed'):
+            cls._rebuild_trait_tables()
+
+    def __delattr__(cls, name):
+        super(MetaHasTraits, cls).__delattr__(name)
+        cls._rebuild_trait_tables()
+
 
 class HasTraits(object):
 
@@ -372,17 +472,8 @@ class HasTraits(object):
         inst._trait_notifiers = {}
         # Here we tell all the TraitType instances to set their default
         # values on the instance. 
-        for key in dir(cls):
-            # Some descriptors raise AttributeError like zope.interface's
-            # __provides__ attributes even though they exist.  This causes
-            # AttributeErrors even though they are listed in dir(cls).
-            try:
-                value = getattr(cls, key)
-            except AttributeError:
-                pass
-            else:
-                if isinstance(value, TraitType):
-                    value.instance_init(inst)
+        for trait in cls._trait_list:
+            trait.instance_init(inst)
 
         return inst
 
@@ -395,39 +486,35 @@ class HasTraits(object):
 
     def _notify_trait(self, name, old_value, new_value):
 
-        # First dynamic ones
-        callables = self._trait_notifiers.get(name,[])
-        more_callables = self._trait_notifiers.get('anytrait',[])
-        callables.extend(more_callables)
-
-        # Now static ones
-        try:
-            cb = getattr(self, '_%s_changed' % name)
-        except:
-            pass
+        # First dynamic ones.  Copy the lists, as the handlers may add or
+        # remove handlers.
+        notifiers = self._trait_notifiers
+        callables = []
+        if notifiers:
+            callables.extend(notifiers.get(name, ()))
+            callables.extend(notifiers.get('anytrait', ()))
+
+        # Now static ones, which may also be set on the instance
+        handler_name = self._static_notifiers.get(name)
+        if handler_name is not None:
+            callables.append(getattr(self, handler_name))
         else:
-            callables.append(cb)
+            handler = self.__dict__.get('_%s_changed' % name)
+            if handler is not None:
+                callables.append(handler)
 
         # Call them all now
         for c in callables:
             # Traits catches and logs errors here.  I allow them to raise
             if callable(c):
-                argspec = inspect.getargspec(c)
-                nargs = len(argspec[0])
-                # Bound methods have an additional 'self' argument
-                # I don't know how to treat unbound methods, but they
-                # can't really be used for callbacks.
-                if isinstance(c, types.MethodType):
-                    offset = -1
-                else:
-                    offset = 0
-                if nargs + offset == 0:
+                nargs = callback_nargs(c)
+                if nargs == 0:
                     c()
-                elif nargs + offset == 1:
+                elif nargs == 1:
                     c(name)
-                elif nargs + offset == 2:
+                elif nargs == 2:
                     c(name, new_value)
-                elif nargs + offset == 3:
+                elif nargs == 3:
                     c(name, old_value, new_value)
                 else:
                     raise TraitError('a trait changed callback '
@@ -505,8 +592,7 @@ class HasTraits(object):
         exists, but has any value.  This is because get_metadata returns
         None if a metadata key doesn't exist.
         """
-        traits = dict([memb for memb in getmembers(self.__class__) if \
-                     isinstance(memb[1], TraitType)])
+        traits = dict(self._trait_table)
 
         if len(metadata) == 0:
             return traits
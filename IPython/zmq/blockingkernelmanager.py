@@ -1,6 +1,12 @@
 """Implement a fully blocking kernel manager.
 
 Useful for test suites and blocking terminal interfaces.
+
+The channels store the messages they receive, and the calling thread waits
+for them on a condition variable, so that it wakes up as soon as they arrive.
+The wait itself is never timed: on Python 2 a timed Condition.wait polls with
+sleeps of up to 50 ms, so timeouts are enforced by a timer that notifies the
+condition instead.
 """
 #-----------------------------------------------------------------------------
 #  Copyright (C) 2010  The IPython Development Team
@@ -15,39 +21,79 @@ Useful for test suites and blocking terminal interfaces.
 from __future__ import print_function
 
 # Stdlib
-from Queue import Queue, Empty
+from collections import deque
+from Queue import Empty
+from threading import Condition, Timer
 
 # Our own
-from IPython.utils import io
 from IPython.utils.traitlets import Type
 
-from .kernelmanager import (KernelManager, SubSocketChannel, 
+from .kernelmanager import (KernelManager, SubSocketChannel,
                            XReqSocketChannel, RepSocketChannel, HBSocketChannel)
 
 #-----------------------------------------------------------------------------
 # Functions and classes
 #-----------------------------------------------------------------------------
 
-class BlockingSubSocketChannel(SubSocketChannel):
+def parent_id(msg):
+    """Return the msg_id of the request a message is about, or None."""
+    return msg['parent_header'].get('msg_id')
+
+
+class BlockingChannelMixin(object):
+    """Store the messages of a channel, for other threads to wait for them.
+
+    Messages can be taken in the order they arrived with :meth:`get_msg`, or
+    picked with :meth:`get_matching_msg`.
+    """
 
-    def __init__(self, context, session, address=None):
-        super(BlockingSubSocketChannel, self).__init__(context, session, address)
-        self._in_queue = Queue()
+    def __init__(self, *args, **kw):
+        super(BlockingChannelMixin, self).__init__(*args, **kw)
+        self._msgs = deque()
+        self._msgs_cond = Condition()
 
     def call_handlers(self, msg):
-        io.rprint('[[Sub]]', msg)  # dbg
-        self._in_queue.put(msg)
+        with self._msgs_cond:
+            self._msgs.append(msg)
+            self._msgs_cond.notify_all()
 
     def msg_ready(self):
         """Is there a message that has been received?"""
-        if self._in_queue.qsize() == 0:
-            return False
-        else:
-            return True
+        return len(self._msgs) > 0
+
+    def get_matching_msg(self, match, block=True, timeout=None):
+        """Remove and return the first message for which match(msg) is true.
+
+        If block is True, wait for at most timeout seconds (forever if it is
+        None) for such a message to arrive.  :class:`Queue.Empty` is raised
+        if there is none.
+        """
+        expired = []
+        timer = None
+        if block and timeout is not None:
+            def expire():
+                with self._msgs_cond:
+                    expired.append(True)
+                    self._msgs_cond.notify_all()
+            timer = Timer(timeout, expire)
+            timer.start()
+        try:
+            with self._msgs_cond:
+                while True:
+                    for i, msg in enumerate(self._msgs):
+                        if match(msg):
+                            del self._msgs[i]
+                            return msg
+                    if not block or expired:
+                        raise Empty
+                    self._msgs_cond.wait()
+        finally:
+            if timer is not None:
+                timer.cancel()
 
     def get_msg(self, block=True, timeout=None):
         """Get a message if there is one that is ready."""
-        return self.in_queue.get(block, timeout)
+        return self.get_matching_msg(lambda msg: True, block, timeout)
 
     def get_msgs(self):
         """Get all messages that are currently ready."""
@@ -59,41 +105,48 @@ class BlockingSubSocketChannel(SubSocketChannel):
                 break
         return msgs
 
-    
 
-class BlockingXReqSocketChannel(XReqSocketChannel):
+class BlockingSubSocketChannel(BlockingChannelMixin, SubSocketChannel):
 
-    def __init__(self, context, session, address=None):
-        super(BlockingXReqSocketChannel, self).__init__(context, session, address)
-        self._in_queue = Queue()
+    def iter_output(self, msg_id, timeout=None):
+        """Iterate over the messages published by the kernel for a request.
 
-    def call_handlers(self, msg):
-        io.rprint('[[XReq]]', msg)  # dbg
+        This yields the messages (other than status ones) whose parent is
+        the request msg_id, as they arrive, until the kernel reports that it
+        is done with the request.  :class:`Queue.Empty` is raised if no
+        message arrives for timeout seconds.
+        """
+        match = lambda msg: parent_id(msg) == msg_id
+        while True:
+            msg = self.get_matching_msg(match, timeout=timeout)
+            if msg['msg_type'] == 'status':
+                if msg['content'].get('execution_state') == 'idle':
+                    return
+            else:
+                yield msg
 
-    def msg_ready(self):
-        """Is there a message that has been received?"""
-        if self._in_queue.qsize() == 0:
-            return False
-        else:
-            return True
 
-    def get_msg(self, block=True, timeout=None):
-        """Get a message if there is one that is ready."""
-        return self.in_queue.get(block, timeout)
+class BlockingXReqSocketChannel(BlockingChannelMixin, XReqSocketChannel):
 
-    def get_msgs(self):
-        """Get all messages that are currently ready."""
-        msgs = []
-        while True:
-            try:
-                msgs.append(self.get_msg(block=False))
-            except Empty:
-                break
-        return msgs
+    def wait_for_reply(self, msg_id, timeout=None):
+        """Wait for the reply to the request msg_id, and return it.
 
-class BlockingRepSocketChannel(RepSocketChannel):
-    def call_handlers(self, msg):
-        io.rprint('[[Rep]]', msg)  # dbg
+        :class:`Queue.Empty` is raised if it didn't arrive within timeout
+        seconds.
+        """
+        return self.get_matching_msg(lambda msg: parent_id(msg) == msg_id,
+                                     timeout=timeout)
+
+    def execute_and_wait(self, code, timeout=None, **kw):
+        """Execute code in the kernel and return the execute_reply message.
+
+        The other keyword arguments are passed to :meth:`execute`.
+        """
+        return self.wait_for_reply(self.execute(code, **kw), timeout)
+
+
+class BlockingRepSocketChannel(BlockingChannelMixin, RepSocketChannel):
+    pass
 
 
 class BlockingHBSocketChannel(HBSocketChannel):
@@ -101,14 +154,26 @@ class BlockingHBSocketChannel(HBSocketChannel):
     time_to_dead = 0.2
 
     def call_handlers(self, since_last_heartbeat):
-        io.rprint('[[Heart]]', since_last_heartbeat) # dbg
-    
+        pass
+
 
 class BlockingKernelManager(KernelManager):
-    
+
     # The classes to use for the various channels.
     xreq_channel_class = Type(BlockingXReqSocketChannel)
     sub_channel_class = Type(BlockingSubSocketChannel)
     rep_channel_class = Type(BlockingRepSocketChannel)
     hb_channel_class = Type(BlockingHBSocketChannel)
-  
+
+    def execute_and_wait(self, code, timeout=None, **kw):
+        """Execute code in the kernel and wait until it is done with it.
+
+        Returns the execute_reply message and the list of the messages the
+        kernel published for the request (streams, pyin, pyout, ...).  The
+        timeout applies to each of the messages waited for.  The other
+        keyword arguments are passed to :meth:`XReqSocketChannel.execute`.
+        """
+        msg_id = self.xreq_channel.execute(code, **kw)
+        reply = self.xreq_channel.wait_for_reply(msg_id, timeout)
+        output = list(self.sub_channel.iter_output(msg_id, timeout))
+        return reply, output
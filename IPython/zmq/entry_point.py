@@ -51,6 +51,18 @@ def make_argument_parser():
                         help='set the REQ channel port [default: random]')
     parser.add_argument('--hb', type=int, metavar='PORT', default=0,
                         help='set the heartbeat port [default: random]')
+    parser.add_argument('--compression', type=str, metavar='CODECS',
+                        default='', help='compress large messages with the '
+                        'first of these comma-separated codecs (zlib, lz4, '
+                        'snappy) that the frontends support [default: none]')
+    parser.add_argument('--compression-threshold', type=int, metavar='BYTES',
+                        default=4096, help='only compress messages of at '
+                        'least BYTES bytes [default: 4096]')
+    parser.add_argument('--publish-compression', type=str, metavar='CODEC',
+                        default=None, help='compress large published '
+                        'messages with this codec, which all the frontends '
+                        'listening to the kernel must support '
+                        '[default: none]')
 
     if sys.platform == 'win32':
         parser.add_argument('--interrupt', type=int, metavar='HANDLE', 
@@ -88,7 +100,10 @@ def make_kernel(namespace, kernel_factory,
     context = zmq.Context()
     # Uncomment this to try closing the context.
     # atexit.register(context.close)
-    session = Session(username=u'kernel')
+    session = Session(username=u'kernel',
+                      compression=namespace.compression.split(','),
+                      compression_threshold=namespace.compression_threshold,
+                      publish_compression=namespace.publish_compression)
 
     reply_socket = context.socket(zmq.XREP)
     xrep_port = bind_port(reply_socket, namespace.ip, namespace.xrep)
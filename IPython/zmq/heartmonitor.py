@@ -0,0 +1,225 @@
+"""A heartbeat monitor pinging many kernels from one event loop.
+
+The hearts are the REP heartbeat sockets of the kernels (see
+:class:`IPython.zmq.heartbeat.Heartbeat`), which echo back whatever they get.
+Every `period` seconds, the :class:`HeartMonitor` sends a ping, a few raw
+bytes holding a sequence number, to all the hearts at once, and collects the
+answers as they come back in the same event loop.
+"""
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Standard library imports.
+from collections import deque
+from threading import Thread
+import time
+
+# System library imports.
+import zmq
+from zmq import POLLIN
+from zmq.eventloop import ioloop
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class Heart(object):
+    """The monitoring state of one heart."""
+
+    def __init__(self, key, address, history):
+        self.key = key
+        self.address = address
+        self.socket = None
+        # When the monitor started watching, and got the last answer
+        self.added = time.time()
+        self.last_beat = None
+        # Sequence number and send time of the pings in flight
+        self.pings = {}
+        # The last round trip times
+        self.latencies = deque(maxlen=history)
+        self.dead = False
+
+    def percentile(self, p):
+        """The p-th percentile (0-100) of the recent latencies, or None."""
+        if not self.latencies:
+            return None
+        latencies = sorted(self.latencies)
+        index = int(round(p/100.0*(len(latencies)-1)))
+        return latencies[index]
+
+
+class HeartMonitor(object):
+    """Monitor the heartbeats of many kernels with one socket poll cycle.
+
+    Hearts are identified by a key, and added with :meth:`add_heart`.
+    Handlers are called in the event loop thread:
+
+    * dead handlers, as ``handler(key, since_last_beat)``, when a heart
+      didn't answer for `time_to_dead` seconds.  This is reported once, until
+      the heart answers again.
+    * revive handlers, as ``handler(key)``, when a dead heart answers again.
+    * slow handlers, as ``handler(key, latency)``, for each answer which took
+      more than `slow_latency` seconds.
+
+    If `loop` is given the monitor runs in that ioloop (which must be started
+    by its owner), otherwise :meth:`start` runs it in its own thread.  All
+    methods can be called from any thread.
+    """
+
+    def __init__(self, context=None, loop=None, period=1.0, time_to_dead=3.0,
+                 slow_latency=1.0, history=100):
+        self.context = zmq.Context() if context is None else context
+        self._own_loop = loop is None
+        self.loop = ioloop.IOLoop() if loop is None else loop
+        self.period = period
+        self.time_to_dead = time_to_dead
+        self.slow_latency = slow_latency
+        self.history = history
+        self.hearts = {}
+        self.dead_handlers = []
+        self.revive_handlers = []
+        self.slow_handlers = []
+        self._seq = 0
+        self._thread = None
+        self._caller = ioloop.PeriodicCallback(self.beat, 1000*period,
+                                               self.loop)
+        self._started = False
+
+    def start(self):
+        """Start pinging, and the event loop thread if the loop is ours."""
+        if self._started:
+            return
+        self._started = True
+        self.loop.add_callback(self._caller.start)
+        if self._own_loop:
+            self._thread = Thread(target=self.loop.start)
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop pinging and close all the sockets."""
+        if not self._started:
+            return
+        def stop_all():
+            self._caller.stop()
+            for key in self.hearts.keys():
+                self._remove(key)
+            if self._own_loop:
+                self.loop.stop()
+        self.loop.add_callback(stop_all)
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._started = False
+
+    #--------------------------------------------------------------------------
+    # Hearts:
+    #--------------------------------------------------------------------------
+
+    def add_heart(self, key, address):
+        """Start monitoring the heart at address, an (ip, port) tuple."""
+        self.loop.add_callback(lambda : self._add(key, address))
+
+    def remove_heart(self, key):
+        """Stop monitoring a heart."""
+        self.loop.add_callback(lambda : self._remove(key))
+
+    def _add(self, key, address):
+        self._remove(key)
+        heart = Heart(key, address, self.history)
+        # A DEALER can send a new ping even if the previous one was never
+        # answered, unlike a REQ socket.  The empty frame stands for the REQ
+        # envelope expected by the REP socket of the heart.
+        heart.socket = self.context.socket(zmq.XREQ)
+        heart.socket.setsockopt(zmq.LINGER, 0)
+        heart.socket.connect('tcp://%s:%i' % address)
+        self.loop.add_handler(heart.socket,
+                              lambda s, events: self._handle_pong(heart),
+                              POLLIN)
+        self.hearts[key] = heart
+
+    def _remove(self, key):
+        heart = self.hearts.pop(key, None)
+        if heart is not None:
+            self.loop.remove_handler(heart.socket)
+            heart.socket.close()
+
+    #--------------------------------------------------------------------------
+    # Pings:
+    #--------------------------------------------------------------------------
+
+    def beat(self):
+        """Check for dead hearts, and send a new ping to all of them."""
+        now = time.time()
+        self._seq += 1
+        ping = str(self._seq)
+        for heart in self.hearts.values():
+            since_last_beat = now - (heart.last_beat or heart.added)
+            if not heart.dead and since_last_beat > self.time_to_dead:
+                heart.dead = True
+                for handler in list(self.dead_handlers):
+                    handler(heart.key, since_last_beat)
+            # Forget about pings which will never be counted
+            for seq, sent in heart.pings.items():
+                if now - sent > self.time_to_dead:
+                    del heart.pings[seq]
+            heart.pings[ping] = now
+            heart.socket.send_multipart(['', ping])
+
+    def _handle_pong(self, heart):
+        while True:
+            try:
+                ping = heart.socket.recv_multipart(zmq.NOBLOCK)[-1]
+            except zmq.ZMQError, e:
+                if e.errno == zmq.EAGAIN:
+                    break
+                raise
+            now = time.time()
+            sent = heart.pings.pop(ping, None)
+            if sent is None:
+                continue
+            latency = now - sent
+            heart.last_beat = now
+            heart.latencies.append(latency)
+            if heart.dead:
+                heart.dead = False
+                for handler in list(self.revive_handlers):
+                    handler(heart.key)
+            if latency > self.slow_latency:
+                for handler in list(self.slow_handlers):
+                    handler(heart.key, latency)
+
+    #--------------------------------------------------------------------------
+    # Statistics:
+    #--------------------------------------------------------------------------
+
+    def last_beat(self, key):
+        """Time of the last answer of a heart, or None."""
+        return self.hearts[key].last_beat
+
+    def is_dead(self, key):
+        """Has the heart missed its heartbeats for time_to_dead seconds?"""
+        return self.hearts[key].dead
+
+    def latency(self, key, percentiles=(50, 90, 99)):
+        """Percentiles of the recent ping latencies of a heart, in seconds.
+
+        Returns a dict mapping the requested percentiles to latencies, or to
+        None if the heart never answered.
+        """
+        heart = self.hearts[key]
+        return dict((p, heart.percentile(p)) for p in percentiles)
+
+    @property
+    def dead_hearts(self):
+        """The keys of the hearts currently considered dead."""
+        return [key for key, heart in self.hearts.items() if heart.dead]
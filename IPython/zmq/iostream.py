@@ -1,26 +1,73 @@
 import sys
 import time
+from collections import deque
 from cStringIO import StringIO
 
 from session import extract_header, Message
 
 from IPython.utils import io
 
+#-----------------------------------------------------------------------------
+# Utility functions
+#-----------------------------------------------------------------------------
+
+def split_chunks(data, size):
+    """Split bytes in chunks of at most `size` bytes.
+
+    The chunks are cut on UTF-8 character boundaries where possible, so that
+    each of them can be decoded on its own.
+    """
+    chunks = []
+    start = 0
+    while len(data) - start > size:
+        end = start + size
+        # Don't cut before a continuation byte of a multibyte character, of
+        # which there are at most 3
+        for cut in range(end, max(end - 4, start), -1):
+            if not '\x80' <= data[cut] <= '\xbf':
+                end = cut
+                break
+        chunks.append(data[start:end])
+        start = end
+    chunks.append(data[start:])
+    return chunks
+
 #-----------------------------------------------------------------------------
 # Stream classes
 #-----------------------------------------------------------------------------
 
 class OutStream(object):
-    """A file like object that publishes the stream to a 0MQ PUB socket."""
+    """A file like object that publishes the stream to a 0MQ PUB socket.
+
+    The output is published as 'stream' messages numbered by :attr:`seq`,
+    with the byte offset of their data in the stream.  Their text is the
+    output decoded from UTF-8; output which is not valid UTF-8 is also sent
+    as is, in a raw frame after the message.  The latest output is kept so
+    that frontends can ask for the parts they missed (see :meth:`get_range`).
+    """
 
     # The time interval between automatic flushes, in seconds.
     flush_interval = 0.05
 
+    # The largest number of bytes sent in one message.  Bigger output is sent
+    # in several messages, and the buffer is flushed whenever it holds this
+    # much, so that large outputs are streamed with bounded memory.
+    chunk_size = 64 * 1024
+
+    # The number of bytes of the latest output kept for get_range.
+    history_size = 1024 * 1024
+
     def __init__(self, session, pub_socket, name):
         self.session = session
         self.pub_socket = pub_socket
         self.name = name
         self.parent_header = {}
+        # The number of messages sent, and of bytes in them
+        self.seq = 0
+        self.offset = 0
+        # (offset, data) of the latest chunks sent
+        self._history = deque()
+        self._history_bytes = 0
         self._new_buffer()
 
     def set_parent(self, parent):
@@ -36,14 +83,25 @@ class OutStream(object):
         else:
             data = self._buffer.getvalue()
             if data:
-                content = {u'name':self.name, u'data':data}
-                msg = self.session.msg(u'stream', content=content,
-                                       parent=self.parent_header)
-                io.raw_print(msg)
-                self.pub_socket.send_json(msg)
-                
                 self._buffer.close()
                 self._new_buffer()
+                for chunk in split_chunks(data, self.chunk_size):
+                    self._send_chunk(chunk)
+
+    def get_range(self, start):
+        """Return the output sent from byte `start` of the stream on.
+
+        Returns an (offset, data) pair, where offset is where the data starts
+        in the stream.  It is greater than `start` if the output from there
+        is no longer kept.
+        """
+        chunks = [(offset, chunk) for offset, chunk in self._history
+                  if offset + len(chunk) > start]
+        if not chunks:
+            return self.offset, ''
+        first = chunks[0][0]
+        skip = max(start - first, 0)
+        return first + skip, ''.join(chunk for offset, chunk in chunks)[skip:]
 
     def isatty(self):
         return False
@@ -65,12 +123,13 @@ class OutStream(object):
             # into utf-8 for all frontends if we get unicode inputs.
             if type(string) == unicode:
                 string = string.encode('utf-8')
-                
+
             self._buffer.write(string)
             current_time = time.time()
             if self._start <= 0:
                 self._start = current_time
-            elif current_time - self._start > self.flush_interval:
+            if current_time - self._start > self.flush_interval or \
+               self._buffer.tell() >= self.chunk_size:
                 self.flush()
 
     def writelines(self, sequence):
@@ -83,3 +142,26 @@ class OutStream(object):
     def _new_buffer(self):
         self._buffer = StringIO()
         self._start = -1
+
+    def _send_chunk(self, chunk):
+        """Publish a chunk of output, and keep it in the history."""
+        content = {u'name':self.name, u'seq':self.seq, u'offset':self.offset}
+        buffers = None
+        try:
+            content[u'data'] = chunk.decode('utf-8')
+        except UnicodeDecodeError:
+            content[u'data'] = chunk.decode('utf-8', 'replace')
+            content[u'binary'] = True
+            buffers = [chunk]
+        msg = self.session.msg(u'stream', content=content,
+                               parent=self.parent_header)
+        io.raw_print(msg)
+        self.session.publish(self.pub_socket, msg, buffers)
+
+        self._history.append((self.offset, chunk))
+        self._history_bytes += len(chunk)
+        while self._history_bytes - len(self._history[0][1]) >= \
+              self.history_size:
+            self._history_bytes -= len(self._history.popleft()[1])
+        self.seq += 1
+        self.offset += len(chunk)
@@ -18,6 +18,9 @@ from __future__ import print_function
 # Standard library imports.
 import __builtin__
 import atexit
+from collections import deque
+import heapq
+import itertools
 import sys
 import time
 import traceback
@@ -30,13 +33,196 @@ from IPython.config.configurable import Configurable
 from IPython.utils import io
 from IPython.utils.jsonutil import json_clean
 from IPython.lib import pylabtools
-from IPython.utils.traitlets import Instance, Float
+from IPython.utils.traitlets import Instance, Float, Dict, Int
 from entry_point import (base_launch_kernel, make_argument_parser, make_kernel,
                          start_kernel)
 from iostream import OutStream
-from session import Session, Message
+from session import Session, Message, recv_message
 from zmqshell import ZMQInteractiveShell
 
+#-----------------------------------------------------------------------------
+# Request queue
+#-----------------------------------------------------------------------------
+
+class RequestQueue(object):
+    """A queue of requests, taken by priority and then by order of arrival.
+
+    Requests with lower priorities are taken first.
+    """
+
+    def __init__(self):
+        self._heap = []
+        # Ties between priorities are broken by order of arrival
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def put(self, priority, ident, msg):
+        """Queue a message, received from the given identity."""
+        heapq.heappush(self._heap, (priority, next(self._counter), ident, msg))
+
+    def get(self):
+        """Remove and return the next (ident, msg) pair.
+
+        Raises IndexError if the queue is empty.
+        """
+        priority, count, ident, msg = heapq.heappop(self._heap)
+        return ident, msg
+
+    def remove(self, match):
+        """Remove all the messages for which match(msg) is true.
+
+        Returns the removed (ident, msg) pairs in their order of arrival.
+        """
+        keep, removed = [], []
+        for item in self._heap:
+            if match(item[3]):
+                removed.append(item)
+            else:
+                keep.append(item)
+        if removed:
+            heapq.heapify(keep)
+            self._heap = keep
+            removed.sort(key=lambda item: item[1])
+        return [(ident, msg) for priority, count, ident, msg in removed]
+
+
+def abort_matcher(content, session):
+    """Return a function selecting the messages an abort request targets.
+
+    Parameters
+    ----------
+    content : dict
+      The content of the abort request.  The messages selected are those with
+      an id in its 'msg_ids' list, or within its 'msg_id_range' [first, last]
+      (inclusive), or whose id (as a string) starts with its 'msg_id_prefix'.
+      If none of them is given, all the execute requests are selected.
+    session : str
+      Only the messages from this session are selected, unless the content
+      gives another one in its 'session' field.
+    """
+    session = content.get('session') or session
+    msg_ids = content.get('msg_ids')
+    id_range = content.get('msg_id_range')
+    prefix = content.get('msg_id_prefix')
+    if msg_ids is not None:
+        msg_ids = set(msg_ids)
+    select_all = msg_ids is None and id_range is None and prefix is None
+
+    def match(msg):
+        header = msg['header']
+        if header['session'] != session:
+            return False
+        if select_all:
+            return msg['msg_type'] == 'execute_request'
+        msg_id = header['msg_id']
+        return ((msg_ids is not None and msg_id in msg_ids) or
+                (id_range is not None and id_range[0] <= msg_id <= id_range[1])
+                or (prefix is not None and str(msg_id).startswith(prefix)))
+    return match
+
+#-----------------------------------------------------------------------------
+# Message cache
+#-----------------------------------------------------------------------------
+
+class MessageCache(object):
+    """A ring buffer of the latest messages published by the kernel.
+
+    The oldest messages are dropped to keep at most `max_messages` messages,
+    and at most `max_bytes` bytes of them as sent, raw buffers included.  They
+    are kept with their raw buffers, and can be looked up by message id, or by
+    the id of their parent request.
+    """
+
+    def __init__(self, max_messages=1000, max_bytes=10*1024*1024):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        # (count, msg, buffers, nbytes) entries, oldest first
+        self._entries = deque()
+        self._counter = itertools.count()
+        self._by_id = {}
+        # Lists of entries, by (session, msg_id) of their parent
+        self._by_parent = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, msg, buffers=None, nbytes=0):
+        """Keep a message and the raw buffers it was sent with.
+
+        `nbytes` is the size of the message as sent, with its buffers.
+        """
+        entry = (next(self._counter), msg, list(buffers or []), nbytes)
+        self._entries.append(entry)
+        self.nbytes += nbytes
+        self._by_id[msg['header']['msg_id']] = entry
+        parent = self._parent_key(msg)
+        if parent is not None:
+            self._by_parent.setdefault(parent, []).append(entry)
+        while self._entries and (len(self._entries) > self.max_messages or
+                                 self.nbytes > self.max_bytes):
+            self._drop_oldest()
+
+    def get(self, msg_ids=None, parent_ids=None, session=None):
+        """Return the cached messages with the given ids or parents.
+
+        Parameters
+        ----------
+        msg_ids : list, optional
+          The ids of the messages to return.
+        parent_ids : list, optional
+          Return the messages whose parent is one of the requests with these
+          ids, in the given session.
+        session : str, optional
+          The session of the parent requests.
+
+        If neither msg_ids nor parent_ids is given, all the cached messages are
+        returned.  The messages are returned in the order they were sent.
+        """
+        return [entry[1] for entry in
+                self._get_entries(msg_ids, parent_ids, session)]
+
+    def get_with_buffers(self, msg_ids=None, parent_ids=None, session=None):
+        """Like :meth:`get`, but return (msg, buffers) pairs."""
+        return [entry[1:3] for entry in
+                self._get_entries(msg_ids, parent_ids, session)]
+
+    def _get_entries(self, msg_ids, parent_ids, session):
+        if msg_ids is None and parent_ids is None:
+            return list(self._entries)
+        # Entries by count, which gives their order
+        entries = {}
+        for msg_id in msg_ids or []:
+            entry = self._by_id.get(msg_id)
+            if entry is not None:
+                entries[entry[0]] = entry
+        for parent_id in parent_ids or []:
+            for entry in self._by_parent.get((session, parent_id), []):
+                entries[entry[0]] = entry
+        return [entries[count] for count in sorted(entries)]
+
+    def _parent_key(self, msg):
+        parent = msg['parent_header']
+        if 'msg_id' not in parent:
+            return None
+        return (parent.get('session'), parent['msg_id'])
+
+    def _drop_oldest(self):
+        entry = self._entries.popleft()
+        count, msg, buffers, nbytes = entry
+        self.nbytes -= nbytes
+        msg_id = msg['header']['msg_id']
+        if self._by_id.get(msg_id) is entry:
+            del self._by_id[msg_id]
+        parent = self._parent_key(msg)
+        if parent is not None:
+            siblings = self._by_parent[parent]
+            siblings.pop(0)
+            if not siblings:
+                del self._by_parent[parent]
+
 #-----------------------------------------------------------------------------
 # Main kernel class
 #-----------------------------------------------------------------------------
@@ -69,6 +255,29 @@ class Kernel(Configurable):
     # adapt to milliseconds.
     _poll_interval = Float(0.05, config=True)
 
+    # The priorities of the requests, by message type.  The kernel queues the
+    # requests it receives and handles those with the lowest priority first,
+    # so that introspection requests don't wait for all the queued code to
+    # run.  Requests of other types have the priority of execute_request.
+    request_priorities = Dict({'abort_request' : 0,
+                               'complete_request' : 0,
+                               'object_info_request' : 0,
+                               'connect_request' : 0,
+                               'stream_request' : 0,
+                               'replay_request' : 0,
+                               'execute_request' : 10,
+                               'history_request' : 10,
+                               'shutdown_request' : 10}, config=True)
+
+    # The limits of the cache of published messages, which frontends can get
+    # again with a replay_request: the number of messages and their total size
+    # in bytes.
+    message_cache_size = Int(1000, config=True)
+    message_cache_bytes = Int(10*1024*1024, config=True)
+
+    # The cache of the messages published on pub_socket
+    message_cache = Instance(MessageCache)
+
     # If the shutdown was requested over the network, we leave here the
     # necessary reply message so it can be sent by our registered atexit
     # handler.  This ensures that the reply is only sent to clients truly at
@@ -79,6 +288,9 @@ class Kernel(Configurable):
     # This is a dict of port number that the kernel is listening on. It is set
     # by record_ports and used by connect_request.
     _recorded_ports = None
+
+    # The requests received but not handled yet
+    _queue = None
     
     def __init__(self, **kwargs):
         super(Kernel, self).__init__(**kwargs)
@@ -95,29 +307,36 @@ class Kernel(Configurable):
         # TMP - hack while developing
         self.shell._reply_content = None
 
+        self._queue = RequestQueue()
+
+        # Keep the messages published with our session, by the streams and
+        # the display hook as well
+        self.message_cache = MessageCache(self.message_cache_size,
+                                          self.message_cache_bytes)
+        self.session.cache = self.message_cache
+
         # Build dict of handlers for message types
         msg_types = [ 'execute_request', 'complete_request', 
                       'object_info_request', 'history_request',
-                      'connect_request', 'shutdown_request']
+                      'connect_request', 'shutdown_request',
+                      'abort_request', 'stream_request', 'replay_request']
         self.handlers = {}
         for msg_type in msg_types:
             self.handlers[msg_type] = getattr(self, msg_type)
 
     def do_one_iteration(self):
         """Do one iteration of the kernel's evaluation loop.
+
+        The requests waiting on the socket are queued, and the one with the
+        highest priority is handled.
         """
-        try:
-            ident = self.reply_socket.recv(zmq.NOBLOCK)
-        except zmq.ZMQError, e:
-            if e.errno == zmq.EAGAIN:
-                return
-            else:
-                raise
-        # This assert will raise in versions of zeromq 2.0.7 and lesser.
-        # We now require 2.0.8 or above, so we can uncomment for safety.
-        assert self.reply_socket.rcvmore(), "Missing message part."
-        msg = self.reply_socket.recv_json()
-        
+        self._receive_requests()
+        if self._queue:
+            ident, msg = self._queue.get()
+            self.dispatch_request(ident, msg)
+
+    def dispatch_request(self, ident, msg):
+        """Call the handler of a request."""
         # Print some info about this message and leave a '--->' marker, so it's
         # easier to trace visually the message chain when debugging.  Each
         # handler prints its message at the end.
@@ -146,7 +365,9 @@ class Kernel(Configurable):
         """ Start the kernel main loop.
         """
         while True:
-            time.sleep(self._poll_interval)
+            # Only wait for new requests when there are none left to handle
+            if not self._queue:
+                time.sleep(self._poll_interval)
             self.do_one_iteration()
 
     def record_ports(self, xrep_port, pub_port, req_port, hb_port):
@@ -170,16 +391,18 @@ class Kernel(Configurable):
         """Publish the code request on the pyin stream."""
 
         pyin_msg = self.session.msg(u'pyin',{u'code':code}, parent=parent)
-        self.pub_socket.send_json(pyin_msg)
+        self.session.publish(self.pub_socket, pyin_msg)
+
+    def _publish_status(self, state, parent):
+        """Publish the execution state, and the number of queued requests."""
+        content = {u'execution_state' : state,
+                   u'queue_depth' : len(self._queue)}
+        status_msg = self.session.msg(u'status', content, parent=parent)
+        self.session.publish(self.pub_socket, status_msg)
 
     def execute_request(self, ident, parent):
         
-        status_msg = self.session.msg(
-            u'status',
-            {u'execution_state':u'busy'},
-            parent=parent
-        )
-        self.pub_socket.send_json(status_msg)
+        self._publish_status(u'busy', parent)
         
         try:
             content = parent[u'content']
@@ -276,17 +499,11 @@ class Kernel(Configurable):
         if self._execute_sleep:
             time.sleep(self._execute_sleep)
         
-        self.reply_socket.send(ident, zmq.SNDMORE)
-        self.reply_socket.send_json(reply_msg)
+        self.session.send_message(self.reply_socket, reply_msg, ident=ident)
         if reply_msg['content']['status'] == u'error':
             self._abort_queue()
 
-        status_msg = self.session.msg(
-            u'status',
-            {u'execution_state':u'idle'},
-            parent=parent
-        )
-        self.pub_socket.send_json(status_msg)
+        self._publish_status(u'idle', parent)
 
     def complete_request(self, ident, parent):
         txt, matches = self._complete(parent)
@@ -329,28 +546,104 @@ class Kernel(Configurable):
         self._shutdown_message = self.session.msg(u'shutdown_reply', parent['content'], parent)
         sys.exit(0)
 
+    def stream_request(self, ident, parent):
+        name = parent['content']['name']
+        stream = getattr(sys, name, None) if name in ('stdout', 'stderr') \
+                 else None
+        if not hasattr(stream, 'get_range'):
+            content = {'status' : 'error', 'name' : name}
+            msg = self.session.send(self.reply_socket, 'stream_reply',
+                                    content, parent, ident)
+            io.raw_print(msg)
+            return
+        stream.flush()
+        offset, data = stream.get_range(parent['content'].get('offset', 0))
+        content = {'status' : 'ok', 'name' : name, 'offset' : offset,
+                   'end' : stream.offset}
+        buffers = None
+        try:
+            content['data'] = data.decode('utf-8')
+        except UnicodeDecodeError:
+            content['data'] = data.decode('utf-8', 'replace')
+            content['binary'] = True
+            buffers = [data]
+        msg = self.session.send(self.reply_socket, 'stream_reply', content,
+                                parent, ident, buffers)
+        io.raw_print(msg)
+
+    def replay_request(self, ident, parent):
+        content = parent['content']
+        found = self.message_cache.get_with_buffers(
+            content.get('msg_ids'), content.get('parent_ids'),
+            content.get('session') or parent['header']['session'])
+        # The raw buffers of the messages are sent after the reply, in order
+        reply_content = {'status' : 'ok',
+                         'messages' : [msg for msg, buffers in found],
+                         'nbuffers' : [len(buffers) for msg, buffers in found]}
+        buffers = [buf for msg, msg_buffers in found for buf in msg_buffers]
+        msg = self.session.send(self.reply_socket, 'replay_reply',
+                                reply_content, parent, ident, buffers)
+        io.raw_print(msg)
+
+    def abort_request(self, ident, parent):
+        # Requests sent just before this one must be aborted too
+        self._receive_requests()
+        match = abort_matcher(parent['content'],
+                              parent['header']['session'])
+        content = {'status' : 'ok', 'msg_ids' : self._abort_requests(match)}
+        msg = self.session.send(self.reply_socket, 'abort_reply',
+                                content, parent, ident)
+        io.raw_print(msg)
+
     #---------------------------------------------------------------------------
     # Protected interface
     #---------------------------------------------------------------------------
 
-    def _abort_queue(self):
+    def _receive_requests(self):
+        """Move all the requests waiting on the reply socket to the queue."""
+        priorities = self.request_priorities
+        default = priorities.get('execute_request', 0)
         while True:
             try:
                 ident = self.reply_socket.recv(zmq.NOBLOCK)
             except zmq.ZMQError, e:
                 if e.errno == zmq.EAGAIN:
-                    break
-            else:
-                assert self.reply_socket.rcvmore(), \
-                       "Unexpected missing message part."
-                msg = self.reply_socket.recv_json()
+                    return
+                else:
+                    raise
+            # This assert will raise in versions of zeromq 2.0.7 and lesser.
+            # We now require 2.0.8 or above, so we can uncomment for safety.
+            assert self.reply_socket.rcvmore(), "Missing message part."
+            msg = recv_message(self.reply_socket)
+            self.session.add_peer(msg['header'])
+            self._queue.put(priorities.get(msg['msg_type'], default),
+                            ident, msg)
+
+    def _abort_requests(self, match):
+        """Abort the queued requests for which match(msg) is true.
+
+        Each of them gets a reply with an 'aborted' status.  Returns the list
+        of their message ids.
+        """
+        msg_ids = []
+        for ident, msg in self._queue.remove(match):
             io.raw_print("Aborting:\n", Message(msg))
             msg_type = msg['msg_type']
             reply_type = msg_type.split('_')[0] + '_reply'
             reply_msg = self.session.msg(reply_type, {'status' : 'aborted'}, msg)
             io.raw_print(reply_msg)
-            self.reply_socket.send(ident,zmq.SNDMORE)
-            self.reply_socket.send_json(reply_msg)
+            self.session.send_message(self.reply_socket, reply_msg,
+                                      ident=ident)
+            msg_ids.append(msg['header']['msg_id'])
+        return msg_ids
+
+    def _abort_queue(self):
+        """Abort all the queued executions, after one of them failed."""
+        is_execute = lambda msg: msg['msg_type'] == 'execute_request'
+        while True:
+            self._receive_requests()
+            if not self._abort_requests(is_execute):
+                break
             # We need to wait a bit for requests to come in. This can probably
             # be set shorter for true asynchronous clients.
             time.sleep(0.1)
@@ -366,7 +659,7 @@ class Kernel(Configurable):
         self.req_socket.send_json(msg)
 
         # Await a response.
-        reply = self.req_socket.recv_json()
+        reply = recv_message(self.req_socket)
         try:
             value = reply['content']['value']
         except:
@@ -605,6 +898,8 @@ given, the GUI backend is matplotlib's, otherwise use one of: \
         type=str, dest='colors',
         help="Set the color scheme (NoColor, Linux, and LightBG).",
         metavar='ZMQInteractiveShell.colors')
+    parser.add_argument('--startup-timing', action='store_true',
+        help="Report the time taken by each initialization step of the shell.")
     namespace = parser.parse_args()
 
     kernel_class = Kernel
@@ -628,6 +923,8 @@ given, the GUI backend is matplotlib's, otherwise use one of: \
         pylabtools.activate_matplotlib(backend)
     if namespace.colors:
         ZMQInteractiveShell.colors=namespace.colors
+    if namespace.startup_timing:
+        ZMQInteractiveShell.startup_timing = True
 
     kernel = make_kernel(namespace, kernel_class, OutStream)
 
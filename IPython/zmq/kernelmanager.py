@@ -21,7 +21,7 @@ from Queue import Queue, Empty
 from subprocess import Popen
 import signal
 import sys
-from threading import Thread
+from threading import Thread, Event
 import time
 
 # System library imports.
@@ -33,7 +33,7 @@ from zmq.eventloop import ioloop
 from IPython.utils import io
 from IPython.utils.localinterfaces import LOCALHOST, LOCAL_IPS
 from IPython.utils.traitlets import HasTraits, Any, Instance, Type, TCPAddress
-from session import Session
+from session import Session, recv_message
 
 #-----------------------------------------------------------------------------
 # Constants and exceptions
@@ -321,6 +321,87 @@ class XReqSocketChannel(ZmqSocketChannel):
         self._queue_request(msg)
         return msg['header']['msg_id']
 
+    def stream(self, name, offset=0):
+        """Get the output of a stream of the kernel, from a byte offset on.
+
+        This lets clients get output they missed, using the 'offset' of the
+        last stream message they received.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stream, 'stdout' or 'stderr'.
+        offset : int, optional
+            The offset of the first byte to get.  By default, all the output
+            kept by the kernel is returned.
+
+        Returns
+        -------
+        The msg_id of the message sent.
+        """
+        content = dict(name=name, offset=offset)
+        msg = self.session.msg('stream_request', content)
+        self._queue_request(msg)
+        return msg['header']['msg_id']
+
+    def replay(self, msg_ids=None, parent_ids=None):
+        """Get again messages recently published by the kernel.
+
+        The kernel keeps a bounded number of the latest messages it sent on
+        its PUB socket.  With no arguments, all of them are returned.
+
+        Parameters
+        ----------
+        msg_ids : list, optional
+            The ids of the messages to get.
+        parent_ids : list, optional
+            Get the messages sent in response to the requests of this session
+            with these ids, for example all the output of an execution.
+
+        Returns
+        -------
+        The msg_id of the message sent.
+        """
+        content = {}
+        if msg_ids is not None:
+            content['msg_ids'] = list(msg_ids)
+        if parent_ids is not None:
+            content['parent_ids'] = list(parent_ids)
+        msg = self.session.msg('replay_request', content)
+        self._queue_request(msg)
+        return msg['header']['msg_id']
+
+    def abort(self, msg_ids=None, msg_id_range=None, msg_id_prefix=None):
+        """Abort requests of this session queued in the kernel.
+
+        The requests selected by any of the arguments are aborted: they get
+        a reply with an 'aborted' status.  With no arguments, all the queued
+        execute requests are aborted.
+
+        Parameters
+        ----------
+        msg_ids : list, optional
+            The ids of the requests to abort.
+        msg_id_range : (first, last), optional
+            Abort the requests with ids from first to last, inclusive.
+        msg_id_prefix : str, optional
+            Abort the requests whose ids start with this string.
+
+        Returns
+        -------
+        The msg_id of the message sent.
+        """
+        content = {}
+        if msg_ids is not None:
+            content['msg_ids'] = list(msg_ids)
+        if msg_id_range is not None:
+            content['msg_id_range'] = list(msg_id_range)
+        if msg_id_prefix is not None:
+            content['msg_id_prefix'] = msg_id_prefix
+        msg = self.session.msg('abort_request', content)
+        self._queue_request(msg)
+        return msg['header']['msg_id']
+
     def _handle_events(self, socket, events):
         if events & POLLERR:
             self._handle_err()
@@ -330,7 +411,7 @@ class XReqSocketChannel(ZmqSocketChannel):
             self._handle_recv()
 
     def _handle_recv(self):
-        msg = self.socket.recv_json()
+        msg = recv_message(self.socket)
         self.call_handlers(msg)
 
     def _handle_send(self):
@@ -359,6 +440,7 @@ class SubSocketChannel(ZmqSocketChannel):
     def __init__(self, context, session, address):
         super(SubSocketChannel, self).__init__(context, session, address)
         self.ioloop = ioloop.IOLoop()
+        self._flushed = Event()
 
     def run(self):
         """The thread's main activity.  Call start() instead."""
@@ -404,10 +486,9 @@ class SubSocketChannel(ZmqSocketChannel):
         # gets to perform at least one full poll.
         stop_time = time.time() + timeout
         for i in xrange(2):
-            self._flushed = False
+            self._flushed.clear()
             self.ioloop.add_callback(self._flush)
-            while not self._flushed and time.time() < stop_time:
-                time.sleep(0.01)
+            self._flushed.wait(max(stop_time - time.time(), 0))
 
     def _handle_events(self, socket, events):
         # Turn on and off POLLOUT depending on if we have made a request
@@ -424,7 +505,7 @@ class SubSocketChannel(ZmqSocketChannel):
         # Get all of the messages we can
         while True:
             try:
-                msg = self.socket.recv_json(zmq.NOBLOCK)
+                msg = recv_message(self.socket, zmq.NOBLOCK)
             except zmq.ZMQError:
                 # Check the errno?
                 # Will this trigger POLLERR?
@@ -434,7 +515,7 @@ class SubSocketChannel(ZmqSocketChannel):
 
     def _flush(self):
         """Callback for :method:`self.flush`."""
-        self._flushed = True
+        self._flushed.set()
 
 
 class RepSocketChannel(ZmqSocketChannel):
@@ -526,8 +607,14 @@ class HBSocketChannel(ZmqSocketChannel):
         super(HBSocketChannel, self).__init__(context, session, address)
         self._running = False
         self._pause = True
+        # Set whenever the channel should wake up from a wait: when it is
+        # unpaused or stopped.
+        self._wake = Event()
 
     def _create_socket(self):
+        if self.socket is not None:
+            self.poller.unregister(self.socket)
+            self.socket.close(linger=0)
         self.socket = self.context.socket(zmq.REQ)
         self.socket.setsockopt(zmq.IDENTITY, self.session.session)
         self.socket.connect('tcp://%s:%i' % self.address)
@@ -540,54 +627,35 @@ class HBSocketChannel(ZmqSocketChannel):
         self._running = True
         while self._running:
             if self._pause:
-                time.sleep(self.time_to_dead)
-            else:
-                since_last_heartbeat = 0.0
-                request_time = time.time()
-                try:
-                    #io.rprint('Ping from HB channel') # dbg
-                    self.socket.send_json('ping')
-                except zmq.ZMQError, e:
-                    #io.rprint('*** HB Error:', e) # dbg
-                    if e.errno == zmq.EFSM:
-                        #io.rprint('sleep...', self.time_to_dead) # dbg
-                        time.sleep(self.time_to_dead)
-                        self._create_socket()
-                    else:
-                        raise
+                # Sleep until unpaused or stopped
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            request_time = time.time()
+            # The heart echoes back whatever it gets: a few raw bytes are
+            # enough, no need to serialize anything.
+            self.socket.send('ping')
+            deadline = request_time + self.time_to_dead
+            while self._running:
+                # When the return value of poll() is an empty list, that is
+                # when things have gone wrong (zeromq bug). As long as it is
+                # not an empty list, poll is working correctly even if it
+                # returns quickly. Note: poll timeout is in milliseconds.
+                until_dead = deadline - time.time()
+                if until_dead > 0.0 and not self.poller.poll(1000*until_dead):
+                    continue
+                if until_dead > 0.0:
+                    self.socket.recv(zmq.NOBLOCK)
+                    # Wait for the next beat, unless stopped meanwhile
+                    self._wake.wait(deadline - time.time())
+                    self._wake.clear()
                 else:
-                    while True:
-                        try:
-                            self.socket.recv_json(zmq.NOBLOCK)
-                        except zmq.ZMQError, e:
-                            #io.rprint('*** HB Error 2:', e) # dbg
-                            if e.errno == zmq.EAGAIN:
-                                before_poll = time.time()
-                                until_dead = self.time_to_dead - (before_poll -
-                                                                  request_time)
-
-                                # When the return value of poll() is an empty
-                                # list, that is when things have gone wrong
-                                # (zeromq bug). As long as it is not an empty
-                                # list, poll is working correctly even if it
-                                # returns quickly. Note: poll timeout is in
-                                # milliseconds.
-                                self.poller.poll(1000*until_dead)
-                            
-                                since_last_heartbeat = time.time()-request_time
-                                if since_last_heartbeat > self.time_to_dead:
-                                    self.call_handlers(since_last_heartbeat)
-                                    break
-                            else:
-                                # FIXME: We should probably log this instead.
-                                raise
-                        else:
-                            until_dead = self.time_to_dead - (time.time() -
-                                                              request_time)
-                            if until_dead > 0.0:
-                                #io.rprint('sleep...', self.time_to_dead) # dbg
-                                time.sleep(until_dead)
-                            break
+                    if not self._pause:
+                        self.call_handlers(time.time() - request_time)
+                    # The REQ socket can't send again before it gets an
+                    # answer, start over with a new one.
+                    self._create_socket()
+                break
 
     def pause(self):
         """Pause the heartbeat."""
@@ -596,6 +664,7 @@ class HBSocketChannel(ZmqSocketChannel):
     def unpause(self):
         """Unpause the heartbeat."""
         self._pause = False
+        self._wake.set()
 
     def is_beating(self):
         """Is the heartbeat running and not paused."""
@@ -606,6 +675,7 @@ class HBSocketChannel(ZmqSocketChannel):
 
     def stop(self):
         self._running = False
+        self._wake.set()
         super(HBSocketChannel, self).stop()
 
     def call_handlers(self, since_last_heartbeat):
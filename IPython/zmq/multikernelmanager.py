@@ -0,0 +1,405 @@
+"""A manager for many kernels, driven by a single event loop.
+
+A :class:`KernelManager` with its channels started uses four threads, each
+with its own ioloop, per kernel.  The :class:`MultiKernelManager` instead
+multiplexes the channels and heartbeats of all its kernels over one ioloop,
+run in a single thread, so that hosting hundreds of kernels doesn't mean
+running more than a thousand threads.
+"""
+
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Standard library imports.
+import sys
+from threading import Thread, Lock, Event
+import time
+import uuid
+
+# System library imports.
+import zmq
+from zmq import POLLIN
+from zmq.eventloop import ioloop
+
+# Local imports.
+from IPython.utils.traitlets import HasTraits, Instance, Float, Type
+from heartmonitor import HeartMonitor
+from kernelmanager import KernelManager, validate_string_list, \
+    validate_string_dict
+from session import Session, recv_message
+
+#-----------------------------------------------------------------------------
+# Classes
+#-----------------------------------------------------------------------------
+
+class KernelChannels(object):
+    """The sockets connecting a :class:`MultiKernelManager` to one kernel.
+
+    The sockets are created, used and closed in the ioloop thread only.
+    """
+
+    def __init__(self, kernel_id, manager):
+        self.kernel_id = kernel_id
+        # The KernelManager is only used to manage the kernel process and
+        # hold its addresses, its channels are never started.
+        self.manager = manager
+        self.xreq = None
+        self.sub = None
+        self.rep = None
+
+    def connect(self, context, session, ioloop, recv_handler):
+        """Create the sockets and register them with the ioloop."""
+        identity = session.session
+        for name, socket_type in [('xreq', zmq.XREQ), ('sub', zmq.SUB),
+                                  ('rep', zmq.XREQ)]:
+            socket = context.socket(socket_type)
+            socket.setsockopt(zmq.IDENTITY, identity)
+            if socket_type == zmq.SUB:
+                socket.setsockopt(zmq.SUBSCRIBE, '')
+            address = getattr(self.manager, name + '_address')
+            socket.connect('tcp://%s:%i' % address)
+            setattr(self, name, socket)
+            ioloop.add_handler(socket, self._make_handler(name, recv_handler),
+                               POLLIN)
+
+    def close(self, ioloop):
+        """Unregister and close all the sockets."""
+        for name in ('xreq', 'sub', 'rep'):
+            socket = getattr(self, name)
+            if socket is not None:
+                ioloop.remove_handler(socket)
+                socket.close(linger=0)
+                setattr(self, name, None)
+
+    def _make_handler(self, channel, recv_handler):
+        def handle_events(socket, events):
+            # Get all of the messages we can
+            while True:
+                try:
+                    msg = recv_message(socket, zmq.NOBLOCK)
+                except zmq.ZMQError, e:
+                    if e.errno == zmq.EAGAIN:
+                        break
+                    raise
+                recv_handler(self.kernel_id, channel, msg)
+        return handle_events
+
+
+class MultiKernelManager(HasTraits):
+    """Launch, track and talk to many kernels from one thread.
+
+    Kernels are identified by their kernel id, a string.  All the sockets
+    used to talk to them are handled by :attr:`ioloop`, which runs in a
+    single thread started by :meth:`start`.  The public methods can be called
+    from any thread: they hand the socket work over to the ioloop thread.
+
+    Incoming messages are passed to the handlers registered with
+    :meth:`register_handler`, as ``handler(kernel_id, channel, msg)`` where
+    channel is one of 'xreq' (replies to requests), 'sub' (messages published
+    by the kernel) and 'rep' (raw_input requests).  The heartbeats of all
+    the kernels are checked by :attr:`heart_monitor`, a :class:`HeartMonitor`
+    running in the same ioloop; kernels which don't answer them for
+    :attr:`time_to_dead` seconds are passed to the handlers registered with
+    :meth:`register_dead_handler` as ``handler(kernel_id, since_last_beat)``.
+    Handlers are called in the ioloop thread.
+    """
+
+    # The PyZMQ Context to use for communication with the kernels.
+    context = Instance(zmq.Context, (), {})
+
+    # The Session to use for communication with the kernels.
+    session = Instance(Session, (), {})
+
+    # The ioloop driving all the sockets.
+    ioloop = Instance(ioloop.IOLoop, (), {})
+
+    # The class used to launch and manage each kernel process.
+    kernel_manager_class = Type(KernelManager)
+
+    # Seconds without a heartbeat after which a kernel is considered dead.
+    time_to_dead = Float(3.0)
+
+    # Seconds between two heartbeats.
+    heartbeat_period = Float(1.0)
+
+    def __init__(self, **kwargs):
+        super(MultiKernelManager, self).__init__(**kwargs)
+        self._kernels = {}
+        self._handlers = []
+        self._thread = None
+        self._lock = Lock()
+        self.heart_monitor = HeartMonitor(self.context, loop=self.ioloop,
+                                          period=self.heartbeat_period,
+                                          time_to_dead=self.time_to_dead)
+
+    #--------------------------------------------------------------------------
+    # Event loop management:
+    #--------------------------------------------------------------------------
+
+    def start(self):
+        """Start the ioloop thread, if it isn't running yet."""
+        if self._thread is not None:
+            return
+        self.heart_monitor.start()
+        self._thread = Thread(target=self.ioloop.start)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the ioloop thread and close the sockets of all the kernels.
+
+        The kernels themselves keep running, see :meth:`shutdown_all`.
+        """
+        if self._thread is None:
+            return
+        self.heart_monitor.stop()
+        def close_all():
+            for kernel in self._kernels.values():
+                kernel.close(self.ioloop)
+            self.ioloop.stop()
+        self.ioloop.add_callback(close_all)
+        self._thread.join()
+        self._thread = None
+
+    def call_in_loop(self, func, *args, **kw):
+        """Call func(*args, **kw) in the ioloop thread, and return its result.
+
+        This blocks until the call is done.
+        """
+        if self._thread is None or self._thread.ident is None:
+            raise RuntimeError('The ioloop of the manager is not running.')
+        result = []
+        done = Event()
+        def callback():
+            try:
+                result.append(func(*args, **kw))
+            finally:
+                done.set()
+        self.ioloop.add_callback(callback)
+        done.wait()
+        return result[0] if result else None
+
+    #--------------------------------------------------------------------------
+    # Handlers:
+    #--------------------------------------------------------------------------
+
+    def register_handler(self, handler):
+        """Call handler(kernel_id, channel, msg) for incoming messages."""
+        with self._lock:
+            if handler not in self._handlers:
+                self._handlers.append(handler)
+
+    def unregister_handler(self, handler):
+        """Stop calling handler for incoming messages."""
+        with self._lock:
+            if handler in self._handlers:
+                self._handlers.remove(handler)
+
+    def register_dead_handler(self, handler):
+        """Call handler(kernel_id, since_last_beat) for unresponsive kernels."""
+        with self._lock:
+            if handler not in self.heart_monitor.dead_handlers:
+                self.heart_monitor.dead_handlers.append(handler)
+
+    def unregister_dead_handler(self, handler):
+        """Stop calling handler for unresponsive kernels."""
+        with self._lock:
+            if handler in self.heart_monitor.dead_handlers:
+                self.heart_monitor.dead_handlers.remove(handler)
+
+    def _dispatch(self, kernel_id, channel, msg):
+        for handler in list(self._handlers):
+            handler(kernel_id, channel, msg)
+
+    #--------------------------------------------------------------------------
+    # Kernel management:
+    #--------------------------------------------------------------------------
+
+    def start_kernel(self, kernel_id=None, **kw):
+        """Start a new kernel and connect to it.
+
+        The keyword arguments are passed to
+        :meth:`KernelManager.start_kernel`.  Returns the id of the kernel.
+        """
+        km = self.kernel_manager_class(context=self.context,
+                                       session=self.session)
+        km.start_kernel(**kw)
+        return self.add_kernel(km, kernel_id)
+
+    def add_kernel(self, km, kernel_id=None):
+        """Connect to the kernel whose addresses are those of km.
+
+        km is a :class:`KernelManager` whose channels are not started, it
+        may not have launched the kernel itself.  Returns the id of the
+        kernel.
+        """
+        if kernel_id is None:
+            kernel_id = str(uuid.uuid4())
+        kernel = KernelChannels(kernel_id, km)
+        with self._lock:
+            if kernel_id in self._kernels:
+                raise KeyError('A kernel with id %r already exists.' %
+                               kernel_id)
+            self._kernels[kernel_id] = kernel
+        self.start()
+        self.ioloop.add_callback(lambda : kernel.connect(
+            self.context, self.session, self.ioloop, self._dispatch))
+        self.heart_monitor.add_heart(kernel_id, km.hb_address)
+        return kernel_id
+
+    def remove_kernel(self, kernel_id):
+        """Disconnect from a kernel, without stopping it.
+
+        Returns its :class:`KernelManager`.
+        """
+        with self._lock:
+            kernel = self._kernels.pop(kernel_id)
+        self.heart_monitor.remove_heart(kernel_id)
+        self.ioloop.add_callback(lambda : kernel.close(self.ioloop))
+        return kernel.manager
+
+    def get_kernel(self, kernel_id):
+        """Return the :class:`KernelManager` of a kernel."""
+        return self._kernels[kernel_id].manager
+
+    @property
+    def kernel_ids(self):
+        """The ids of the managed kernels."""
+        return self._kernels.keys()
+
+    def __len__(self):
+        return len(self._kernels)
+
+    def __contains__(self, kernel_id):
+        return kernel_id in self._kernels
+
+    def is_alive(self, kernel_id):
+        """Is the kernel process still running?"""
+        return self.get_kernel(kernel_id).is_alive
+
+    def last_beat(self, kernel_id):
+        """Time of the last heartbeat received from the kernel, or None."""
+        return self.heart_monitor.last_beat(kernel_id)
+
+    def shutdown_kernel(self, kernel_id, restart=False):
+        """Ask a kernel to shut down, and kill it if it doesn't within 1s.
+
+        Unless restart is True, the kernel is then removed from the manager.
+        """
+        km = self.get_kernel(kernel_id)
+        self.heart_monitor.remove_heart(kernel_id)
+        if sys.platform == 'win32':
+            # FIXME: Shutdown does not work on Windows due to ZMQ errors!
+            km.kill_kernel()
+        else:
+            self.send(kernel_id, 'shutdown_request', {'restart':restart})
+            for i in range(10):
+                if km.is_alive:
+                    time.sleep(0.1)
+                else:
+                    break
+            else:
+                # OK, we've waited long enough.
+                if km.has_kernel:
+                    km.kill_kernel()
+        if not restart:
+            self.remove_kernel(kernel_id)
+
+    def shutdown_all(self):
+        """Shut down all the kernels."""
+        for kernel_id in self.kernel_ids:
+            self.shutdown_kernel(kernel_id)
+
+    def restart_kernel(self, kernel_id, now=False):
+        """Restart a kernel with the arguments used to launch it.
+
+        The new kernel uses the same ports, so that the sockets connected to
+        the old one just reconnect to it.  See
+        :meth:`KernelManager.restart_kernel` for the meaning of now.
+        """
+        km = self.get_kernel(kernel_id)
+        if km._launch_args is None:
+            raise RuntimeError("Cannot restart the kernel. "
+                               "No previous call to 'start_kernel'.")
+        self.heart_monitor.remove_heart(kernel_id)
+        if km.has_kernel:
+            if now:
+                km.kill_kernel()
+            else:
+                self.shutdown_kernel(kernel_id, restart=True)
+        km.start_kernel(**km._launch_args)
+        self.heart_monitor.add_heart(kernel_id, km.hb_address)
+
+    def kill_kernel(self, kernel_id):
+        """Kill a kernel and remove it from the manager."""
+        self.get_kernel(kernel_id).kill_kernel()
+        self.remove_kernel(kernel_id)
+
+    def interrupt_kernel(self, kernel_id):
+        """Interrupt a kernel."""
+        self.get_kernel(kernel_id).interrupt_kernel()
+
+    def signal_kernel(self, kernel_id, signum):
+        """Send a signal to a kernel."""
+        self.get_kernel(kernel_id).signal_kernel(signum)
+
+    #--------------------------------------------------------------------------
+    # Messaging:
+    #--------------------------------------------------------------------------
+
+    def send(self, kernel_id, msg_type, content=None, channel='xreq'):
+        """Send a message to a kernel, returns its msg_id.
+
+        channel is 'xreq' for requests, or 'rep' for replies to the raw_input
+        requests of the kernel.
+        """
+        kernel = self._kernels[kernel_id]
+        msg = self.session.msg(msg_type, content)
+        def send_msg():
+            socket = getattr(kernel, channel)
+            if socket is not None:
+                socket.send_json(msg)
+        self.ioloop.add_callback(send_msg)
+        return msg['header']['msg_id']
+
+    def execute(self, kernel_id, code, silent=False,
+                user_variables=None, user_expressions=None):
+        """Execute code in a kernel, returns the msg_id of the request.
+
+        See :meth:`XReqSocketChannel.execute`.
+        """
+        if user_variables is None:
+            user_variables = []
+        if user_expressions is None:
+            user_expressions = {}
+        if not isinstance(code, basestring):
+            raise ValueError('code %r must be a string' % code)
+        validate_string_list(user_variables)
+        validate_string_dict(user_expressions)
+        content = dict(code=code, silent=silent,
+                       user_variables=user_variables,
+                       user_expressions=user_expressions)
+        return self.send(kernel_id, 'execute_request', content)
+
+    def complete(self, kernel_id, text, line, cursor_pos, block=None):
+        """Tab complete text in a kernel's namespace."""
+        content = dict(text=text, line=line, block=block,
+                       cursor_pos=cursor_pos)
+        return self.send(kernel_id, 'complete_request', content)
+
+    def object_info(self, kernel_id, oname):
+        """Get metadata information about an object in a kernel."""
+        return self.send(kernel_id, 'object_info_request', dict(oname=oname))
+
+    def input(self, kernel_id, string):
+        """Send a string of raw input to a kernel."""
+        return self.send(kernel_id, 'input_reply', dict(value=string),
+                         channel='rep')
@@ -28,7 +28,7 @@ import zmq
 from IPython.utils.traitlets import HasTraits, Instance
 from completer import KernelCompleter
 from entry_point import base_launch_kernel, make_default_main
-from session import Session, Message
+from session import Session, Message, recv_message
 
 #-----------------------------------------------------------------------------
 # Main kernel class
@@ -71,7 +71,7 @@ class Kernel(HasTraits):
         while True:
             ident = self.reply_socket.recv()
             assert self.reply_socket.rcvmore(), "Missing message part."
-            msg = self.reply_socket.recv_json()
+            msg = recv_message(self.reply_socket)
             omsg = Message(msg)
             print>>sys.__stdout__
             print>>sys.__stdout__, omsg
@@ -186,7 +186,7 @@ class Kernel(HasTraits):
                     break
             else:
                 assert self.reply_socket.rcvmore(), "Missing message part."
-                msg = self.reply_socket.recv_json()
+                msg = recv_message(self.reply_socket)
             print>>sys.__stdout__, "Aborting:"
             print>>sys.__stdout__, Message(msg)
             msg_type = msg['msg_type']
@@ -210,7 +210,7 @@ class Kernel(HasTraits):
         self.req_socket.send_json(msg)
 
         # Await a response.
-        reply = self.req_socket.recv_json()
+        reply = recv_message(self.req_socket)
         try:
             value = reply['content']['value']
         except:
@@ -1,8 +1,58 @@
 import os
 import uuid
 import pprint
+import time
+import zlib
 
 import zmq
+from zmq.utils import jsonapi
+
+#-----------------------------------------------------------------------------
+# Compression
+#-----------------------------------------------------------------------------
+
+# The codecs messages can be compressed with, as (compress, decompress)
+# function pairs by name.  zlib is always there, faster codecs are used if
+# they're installed.
+codecs = {'zlib' : (zlib.compress, zlib.decompress)}
+
+try:
+    import lz4
+except ImportError:
+    pass
+else:
+    codecs['lz4'] = (lz4.compress, lz4.decompress)
+
+try:
+    import snappy
+except ImportError:
+    pass
+else:
+    codecs['snappy'] = (snappy.compress, snappy.decompress)
+
+
+def compress_frame(data, codec):
+    """Compress a frame of data with the codec of the given name.
+
+    The compressed frame starts with a null byte and the name of the codec, so
+    that it can't be mistaken for a JSON message.
+    """
+    return '\0%s\0%s' % (codec, codecs[codec][0](data))
+
+
+def decompress_frame(frame):
+    """Return the data of a frame, decompressing it if it is compressed."""
+    if not frame.startswith('\0'):
+        return frame
+    end = frame.index('\0', 1)
+    codec = frame[1:end]
+    if codec not in codecs:
+        raise ValueError('Unknown compression codec: %r' % codec)
+    return codecs[codec][1](frame[end+1:])
+
+#-----------------------------------------------------------------------------
+# Messages
+#-----------------------------------------------------------------------------
 
 class Message(object):
     """A simple message object that maps dict keys to attributes.
@@ -42,6 +92,20 @@ def msg_header(msg_id, username, session):
     }
 
 
+def recv_message(socket, mode=0):
+    """Receive a JSON message, with any raw buffers sent after it.
+
+    The message is decompressed if it was compressed by the sending
+    :class:`Session`.  The buffers are stored as a list in the 'buffers' key
+    of the message, which is absent if there were none.
+    """
+    frames = socket.recv_multipart(mode)
+    msg = jsonapi.loads(decompress_frame(frames[0]))
+    if len(frames) > 1:
+        msg['buffers'] = frames[1:]
+    return msg
+
+
 def extract_header(msg_or_header):
     """Given a message or header, return the header."""
     if not msg_or_header:
@@ -63,17 +127,63 @@ def extract_header(msg_or_header):
 
 
 class Session(object):
+    """Build and send messages.
+
+    Messages of at least `compression_threshold` bytes are compressed with
+    the first codec of `compression` which their receivers can decode.  The
+    headers of the messages list the codecs their sender decodes, and the
+    codecs of the peers are recorded by :meth:`add_peer`, so that replies are
+    compressed for the session of their parent request.  Nothing is
+    compressed for unknown peers.
 
-    def __init__(self, username=os.environ.get('USER','username'), session=None):
+    Published messages can be received by subscribers which never sent a
+    request, so they are only compressed with `publish_compression`, a codec
+    which all the subscribers must be able to decode.
+    """
+
+    def __init__(self, username=os.environ.get('USER','username'), session=None,
+                 compression=None, compression_threshold=4096,
+                 publish_compression=None):
         self.username = username
         if session is None:
             self.session = str(uuid.uuid4())
         else:
             self.session = session
         self.msg_id = 0
+        # An object keeping the messages published with this session, with
+        # an add(msg, buffers, nbytes) method
+        self.cache = None
+        # The names of the codecs to compress messages with, by preference
+        self.compression = [c for c in compression or [] if c in codecs]
+        self.compression_threshold = compression_threshold
+        # The codec to compress published messages with, if any
+        if publish_compression is not None and \
+                publish_compression not in codecs:
+            raise ValueError('Unknown compression codec: %r' %
+                             publish_compression)
+        self.publish_compression = publish_compression
+        # The codecs the peers can decode, by session
+        self.peer_codecs = {}
+        # Counts of the messages sent and compressed, of their bytes before
+        # and after compression, and the CPU time spent compressing them
+        self.stats = dict(messages=0, compressed=0, bytes=0, bytes_sent=0,
+                          compress_time=0.0)
+
+    @property
+    def compression_ratio(self):
+        """The ratio of the bytes sent to the bytes of the messages."""
+        stats = self.stats
+        if not stats['bytes']:
+            return 1.0
+        return float(stats['bytes_sent']) / stats['bytes']
+
+    def add_peer(self, header):
+        """Record the codecs of the sender of a message, from its header."""
+        self.peer_codecs[header['session']] = set(header.get('codecs', ()))
 
     def msg_header(self):
         h = msg_header(self.msg_id, self.username, self.session)
+        h['codecs'] = sorted(codecs)
         self.msg_id += 1
         return h
 
@@ -85,26 +195,73 @@ class Session(object):
         msg['content'] = {} if content is None else content
         return msg
 
-    def send(self, socket, msg_type, content=None, parent=None, ident=None):
+    def send(self, socket, msg_type, content=None, parent=None, ident=None,
+             buffers=None):
         msg = self.msg(msg_type, content, parent)
-        if ident is not None:
-            socket.send(ident, zmq.SNDMORE)
-        socket.send_json(msg)
+        self.send_message(socket, msg, buffers, ident)
         omsg = Message(msg)
         return omsg
 
+    def send_message(self, socket, msg, buffers=None, ident=None):
+        """Send a message as JSON, followed by raw buffers in frames of their
+        own.  It is compressed for the session of its parent.
+
+        Returns the number of bytes of the message, before compression.
+        """
+        peer = self.peer_codecs.get(msg['parent_header'].get('session'), ())
+        for codec in self.compression:
+            if codec in peer:
+                break
+        else:
+            codec = None
+        if ident is not None:
+            socket.send(ident, zmq.SNDMORE)
+        return self._send(socket, msg, buffers, codec)
+
+    def publish(self, socket, msg, buffers=None):
+        """Send a message on a PUB socket, and keep it in the cache if any.
+
+        It is only compressed if `publish_compression` is set.
+        """
+        nbytes = self._send(socket, msg, buffers, self.publish_compression)
+        if self.cache is not None:
+            self.cache.add(msg, buffers, nbytes)
+
     def recv(self, socket, mode=zmq.NOBLOCK):
         try:
-            msg = socket.recv_json(mode)
+            msg = recv_message(socket, mode)
         except zmq.ZMQError, e:
             if e.errno == zmq.EAGAIN:
                 # We can convert EAGAIN to None as we know in this case
-                # recv_json won't return None.
+                # recv_message won't return None.
                 return None
             else:
                 raise
         return Message(msg)
 
+    def _send(self, socket, msg, buffers, codec):
+        data = jsonapi.dumps(msg)
+        nbytes = len(data)
+        stats = self.stats
+        stats['messages'] += 1
+        stats['bytes'] += nbytes
+        if codec is not None and nbytes >= self.compression_threshold:
+            start = time.clock()
+            compressed = compress_frame(data, codec)
+            stats['compress_time'] += time.clock() - start
+            if len(compressed) < nbytes:
+                stats['compressed'] += 1
+                data = compressed
+        stats['bytes_sent'] += len(data)
+        if not buffers:
+            socket.send(data)
+            return nbytes
+        socket.send(data, zmq.SNDMORE)
+        for buf in buffers[:-1]:
+            socket.send(buf, zmq.SNDMORE)
+        socket.send(buffers[-1])
+        return nbytes + sum(len(buf) for buf in buffers)
+
 def test_msg2obj():
     am = dict(x=1)
     ao = Message(am)
@@ -0,0 +1,113 @@
+"""Tests for the blocking kernel manager channels.
+
+The channels are fed directly, as their ioloop thread would, so that these
+tests don't need a running kernel.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+# Stdlib imports
+from Queue import Empty
+from threading import Timer
+import threading
+import time
+
+# Third-party imports
+import nose.tools as nt
+
+# Our own imports
+from ..blockingkernelmanager import BlockingKernelManager
+from IPython.utils.localinterfaces import LOCALHOST
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+def make_km():
+    # The ports are never connected to, the channels are not started.
+    return BlockingKernelManager(xreq_address=(LOCALHOST, 1),
+                                 sub_address=(LOCALHOST, 2),
+                                 rep_address=(LOCALHOST, 3),
+                                 hb_address=(LOCALHOST, 4))
+
+
+def msg(msg_type, parent_id, **content):
+    return dict(header=dict(msg_id='reply'), msg_type=msg_type,
+                parent_header=dict(msg_id=parent_id), content=content)
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_get_msg():
+    channel = make_km().sub_channel
+    nt.assert_false(channel.msg_ready())
+    nt.assert_raises(Empty, channel.get_msg, block=False)
+    nt.assert_raises(Empty, channel.get_msg, timeout=0.01)
+    msgs = [msg('stream', 'a', data=str(i)) for i in range(3)]
+    for m in msgs:
+        channel.call_handlers(m)
+    nt.assert_true(channel.msg_ready())
+    nt.assert_equal(channel.get_msg(), msgs[0])
+    nt.assert_equal(channel.get_msgs(), msgs[1:])
+    nt.assert_false(channel.msg_ready())
+
+
+def test_wait_for_reply():
+    channel = make_km().xreq_channel
+    channel.call_handlers(msg('execute_reply', 'other'))
+    reply = msg('execute_reply', 'mine')
+    # Arrives while waiting
+    Timer(0.05, channel.call_handlers, [reply]).start()
+    nt.assert_equal(channel.wait_for_reply('mine', timeout=5), reply)
+    nt.assert_raises(Empty, channel.wait_for_reply, 'mine', 0.01)
+    # Replies to other requests are left alone
+    nt.assert_equal(channel.get_msgs(), [msg('execute_reply', 'other')])
+
+
+def test_timeout():
+    channel = make_km().xreq_channel
+    time.sleep(0.2)
+    threads = threading.active_count()
+    # Messages for other requests wake the waiter but don't extend the wait
+    for i in range(5):
+        Timer(0.02*i, channel.call_handlers,
+              [msg('execute_reply', 'other')]).start()
+    start = time.time()
+    nt.assert_raises(Empty, channel.wait_for_reply, 'mine', 0.2)
+    nt.assert_true(time.time() - start < 2)
+    nt.assert_equal(len(channel.get_msgs()), 5)
+    # The timer of a wait that is satisfied is cancelled
+    Timer(0.02, channel.call_handlers, [msg('execute_reply', 'mine')]).start()
+    channel.wait_for_reply('mine', timeout=60)
+    time.sleep(0.2)
+    nt.assert_equal(threading.active_count(), threads)
+
+
+def test_execute_and_wait():
+    km = make_km()
+    def reply():
+        # The request is queued for the (not running) channel thread
+        msg_id = km.xreq_channel.command_queue.get()['header']['msg_id']
+        km.sub_channel.call_handlers(msg('status', msg_id,
+                                         execution_state='busy'))
+        km.sub_channel.call_handlers(msg('pyin', msg_id, code='a = 1'))
+        km.sub_channel.call_handlers(msg('stream', 'other', data='x'))
+        km.xreq_channel.call_handlers(msg('execute_reply', msg_id,
+                                          status='ok'))
+        km.sub_channel.call_handlers(msg('status', msg_id,
+                                         execution_state='idle'))
+    Timer(0.05, reply).start()
+    reply, output = km.execute_and_wait('a = 1', timeout=5)
+    nt.assert_equal(reply['content'], dict(status='ok'))
+    nt.assert_equal([m['msg_type'] for m in output], ['pyin'])
+    nt.assert_equal(km.sub_channel.get_msgs(), [msg('stream', 'other',
+                                                    data='x')])
@@ -0,0 +1,96 @@
+"""Tests for the heartbeat monitor.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import time
+
+import nose.tools as nt
+import zmq
+
+from ..entry_point import bind_port
+from ..heartbeat import Heartbeat
+from ..heartmonitor import HeartMonitor
+from IPython.utils.localinterfaces import LOCALHOST
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+def wait_for(condition, timeout=5):
+    """Wait until condition() is true, failing after timeout seconds."""
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('Timed out waiting for %s' %
+                                 condition.__doc__)
+        time.sleep(0.01)
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_heartmonitor():
+    context = zmq.Context()
+    hb = Heartbeat(context)
+    hb.start()
+    # A heart which only answers when the test says so
+    stuck = context.socket(zmq.REP)
+    stuck_port = bind_port(stuck, LOCALHOST, 0)
+    while hb.port == 0:
+        time.sleep(0.01)
+
+    monitor = HeartMonitor(context, period=0.05, time_to_dead=0.3,
+                           slow_latency=0.2)
+    events = []
+    monitor.dead_handlers.append(lambda *args: events.append(('dead',)+args))
+    monitor.revive_handlers.append(lambda key: events.append(('revive', key)))
+    monitor.slow_handlers.append(lambda *args: events.append(('slow',)+args))
+    monitor.add_heart('alive', (LOCALHOST, hb.port))
+    monitor.add_heart('stuck', (LOCALHOST, stuck_port))
+    monitor.start()
+    def answer():
+        while stuck.poll(0):
+            stuck.send(stuck.recv())
+
+    try:
+        def stuck_dead():
+            """the stuck heart to die"""
+            return (monitor.dead_hearts == ['stuck'] and
+                    monitor.latency('alive')[99] is not None)
+        wait_for(stuck_dead)
+        nt.assert_false(monitor.is_dead('alive'))
+        nt.assert_equal([e[:2] for e in events], [('dead', 'stuck')])
+        latency = monitor.latency('alive')
+        nt.assert_true(0 < latency[50] <= latency[99] < 0.2)
+        nt.assert_equal(monitor.latency('stuck'), {50: None, 90: None,
+                                                   99: None})
+        # The stuck heart answers all the pings at once, the oldest ones are
+        # too old to be counted, the next ones are slow.  It keeps answering
+        # from then on.
+        def stuck_revived():
+            """the stuck heart to be revived"""
+            answer()
+            return not monitor.dead_hearts and len(events) > 2
+        wait_for(stuck_revived)
+        nt.assert_equal(events[1], ('revive', 'stuck'))
+        for event in events[2:]:
+            nt.assert_equal(event[:2], ('slow', 'stuck'))
+            nt.assert_true(event[2] > 0.2)
+        monitor.remove_heart('alive')
+        def alive_removed():
+            """the alive heart to be removed"""
+            answer()
+            return monitor.hearts.keys() == ['stuck']
+        wait_for(alive_removed)
+    finally:
+        monitor.stop()
+        stuck.close()
@@ -0,0 +1,107 @@
+"""Tests for the output streams of the kernel.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import time
+
+import nose.tools as nt
+import zmq
+
+from ..iostream import OutStream, split_chunks
+from ..session import Session, recv_message
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+def setup():
+    global context, pub, sub
+    context = zmq.Context()
+    pub = context.socket(zmq.PUB)
+    pub.bind('inproc://test_iostream')
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.SUBSCRIBE, '')
+    sub.connect('inproc://test_iostream')
+    # Let the subscription go through
+    time.sleep(0.1)
+
+
+def teardown():
+    pub.close()
+    sub.close()
+    context.term()
+
+
+def recv_all():
+    msgs = []
+    while True:
+        try:
+            msgs.append(recv_message(sub, zmq.NOBLOCK))
+        except zmq.ZMQError:
+            return msgs
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_split_chunks():
+    nt.assert_equal(split_chunks('abcdefg', 3), ['abc', 'def', 'g'])
+    nt.assert_equal(split_chunks('', 3), [''])
+    # Multibyte characters aren't cut
+    data = u'a\xe9\u20ac'.encode('utf-8') * 2
+    chunks = split_chunks(data, 4)
+    nt.assert_equal(''.join(chunks), data)
+    for chunk in chunks:
+        chunk.decode('utf-8')
+    # Unless there's no character boundary to cut at
+    nt.assert_equal(split_chunks('\xbf' * 5, 2), ['\xbf\xbf'] * 2 + ['\xbf'])
+
+
+def test_chunks():
+    stream = OutStream(Session(), pub, 'stdout')
+    stream.chunk_size = 100
+    stream.write('x' * 250)
+    stream.flush()
+    msgs = recv_all()
+    nt.assert_equal([len(m['content']['data']) for m in msgs], [100, 100, 50])
+    nt.assert_equal([m['content']['seq'] for m in msgs], [0, 1, 2])
+    nt.assert_equal([m['content']['offset'] for m in msgs], [0, 100, 200])
+    nt.assert_false('buffers' in msgs[0])
+    # The buffer is flushed as soon as it holds a chunk
+    stream.write('y' * 100)
+    nt.assert_equal(len(recv_all()), 1)
+
+
+def test_binary():
+    stream = OutStream(Session(), pub, 'stdout')
+    stream.write(u'\xe9'.encode('latin-1'))
+    stream.write(u'\xe9')
+    stream.flush()
+    msg = recv_all()[0]
+    nt.assert_true(msg['content']['binary'])
+    nt.assert_equal(msg['content']['data'], u'\ufffd\xe9')
+    nt.assert_equal(msg['buffers'], ['\xe9\xc3\xa9'])
+
+
+def test_get_range():
+    stream = OutStream(Session(), pub, 'stdout')
+    stream.chunk_size = 10
+    stream.history_size = 30
+    nt.assert_equal(stream.get_range(0), (0, ''))
+    data = ''.join(str(i % 10) for i in range(55))
+    stream.write(data)
+    stream.flush()
+    recv_all()
+    nt.assert_equal(stream.get_range(42), (42, data[42:]))
+    nt.assert_equal(stream.get_range(55), (55, ''))
+    # Only the chunks with the last 30 bytes are kept
+    nt.assert_equal(stream.get_range(0), (20, data[20:]))
@@ -0,0 +1,242 @@
+"""Tests for the request queue of the IPython kernel.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import sys
+import time
+
+import nose.tools as nt
+import zmq
+
+from ..iostream import OutStream
+from ..ipkernel import Kernel, MessageCache, RequestQueue, abort_matcher
+from ..session import Session, recv_message
+from IPython.config.configurable import Configurable
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+class QueueKernel(Kernel):
+    """A kernel without a shell, enough to test the handling of its queue."""
+
+    def __init__(self, **kwargs):
+        Configurable.__init__(self, **kwargs)
+        self._queue = RequestQueue()
+        self.message_cache = MessageCache()
+        self.session.cache = self.message_cache
+
+
+def setup():
+    global context, kernel, client, sub
+    context = zmq.Context()
+    reply_socket = context.socket(zmq.XREP)
+    reply_socket.bind('inproc://test_ipkernel_xrep')
+    pub_socket = context.socket(zmq.PUB)
+    pub_socket.bind('inproc://test_ipkernel_pub')
+    kernel = QueueKernel(session=Session(), reply_socket=reply_socket,
+                         pub_socket=pub_socket)
+    client = context.socket(zmq.XREQ)
+    client.setsockopt(zmq.IDENTITY, 'client')
+    client.connect('inproc://test_ipkernel_xrep')
+    sub = context.socket(zmq.SUB)
+    sub.setsockopt(zmq.SUBSCRIBE, '')
+    sub.connect('inproc://test_ipkernel_pub')
+
+
+def teardown():
+    for socket in [client, sub, kernel.reply_socket, kernel.pub_socket]:
+        socket.close()
+    context.term()
+
+
+def queue_requests(session, *msg_types):
+    """Put requests in the kernel queue, as if received by the client."""
+    msgs = [session.msg(msg_type, {}) for msg_type in msg_types]
+    for msg in msgs:
+        priority = kernel.request_priorities[msg['msg_type']]
+        kernel._queue.put(priority, 'client', msg)
+    return [msg['header']['msg_id'] for msg in msgs]
+
+
+def recv_replies(n):
+    replies = []
+    for i in range(n):
+        for j in range(100):
+            try:
+                replies.append(client.recv_json(zmq.NOBLOCK))
+                break
+            except zmq.ZMQError:
+                time.sleep(0.01)
+        else:
+            raise AssertionError('Missing reply %d' % i)
+    return replies
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_request_queue():
+    q = RequestQueue()
+    for i, priority in enumerate([10, 10, 0, 10, 0]):
+        q.put(priority, 'ident', {'n' : i})
+    nt.assert_equal(len(q), 5)
+    removed = q.remove(lambda msg: msg['n'] in (0, 4))
+    nt.assert_equal([msg['n'] for ident, msg in removed], [0, 4])
+    nt.assert_equal([q.get()[1]['n'] for i in range(3)], [2, 1, 3])
+    nt.assert_false(q)
+    nt.assert_raises(IndexError, q.get)
+
+
+def test_abort_matcher():
+    session = Session()
+    msgs = [session.msg(t, {}) for t in ['execute_request']*3 +
+            ['complete_request']]
+    other = Session().msg('execute_request', {})
+    def aborted(content):
+        match = abort_matcher(content, session.session)
+        return [msg['header']['msg_id'] for msg in msgs + [other]
+                if match(msg)]
+    nt.assert_equal(aborted({}), [0, 1, 2])
+    nt.assert_equal(aborted({'msg_ids' : [1, 3]}), [1, 3])
+    nt.assert_equal(aborted({'msg_id_range' : [1, 2]}), [1, 2])
+    nt.assert_equal(aborted({'msg_id_prefix' : '2'}), [2])
+    nt.assert_equal(aborted({'session' : other['header']['session']}), [0])
+
+
+def test_priorities():
+    session = Session()
+    queue_requests(session, 'execute_request', 'execute_request',
+                   'object_info_request', 'complete_request')
+    order = [kernel._queue.get()[1]['msg_type'] for i in range(4)]
+    nt.assert_equal(order, ['object_info_request', 'complete_request',
+                            'execute_request', 'execute_request'])
+
+
+def test_abort_request():
+    session = Session()
+    ids = queue_requests(session, 'execute_request', 'execute_request',
+                         'execute_request', 'complete_request')
+    abort = session.msg('abort_request', {'msg_id_range' : ids[1:3]})
+    kernel.abort_request('client', abort)
+    replies = recv_replies(3)
+    nt.assert_equal([r['msg_type'] for r in replies],
+                    ['execute_reply', 'execute_reply', 'abort_reply'])
+    nt.assert_equal([r['content']['status'] for r in replies],
+                    ['aborted', 'aborted', 'ok'])
+    nt.assert_equal(replies[2]['content']['msg_ids'], ids[1:3])
+    nt.assert_equal(len(kernel._queue), 2)
+    # After an error, all the queued executions are aborted
+    kernel._abort_queue()
+    nt.assert_equal(recv_replies(1)[0]['parent_header']['msg_id'], ids[0])
+    nt.assert_equal(kernel._queue.get()[1]['msg_type'], 'complete_request')
+
+
+def test_queue_depth():
+    queue_requests(Session(), 'execute_request', 'execute_request')
+    # Let the subscription go through
+    time.sleep(0.1)
+    kernel._publish_status(u'busy', None)
+    for i in range(100):
+        try:
+            status = sub.recv_json(zmq.NOBLOCK)
+            break
+        except zmq.ZMQError:
+            time.sleep(0.01)
+    nt.assert_equal(status['content'], {'execution_state' : 'busy',
+                                        'queue_depth' : 2})
+    kernel._queue.remove(lambda msg: True)
+
+
+def test_stream_request():
+    stdout = sys.stdout
+    sys.stdout = OutStream(Session(), kernel.pub_socket, 'stdout')
+    try:
+        print 'missed output'
+        request = Session().msg('stream_request', {'name' : 'stdout',
+                                                   'offset' : 7})
+        kernel.stream_request('client', request)
+    finally:
+        sys.stdout = stdout
+    reply = recv_replies(1)[0]
+    nt.assert_equal(reply['content'], {'status' : 'ok', 'name' : 'stdout',
+                                       'offset' : 7, 'end' : 14,
+                                       'data' : 'output\n'})
+    # Drop the stream message
+    sub.recv_json()
+
+
+def test_message_cache():
+    cache = MessageCache(max_messages=4, max_bytes=100)
+    session, kernel_session = Session(), Session()
+    requests = [session.msg('execute_request', {}) for i in range(3)]
+    for request in requests:
+        for i in range(2):
+            cache.add(kernel_session.msg('stream', {}, request), None, 10)
+    nt.assert_equal(len(cache), 4)
+    nt.assert_equal(cache.nbytes, 40)
+    ids = lambda msgs: [msg['header']['msg_id'] for msg in msgs]
+    nt.assert_equal(ids(cache.get()), [2, 3, 4, 5])
+    nt.assert_equal(ids(cache.get(msg_ids=[0, 5, 3])), [3, 5])
+    nt.assert_equal(ids(cache.get(parent_ids=[1, 2],
+                                  session=session.session)), [2, 3, 4, 5])
+    nt.assert_equal(cache.get(parent_ids=[1], session='other'), [])
+    nt.assert_equal(ids(cache.get(msg_ids=[2], parent_ids=[2],
+                                  session=session.session)), [2, 4, 5])
+    # The size limit drops messages too
+    cache.add(kernel_session.msg('stream', {}), None, 80)
+    nt.assert_equal(ids(cache.get()), [4, 5, 6])
+    nt.assert_equal(cache.get(parent_ids=[1], session=session.session), [])
+    # Raw buffers are kept with their message
+    msg = kernel_session.msg('stream', {'binary' : True})
+    cache.add(msg, ['\xff'], 20)
+    nt.assert_equal(cache.get_with_buffers(msg_ids=[6, 7]),
+                    [(cache.get(msg_ids=[6])[0], []), (msg, ['\xff'])])
+
+
+def test_replay_request():
+    session = Session()
+    request = session.msg('execute_request', {})
+    kernel._publish_status(u'busy', request)
+    kernel._publish_pyin('x', request)
+    replay = session.msg('replay_request',
+                         {'parent_ids' : [request['header']['msg_id']]})
+    kernel.replay_request('client', replay)
+    msgs = recv_replies(1)[0]['content']['messages']
+    nt.assert_equal([msg['msg_type'] for msg in msgs], ['status', 'pyin'])
+    nt.assert_equal(msgs[1]['content'], {'code' : 'x'})
+    for i in range(2):
+        sub.recv_json()
+
+
+def test_replay_buffers():
+    session = Session()
+    request = session.msg('execute_request', {})
+    kernel._publish_pyin('x', request)
+    msg = kernel.session.msg('stream', {'data' : u'\ufffd', 'binary' : True},
+                             request)
+    kernel.session.publish(kernel.pub_socket, msg, ['\xff'])
+    replay = session.msg('replay_request',
+                         {'parent_ids' : [request['header']['msg_id']]})
+    kernel.replay_request('client', replay)
+    for i in range(100):
+        try:
+            reply = recv_message(client, zmq.NOBLOCK)
+            break
+        except zmq.ZMQError:
+            time.sleep(0.01)
+    nt.assert_equal([m['msg_type'] for m in reply['content']['messages']],
+                    ['pyin', 'stream'])
+    nt.assert_equal(reply['content']['nbuffers'], [0, 1])
+    nt.assert_equal(reply['buffers'], ['\xff'])
+    for i in range(2):
+        recv_message(sub)
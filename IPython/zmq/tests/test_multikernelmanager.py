@@ -0,0 +1,106 @@
+"""Tests for the multi-kernel manager.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+from Queue import Queue
+import threading
+import time
+
+import nose.tools as nt
+import zmq
+
+from ..entry_point import bind_port
+from ..heartbeat import Heartbeat
+from ..kernelmanager import KernelManager
+from ..multikernelmanager import MultiKernelManager
+from ..session import Session
+from IPython.utils.localinterfaces import LOCALHOST
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+class FakeKernel(object):
+    """The sockets of a kernel, driven by hand from the test."""
+
+    def __init__(self, context):
+        self.reply_socket = context.socket(zmq.XREP)
+        self.pub_socket = context.socket(zmq.PUB)
+        self.req_socket = context.socket(zmq.XREQ)
+        self.hb = Heartbeat(context)
+        self.hb.start()
+        while self.hb.port == 0:
+            time.sleep(0.01)
+        self.km = KernelManager(
+            context=context,
+            xreq_address=(LOCALHOST, bind_port(self.reply_socket, LOCALHOST, 0)),
+            sub_address=(LOCALHOST, bind_port(self.pub_socket, LOCALHOST, 0)),
+            rep_address=(LOCALHOST, bind_port(self.req_socket, LOCALHOST, 0)),
+            hb_address=(LOCALHOST, self.hb.port))
+        self.session = Session()
+
+    def recv_request(self):
+        nt.assert_true(self.reply_socket.poll(5000))
+        ident, msg = self.reply_socket.recv_multipart()
+        return ident, zmq.utils.jsonapi.loads(msg)
+
+    def reply(self, ident, msg_type, parent):
+        msg = self.session.msg(msg_type, {'status' : 'ok'}, parent)
+        self.reply_socket.send(ident, zmq.SNDMORE)
+        self.reply_socket.send_json(msg)
+        self.pub_socket.send_json(self.session.msg('status', {}, parent))
+
+    def close(self):
+        for socket in (self.reply_socket, self.pub_socket, self.req_socket):
+            socket.close(linger=0)
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_multikernelmanager():
+    mkm = MultiKernelManager(heartbeat_period=0.1, time_to_dead=0.5)
+    received = Queue()
+    mkm.register_handler(lambda kid, channel, msg:
+                         received.put((kid, channel, msg)))
+    kernels = [FakeKernel(mkm.context) for i in range(3)]
+    nthreads = threading.active_count()
+    kids = [mkm.add_kernel(k.km) for k in kernels]
+    try:
+        nt.assert_equal(sorted(mkm.kernel_ids), sorted(kids))
+        # A single thread runs the ioloop for all kernels
+        nt.assert_equal(threading.active_count(), nthreads + 1)
+        # Let the SUB sockets connect
+        time.sleep(0.2)
+        for kid, kernel in zip(kids, kernels):
+            msg_id = mkm.execute(kid, 'x=1')
+            ident, msg = kernel.recv_request()
+            nt.assert_equal(msg['header']['msg_id'], msg_id)
+            nt.assert_equal(msg['content']['code'], 'x=1')
+            kernel.reply(ident, 'execute_reply', msg)
+            replies = [received.get(timeout=5) for i in range(2)]
+            nt.assert_equal(sorted(channel for k, channel, m in replies),
+                            ['sub', 'xreq'])
+            for k, channel, reply in replies:
+                nt.assert_equal(k, kid)
+                nt.assert_equal(reply['parent_header']['msg_id'], msg_id)
+        # All the kernels answer the heartbeat
+        time.sleep(0.5)
+        for kid in kids:
+            nt.assert_true(time.time() - mkm.last_beat(kid) < 0.5)
+        km = mkm.remove_kernel(kids[0])
+        nt.assert_true(km is kernels[0].km)
+        nt.assert_equal(len(mkm), 2)
+    finally:
+        mkm.stop()
+        for kernel in kernels:
+            kernel.close()
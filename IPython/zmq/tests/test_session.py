@@ -0,0 +1,111 @@
+"""Tests for the compression of messages by sessions.
+"""
+#-----------------------------------------------------------------------------
+#  Copyright (C) 2010  The IPython Development Team
+#
+#  Distributed under the terms of the BSD License.  The full license is in
+#  the file COPYING.txt, distributed as part of this software.
+#-----------------------------------------------------------------------------
+
+#-----------------------------------------------------------------------------
+# Imports
+#-----------------------------------------------------------------------------
+
+import nose.tools as nt
+import zmq
+from zmq.utils import jsonapi
+
+from ..session import (Session, codecs, compress_frame, decompress_frame,
+                       recv_message)
+
+#-----------------------------------------------------------------------------
+# Utilities
+#-----------------------------------------------------------------------------
+
+def setup():
+    global context, sender, receiver
+    context = zmq.Context()
+    sender = context.socket(zmq.PAIR)
+    sender.bind('inproc://test_session')
+    receiver = context.socket(zmq.PAIR)
+    receiver.connect('inproc://test_session')
+
+
+def teardown():
+    sender.close()
+    receiver.close()
+    context.term()
+
+#-----------------------------------------------------------------------------
+# Tests
+#-----------------------------------------------------------------------------
+
+def test_frames():
+    data = '{"a": "%s"}' % ('x' * 1000)
+    for codec in codecs:
+        frame = compress_frame(data, codec)
+        nt.assert_true(len(frame) < len(data))
+        nt.assert_equal(decompress_frame(frame), data)
+    nt.assert_equal(decompress_frame(data), data)
+    nt.assert_raises(ValueError, decompress_frame, '\0nocodec\0data')
+
+
+def test_compression():
+    kernel = Session(compression=['nocodec', 'zlib'],
+                     compression_threshold=500)
+    nt.assert_equal(kernel.compression, ['zlib'])
+    client = Session()
+    request = client.msg('history_request', {})
+    nt.assert_equal(request['header']['codecs'], sorted(codecs))
+    old_client = Session()
+    old_request = old_client.msg('history_request', {})
+    del old_request['header']['codecs']
+    kernel.add_peer(request['header'])
+    kernel.add_peer(old_request['header'])
+
+    big = {'history' : 'x' * 1000}
+    for parent, compressed in [(request, True), (old_request, False)]:
+        kernel.send(sender, 'history_reply', big, parent)
+        frame = receiver.recv()
+        nt.assert_equal(frame.startswith('\0zlib\0'), compressed)
+    # Small messages aren't compressed
+    kernel.send(sender, 'history_reply', {}, request)
+    nt.assert_equal(receiver.recv()[0], '{')
+    # Published messages may go to subscribers which never sent a request
+    kernel.publish(sender, kernel.msg('pyout', big))
+    nt.assert_equal(receiver.recv()[0], '{')
+
+    stats = kernel.stats
+    nt.assert_equal(stats['messages'], 4)
+    nt.assert_equal(stats['compressed'], 1)
+    nt.assert_true(kernel.compression_ratio < 0.8)
+    nt.assert_true(stats['compress_time'] >= 0)
+
+
+def test_publish_compression():
+    nt.assert_raises(ValueError, Session, publish_compression='nocodec')
+    kernel = Session(publish_compression='zlib', compression_threshold=500)
+    big = {'data' : 'x' * 1000}
+    # Compressed without any known peer
+    kernel.publish(sender, kernel.msg('pyout', big))
+    frame = receiver.recv()
+    nt.assert_true(frame.startswith('\0zlib\0'))
+    nt.assert_equal(jsonapi.loads(decompress_frame(frame))['content'], big)
+    kernel.publish(sender, kernel.msg('pyout', {}))
+    nt.assert_equal(receiver.recv()[0], '{')
+    # Replies are still only compressed for peers supporting it
+    request = Session().msg('history_request', {})
+    kernel.send(sender, 'history_reply', big, request)
+    nt.assert_equal(receiver.recv()[0], '{')
+
+
+def test_recv_request():
+    """Requests compressed by a client decode like replies."""
+    client = Session(compression=['zlib'], compression_threshold=0)
+    kernel = Session()
+    client.add_peer(kernel.msg('status')['header'])
+    request = kernel.msg('status')
+    msg = client.msg('execute_request', {'code' : 'x' * 1000}, request)
+    client.send_message(sender, msg, ident='client')
+    nt.assert_equal(receiver.recv(), 'client')
+    nt.assert_equal(recv_message(receiver), msg)
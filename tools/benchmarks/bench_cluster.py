@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+"""Benchmarks for the parallel computing kernel.
+
+Usage:
+
+./bench_cluster.py [-n engines] [-o results.json] [--quick]
+                  [--concurrency n] [--stagger seconds] [--prefork]
+                  [--startup-only]
+
+It starts a controller and n engines (4 by default) in a temporary cluster
+directory, with LocalControllerLauncher and LocalEngineSetLauncher, and
+measures:
+
+* the latency of execute('pass') on one engine and on all of them
+* the throughput of push and pull for payloads of several sizes
+* the time to scatter and gather sequences of several lengths
+* the throughput of a TaskClient for empty and tiny tasks
+* the overhead of the task scheduler, as the latency of a task minus the
+  latency of an execute on one engine
+
+The results are printed, and written as JSON with -o, so that they can be
+compared from one version to the next.  --quick runs fewer iterations.  The
+startup options are passed to the LocalEngineSetLauncher, and the startup
+time is the time until all the engines are registered.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+from IPython.kernel import client
+from IPython.kernel.launcher import (LocalControllerLauncher,
+    LocalEngineSetLauncher)
+from IPython.kernel.twistedutil import blockingCallFromThread
+
+#-----------------------------------------------------------------------------
+# Cluster setup
+#-----------------------------------------------------------------------------
+
+def wait_for(condition, timeout, what):
+    start = time.time()
+    while not condition():
+        if time.time() - start > timeout:
+            raise RuntimeError('Timed out waiting for %s' % what)
+        time.sleep(0.1)
+    return time.time() - start
+
+
+def start_cluster(n, cluster_dir, options):
+    """Start a controller and n engines, return the launchers and clients."""
+    controller = LocalControllerLauncher(work_dir=cluster_dir)
+    engines = LocalEngineSetLauncher(work_dir=cluster_dir)
+    engines.concurrency = options.concurrency
+    engines.stagger = options.stagger
+    engines.prefork = options.prefork
+    try:
+        blockingCallFromThread(controller.start, cluster_dir)
+        furl = os.path.join(cluster_dir, 'security',
+                            'ipcontroller-engine.furl')
+        wait_for(lambda: os.path.isfile(furl), 30, 'the controller')
+        start = time.time()
+        blockingCallFromThread(engines.start, n, cluster_dir)
+        blockingCallFromThread(engines.observe_ready)
+        startup = time.time() - start
+    except:
+        stop_cluster(controller, engines)
+        raise
+    mec = client.MultiEngineClient(cluster_dir=cluster_dir)
+    tc = client.TaskClient(cluster_dir=cluster_dir)
+    return controller, engines, mec, tc, startup
+
+
+def stop_cluster(controller, engines):
+    if engines.launchers:
+        blockingCallFromThread(engines.stop)
+    if controller.running:
+        blockingCallFromThread(controller.stop)
+
+#-----------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------
+
+def timings(f, count):
+    times = []
+    for i in range(count):
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return times
+
+
+def percentiles(times):
+    """Summarize times in seconds, as milliseconds."""
+    times = sorted(times)
+    pick = lambda p: times[min(int(p*len(times)), len(times)-1)]*1e3
+    return dict(min=times[0]*1e3, p50=pick(0.5), p90=pick(0.9),
+                p99=pick(0.99), count=len(times))
+
+
+def bench_latency(mec, count):
+    return dict(
+        one_engine=percentiles(timings(lambda: mec.execute('pass', 0),
+                                       count)),
+        all_engines=percentiles(timings(lambda: mec.execute('pass'),
+                                        count)))
+
+
+def bench_push_pull(mec, sizes, count):
+    """Throughput in MB/s of all the bytes sent to or from the engines."""
+    n = len(mec.get_ids())
+    results = {}
+    for size in sizes:
+        ns = dict(payload='x' * size)
+        push = min(timings(lambda: mec.push(ns), count))
+        pull = min(timings(lambda: mec.pull('payload'), count))
+        results[str(size)] = dict(push=size*n/push/1e6, pull=size*n/pull/1e6)
+    mec.execute('del payload')
+    return results
+
+
+def bench_scatter_gather(mec, lengths, count):
+    """Best times, in milliseconds."""
+    results = {}
+    for length in lengths:
+        seq = range(length)
+        scatter = min(timings(lambda: mec.scatter('seq', seq), count))
+        gather = min(timings(lambda: mec.gather('seq'), count))
+        results[str(length)] = dict(scatter=scatter*1e3, gather=gather*1e3)
+    mec.execute('del seq')
+    return results
+
+
+def task_throughput(tc, make_task, count):
+    """Tasks per second, submitting all of them before waiting."""
+    start = time.time()
+    taskids = [tc.run(make_task()) for i in range(count)]
+    tc.barrier(taskids)
+    elapsed = time.time() - start
+    tc.clear()
+    return count/elapsed
+
+
+def bench_tasks(tc, count):
+    empty = lambda: client.StringTask('pass')
+    tiny = lambda: client.StringTask('y = x + 1', push=dict(x=1), pull='y')
+    return dict(empty=task_throughput(tc, empty, count),
+                tiny=task_throughput(tc, tiny, count))
+
+
+def bench_scheduler(mec, tc, count):
+    """Latency of single tasks, compared to executing on one engine."""
+    def run_task():
+        taskid = tc.run(client.StringTask('pass'))
+        tc.get_task_result(taskid, block=True)
+    task = percentiles(timings(run_task, count))
+    execute = percentiles(timings(lambda: mec.execute('pass', 0), count))
+    tc.clear()
+    return dict(task=task, execute=execute,
+                overhead=task['p50'] - execute['p50'])
+
+#-----------------------------------------------------------------------------
+# Main
+#-----------------------------------------------------------------------------
+
+def main():
+    parser = OptionParser(usage='%prog [-n engines] [-o results.json] '
+                          '[--quick] [startup options]')
+    parser.add_option('-n', dest='engines', type='int', default=4,
+                      help='the number of engines to start')
+    parser.add_option('-o', dest='output', default=None,
+                      help='the file to write the results to, as JSON')
+    parser.add_option('--quick', dest='quick', action='store_true',
+                      default=False, help='run fewer iterations')
+    parser.add_option('--concurrency', dest='concurrency', type='int',
+                      default=0, help='the number of engines starting at '
+                      'once, 0 for all')
+    parser.add_option('--stagger', dest='stagger', type='float', default=0,
+                      help='the delay between engine launches')
+    parser.add_option('--prefork', dest='prefork', action='store_true',
+                      default=False, help='fork the engines from a template')
+    parser.add_option('--startup-only', dest='startup_only',
+                      action='store_true', default=False,
+                      help='only measure the startup of the engines')
+    options, args = parser.parse_args()
+    scale = 10 if options.quick else 1
+
+    cluster_dir = tempfile.mkdtemp(prefix='bench_cluster')
+    controller, engines, mec, tc, startup = start_cluster(options.engines,
+                                                          cluster_dir, options)
+    try:
+        if options.startup_only:
+            print 'engines: %d, startup: %.2f s' % (options.engines, startup)
+            return
+        results = dict(
+            engines=options.engines,
+            python=sys.version.split()[0],
+            date=time.strftime('%Y-%m-%dT%H:%M:%S'),
+            startup=startup,
+            latency=bench_latency(mec, 500 // scale),
+            push_pull=bench_push_pull(mec, [1000, 100000, 10000000],
+                                      max(10 // scale, 2)),
+            scatter_gather=bench_scatter_gather(mec, [100, 10000, 1000000],
+                                                max(10 // scale, 2)),
+            tasks=bench_tasks(tc, 1000 // scale),
+            scheduler=bench_scheduler(mec, tc, 200 // scale))
+    finally:
+        stop_cluster(controller, engines)
+        shutil.rmtree(cluster_dir, ignore_errors=True)
+
+    print 'engines: %d, startup: %.2f s' % (options.engines, startup)
+    for name in ['one_engine', 'all_engines']:
+        print 'execute latency, %-12s p50 %7.2f ms  p99 %7.2f ms' % (
+            name + ':', results['latency'][name]['p50'],
+            results['latency'][name]['p99'])
+    for size, r in sorted(results['push_pull'].items(),
+                          key=lambda item: int(item[0])):
+        print 'push/pull %9s bytes: %9.2f / %9.2f MB/s' % (size, r['push'],
+                                                         r['pull'])
+    for length, r in sorted(results['scatter_gather'].items(),
+                            key=lambda item: int(item[0])):
+        print 'scatter/gather %7s items: %9.2f / %9.2f ms' % (
+            length, r['scatter'], r['gather'])
+    print 'tasks: %.1f empty/s, %.1f tiny/s' % (results['tasks']['empty'],
+                                                results['tasks']['tiny'])
+    print 'scheduler overhead: %.2f ms per task' % (
+        results['scheduler']['overhead'])
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
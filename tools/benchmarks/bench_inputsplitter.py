@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+"""Benchmarks for pushing large pasted blocks into the input splitters.
+
+Usage:
+
+./bench_inputsplitter.py [nlines ...]
+
+For blocks of each number of lines (500, 1000 and 5000 by default), it
+prints the time per line taken by pushing the block line by line, as a
+line-oriented frontend does, and in one push in cell mode.  The time per line
+should stay flat as literals and strings grow.  The body of a function is
+compiled again on each line, as compound statements may need more clauses.
+"""
+
+import sys
+import time
+
+from IPython.core.inputsplitter import InputSplitter, IPythonInputSplitter
+
+#-----------------------------------------------------------------------------
+# Blocks of input
+#-----------------------------------------------------------------------------
+
+def statements(n):
+    return ['x%d = %d' % (i, i) for i in range(n)]
+
+def function(n):
+    return ['def f(x):'] + ['    x += %d' % i for i in range(n-2)] + \
+           ['    return x']
+
+def literal(n):
+    return ['data = ['] + ['    (%d, "%d"),' % (i, i) for i in range(n-2)] + \
+           [']']
+
+def docstring(n):
+    return ['s = """'] + ['line %d of (a long string' % i
+                          for i in range(n-2)] + ['"""']
+
+blocks = [('statements', statements), ('function', function),
+          ('literal', literal), ('docstring', docstring)]
+
+#-----------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------
+
+def push_lines(splitter_class, lines):
+    isp = splitter_class()
+    start = time.time()
+    for line in lines:
+        isp.push(line)
+        # A frontend starts a new input once the current one is complete
+        if not isp.push_accepts_more():
+            isp.reset()
+    return (time.time() - start) / len(lines)
+
+
+def push_cell(splitter_class, lines):
+    isp = splitter_class(input_mode='cell')
+    source = '\n'.join(lines)
+    start = time.time()
+    isp.push(source)
+    return (time.time() - start) / len(lines)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [500, 1000, 5000]
+    print '%-12s %7s %14s %14s %14s' % ('block', 'lines', 'python (us)',
+                                        'ipython (us)', 'cell (us)')
+    for name, make in blocks:
+        for n in sizes:
+            lines = make(n)
+            times = (push_lines(InputSplitter, lines),
+                     push_lines(IPythonInputSplitter, lines),
+                     push_cell(IPythonInputSplitter, lines))
+            print '%-12s %7d %14.1f %14.1f %14.1f' % ((name, n) +
+                                                      tuple(t*1e6 for t in times))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""Scaling benchmark for managing many kernels from one process.
+
+Usage:
+
+./bench_multikernel.py [--real] [nkernels ...]
+
+For each number of kernels (1, 10 and 200 by default), it connects a
+MultiKernelManager and then one KernelManager per kernel with its channels
+started, and prints the number of threads used and the round trip latency of
+requests sent to all the kernels.
+
+By default the kernels are lightweight echo servers, all run by a single
+helper process, so that the manager side is measured on its own.  With
+--real, actual IPython kernels are started (which takes a while for many
+kernels).
+"""
+
+import json
+import multiprocessing
+import sys
+import threading
+import time
+from Queue import Queue, Empty
+
+import zmq
+
+from IPython.utils.localinterfaces import LOCALHOST
+from IPython.zmq.kernelmanager import (KernelManager, XReqSocketChannel,
+    SubSocketChannel, RepSocketChannel, HBSocketChannel)
+from IPython.zmq.multikernelmanager import MultiKernelManager
+from IPython.utils.traitlets import Type
+
+#-----------------------------------------------------------------------------
+# Echo kernels
+#-----------------------------------------------------------------------------
+
+def echo_kernels(n, conn):
+    """Serve n fake kernels, which reply to every request, from one loop."""
+    context = zmq.Context()
+    poller = zmq.Poller()
+    addresses = []
+    # Keep references to all the sockets, or the idle ones get closed
+    kernels = []
+    for i in range(n):
+        ports = []
+        sockets = {}
+        kernels.append(sockets)
+        for name, kind in [('xreq', zmq.XREP), ('sub', zmq.PUB),
+                           ('rep', zmq.XREQ), ('hb', zmq.REP)]:
+            s = context.socket(kind)
+            ports.append(s.bind_to_random_port('tcp://%s' % LOCALHOST))
+            sockets[name] = s
+        poller.register(sockets['xreq'], zmq.POLLIN)
+        poller.register(sockets['hb'], zmq.POLLIN)
+        addresses.append(ports)
+    conn.send(addresses)
+    while True:
+        for s, event in poller.poll():
+            if s.socket_type == zmq.REP:
+                s.send(s.recv())
+                continue
+            ident, msg = s.recv_multipart()
+            msg = json.loads(msg)
+            reply = dict(header=dict(msg_id=0), parent_header=msg['header'],
+                         msg_type='execute_reply', content={'status':'ok'})
+            s.send_multipart([ident, json.dumps(reply)])
+
+
+def start_echo_kernels(n):
+    """Start the echo kernels, return the process and the kernel managers."""
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=echo_kernels, args=(n, child))
+    proc.daemon = True
+    proc.start()
+    kms = []
+    context = zmq.Context.instance()
+    for xreq, sub, rep, hb in parent.recv():
+        kms.append(KernelManager(context=context,
+                                 xreq_address=(LOCALHOST, xreq),
+                                 sub_address=(LOCALHOST, sub),
+                                 rep_address=(LOCALHOST, rep),
+                                 hb_address=(LOCALHOST, hb)))
+    return proc, kms
+
+
+def start_real_kernels(n):
+    kms = []
+    for i in range(n):
+        km = KernelManager()
+        km.start_kernel()
+        kms.append(km)
+    # Give the kernels a chance to come up.
+    time.sleep(2)
+    return None, kms
+
+#-----------------------------------------------------------------------------
+# Threaded KernelManager channels, for comparison
+#-----------------------------------------------------------------------------
+
+replies = Queue()
+
+class QueueXReqChannel(XReqSocketChannel):
+    def call_handlers(self, msg):
+        replies.put(msg)
+
+class NullSubChannel(SubSocketChannel):
+    def call_handlers(self, msg):
+        pass
+
+class NullRepChannel(RepSocketChannel):
+    def call_handlers(self, msg):
+        pass
+
+class NullHBChannel(HBSocketChannel):
+    def call_handlers(self, since_last_heartbeat):
+        pass
+
+class ThreadedKernelManager(KernelManager):
+    xreq_channel_class = Type(QueueXReqChannel)
+    sub_channel_class = Type(NullSubChannel)
+    rep_channel_class = Type(NullRepChannel)
+    hb_channel_class = Type(NullHBChannel)
+
+#-----------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------
+
+def percentiles(times):
+    times = sorted(times)
+    pick = lambda p: times[min(int(p*len(times)), len(times)-1)]*1e3
+    return pick(0.5), pick(0.99)
+
+
+def round_trips(send, targets, rounds):
+    """Send one request to each target per round, wait for all the replies."""
+    times = []
+    for r in range(rounds):
+        sent = {}
+        for target in targets:
+            sent[send(target)] = time.time()
+        while sent:
+            try:
+                msg = replies.get(timeout=10)
+            except Empty:
+                print '   %d replies missing' % len(sent)
+                break
+            start = sent.pop(msg['parent_header']['msg_id'], None)
+            if start is not None:
+                times.append(time.time() - start)
+    return times
+
+
+def bench_multi(kms, rounds):
+    nthreads = threading.active_count()
+    mkm = MultiKernelManager()
+    mkm.register_handler(lambda kid, channel, msg:
+                         channel == 'xreq' and replies.put(msg))
+    kids = [mkm.add_kernel(km) for km in kms]
+    time.sleep(0.5)
+    threads = threading.active_count() - nthreads
+    times = round_trips(lambda kid: mkm.execute(kid, 'pass'), kids, rounds)
+    mkm.stop()
+    return threads, times
+
+
+def bench_threaded(kms, rounds):
+    nthreads = threading.active_count()
+    tkms = []
+    for km in kms:
+        tkm = ThreadedKernelManager(xreq_address=km.xreq_address,
+                                    sub_address=km.sub_address,
+                                    rep_address=km.rep_address,
+                                    hb_address=km.hb_address)
+        tkm.start_channels()
+        tkm.hb_channel.unpause()
+        tkms.append(tkm)
+    time.sleep(0.5)
+    threads = threading.active_count() - nthreads
+    times = round_trips(lambda tkm: tkm.xreq_channel.execute('pass'), tkms,
+                        rounds)
+    for tkm in tkms:
+        tkm.stop_channels()
+    return threads, times
+
+
+def main():
+    args = sys.argv[1:]
+    real = '--real' in args
+    counts = [int(a) for a in args if a != '--real'] or [1, 10, 200]
+    print '%-9s %-12s %8s %10s %10s' % ('kernels', 'manager', 'threads',
+                                        'p50 (ms)', 'p99 (ms)')
+    for n in counts:
+        proc, kms = (start_real_kernels if real else start_echo_kernels)(n)
+        rounds = max(2000 // n, 5)
+        for name, bench in [('multi', bench_multi),
+                            ('threaded', bench_threaded)]:
+            threads, times = bench(kms, rounds)
+            print '%-9d %-12s %8d %10.2f %10.2f' % ((n, name, threads) +
+                                                    percentiles(times))
+        if proc is not None:
+            proc.terminate()
+        for km in kms:
+            if km.has_kernel:
+                km.kill_kernel()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""Microbenchmarks for the prefilter.
+
+Usage:
+
+./bench_prefilter.py [repeat]
+
+It prints the time per line taken by PrefilterManager.prefilter_line and
+prefilter_lines for typical and pathological inputs.  Prefiltering only
+rewrites the lines, nothing is executed.
+"""
+
+import sys
+import timeit
+
+from IPython.testing.globalipapp import get_ipython
+
+ip = get_ipython()
+pm = ip.prefilter_manager
+
+# (name, lines) pairs.  Plain python lines are the common case, the others
+# exercise the escapes, magics, aliases and autocall.
+cases = [
+    ('assignment', ['x = 1', 'a, b = 1, 2', 'd[key] = value']),
+    ('call', ['f(x)', 'obj.method(1, 2)', 'print(x)']),
+    ('statement', ['for i in range(10):', '    total += i', 'return x',
+                   'import os', 'def f(a, b=1):', 'class A(object):']),
+    ('expression', ['1 + 2', '[i*2 for i in range(10)]', '"a string"',
+                    '(1, 2, 3)', 'x']),
+    ('long line', ['y = ' + ' + '.join(['x%d' % i for i in range(200)])]),
+    ('formatting', ['s = "%d items" % n', 'print "%s: %s" % (k, v)']),
+    ('escapes', ['!ls', '%who', 'files = !ls', 'out = %who']),
+    ('magic/alias', ['who', 'ls -la', 'cd /tmp', 'pwd']),
+    ('prompts', ['>>> x = 1', 'In [1]: x = 1', '...     x']),
+]
+
+def bench_line(lines, number):
+    def run():
+        for line in lines:
+            pm.prefilter_line(line)
+    return min(timeit.repeat(run, repeat=3, number=number)) / \
+           (number * len(lines))
+
+def bench_block(lines, number):
+    block = '\n'.join(lines)
+    def run():
+        pm.prefilter_lines(block)
+    return min(timeit.repeat(run, repeat=3, number=number)) / \
+           (number * len(lines))
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print '%-14s %14s %16s' % ('case', 'line (us/line)', 'block (us/line)')
+    for name, lines in cases:
+        t = bench_line(lines, number)
+        tb = bench_block(lines, number)
+        print '%-14s %14.2f %16.2f' % (name, t*1e6, tb*1e6)
+
+if __name__ == '__main__':
+    main()
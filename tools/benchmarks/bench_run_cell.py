@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""Benchmark for the time taken to run large cells.
+
+Usage:
+
+./bench_run_cell.py [nlines ...]
+
+For cells of each number of lines (100, 1000 and 5000 by default), it prints
+the time taken by InteractiveShell.run_cell, minus the time taken by running
+the same code compiled beforehand.  This is the time spent getting the cell
+ready to execute: transforming, splitting, parsing and compiling it.
+"""
+
+import sys
+import time
+
+from IPython.testing.globalipapp import get_ipython
+
+ip = get_ipython()
+
+#-----------------------------------------------------------------------------
+# Cells
+#-----------------------------------------------------------------------------
+
+def statements(n):
+    return ['x%d = %d' % (i, i) for i in range(n)]
+
+def functions(n):
+    lines = []
+    for i in range(n // 4):
+        lines += ['def f%d(x):' % i, '    y = x + %d' % i,
+                  '    return y', '']
+    return lines
+
+def last_expression(n):
+    # An expression with no value to display, to keep the output quiet
+    return statements(n-1) + ['x0 or None']
+
+cells = [('statements', statements), ('functions', functions),
+         ('last expr', last_expression)]
+
+#-----------------------------------------------------------------------------
+# Measurements
+#-----------------------------------------------------------------------------
+
+def best_of(f, repeat=3):
+    times = []
+    for i in range(repeat):
+        start = time.time()
+        f()
+        times.append(time.time() - start)
+    return min(times)
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [100, 1000, 5000]
+    print '%-12s %7s %12s %12s' % ('cell', 'lines', 'total (ms)',
+                                   'overhead (ms)')
+    for name, make in cells:
+        for n in sizes:
+            cell = '\n'.join(make(n)) + '\n'
+            code = compile(cell, '<bench>', 'exec')
+            total = best_of(lambda : ip.run_cell(cell))
+            run = best_of(lambda : ip.run_code(code))
+            print '%-12s %7d %12.1f %12.1f' % (name, n, total*1e3,
+                                               (total-run)*1e3)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""Microbenchmarks for IPython.utils.traitlets.
+
+Usage:
+
+./bench_traitlets.py [number]
+
+It prints the time taken by instantiating HasTraits classes, getting and
+setting traits, and by trait change notifications.  Run it before and after
+changing traitlets to catch regressions.
+"""
+
+import sys
+import timeit
+
+from IPython.config.configurable import Configurable
+from IPython.utils.traitlets import (HasTraits, Any, Int, Float, Str, Bool,
+                                     List, Instance)
+
+#-----------------------------------------------------------------------------
+# Classes to benchmark
+#-----------------------------------------------------------------------------
+
+class Small(HasTraits):
+    a = Int(1)
+    b = Float(1.0)
+    c = Str('c')
+    d = Any()
+
+
+# 50 traits
+Large = type('Large', (HasTraits,),
+             dict(('t%d' % i, [Int, Float, Str, Bool][i % 4]())
+                  for i in range(50)))
+
+
+class Config(Configurable):
+    a = Int(1, config=True)
+    b = List([], config=True)
+    c = Instance(dict, ())
+    d = Bool(False, config=True)
+
+
+class Static(HasTraits):
+    a = Int(0)
+    def _a_changed(self, name, old, new):
+        pass
+
+
+def handler(name, old, new):
+    pass
+
+#-----------------------------------------------------------------------------
+# Cases
+#-----------------------------------------------------------------------------
+
+small = Small()
+static = Static()
+dynamic = Small()
+dynamic.on_trait_change(handler, 'a')
+anytrait = Small()
+anytrait.on_trait_change(handler)
+
+def set_a(obj):
+    def run():
+        obj.a = 1
+        obj.a = 2
+    return run
+
+cases = [
+    ('new Small', Small),
+    ('new Large', Large),
+    ('new Configurable', Config),
+    ('get Int', lambda : small.a),
+    ('set Any', lambda : setattr(small, 'd', 1)),
+    ('set Int (x2)', set_a(small)),
+    ('set static (x2)', set_a(static)),
+    ('set dynamic (x2)', set_a(dynamic)),
+    ('set anytrait (x2)', set_a(anytrait)),
+]
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print '%-18s %12s' % ('case', 'us/call')
+    for name, run in cases:
+        t = min(timeit.repeat(run, repeat=3, number=number)) / number
+        print '%-18s %12.2f' % (name, t*1e6)
+
+if __name__ == '__main__':
+    main()